@@ -10,5 +10,7 @@ from ezplot9.plot_functions.marginal_plot import marginal_plot
 from ezplot9.plot_functions.calibration_plot import calibration_plot
 from ezplot9.plot_functions.roc_plot import roc_plot
 from ezplot9.plot_functions.ci_plot import ci_plot
+from ezplot9.plot_functions.model_evaluation import ModelEvaluation
 
-from ezplot9.utilities.labellers import percent_labels, ez_labels, bp_labels, money_labels
\ No newline at end of file
+from ezplot9.utilities.labellers import percent_labels, ez_labels, bp_labels, money_labels
+from ezplot9.utilities.cache import aggregation_cache, AggregationCache
@@ -33,15 +33,18 @@ def bar_plot(df,
              orientation = 'vertical',
              sort_groups = True,
              base_size = 10,
-             figure_size = (6,3)):
+             figure_size = (6,3),
+             n_jobs = 1,
+             where = None):
 
     '''
     Aggregates data in df and plots as a bar chart.
 
     Parameters
     ----------
-    df : pd.DataFrame
-      input dataframe
+    df : pd.DataFrame, iterator of pd.DataFrame, str or pyarrow.dataset.Dataset
+      input dataframe (or iterator of dataframe chunks, eg pd.read_csv(..., chunksize=n), or parquet
+      path / pyarrow dataset, reading only the columns used in the plot)
     x : str
       quoted expression to be plotted on the x axis
     y : str
@@ -66,6 +69,10 @@ def bar_plot(df,
       base size for theme_ez
     figure_size :tuple of int
       figure size
+    n_jobs : int
+      number of worker processes used for aggregating (-1 means all the available cores)
+    where : str
+      quoted expression used to filter the rows before aggregating
 
     Returns
     -------
@@ -102,9 +109,6 @@ def bar_plot(df,
     if fill:
         label_function = percent_labels
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -117,10 +121,10 @@ def bar_plot(df,
     # fix special cases
     if x == '.index':
         groups['x'] = '.index'
-        names['x'] = dataframe.index.name if dataframe.index.name is not None else ''
+        names['x'] = df.index.name if isinstance(df, pd.DataFrame) and df.index.name is not None else ''
 
     # aggregate data
-    gdata = agg_data(dataframe, variables, groups, aggfun, fill_groups=True)
+    gdata = agg_data(df, variables, groups, aggfun, fill_groups=True, n_jobs=n_jobs, where=where)
 
     if fill:
         groups_to_normalize = [c for c in ['x', 'facet_x', 'facet_y'] if c in gdata.columns]
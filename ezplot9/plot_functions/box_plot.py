@@ -1,5 +1,7 @@
+import pandas as pd
 import plotnine as p9
 from ..utilities.agg_data import agg_data
+from ..utilities.sketches import box_statistics
 from ..utilities.utils import unname
 from ..utilities.labellers import ez_labels
 from ..utilities.colors import ez_colors
@@ -22,8 +24,11 @@ def box_plot(df,
 
     Parameters
     ----------
-    df : pd.DataFrame
-      input dataframe
+    df : pd.DataFrame, iterator of pd.DataFrame, str or pyarrow.dataset.Dataset
+      input dataframe. Iterators of chunks, parquet paths and pyarrow datasets are summarised
+      in one pass with a quantile sketch per box (see sketches.QuantileSketch): quartiles
+      are approximate for boxes with more than sketches.DEFAULT_K values and outliers are
+      not drawn
     x : str
       quoted expression to be plotted on the x axis
     y : str
@@ -48,9 +53,6 @@ def box_plot(df,
 
     '''
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -63,11 +65,21 @@ def box_plot(df,
     # fix special cases
     if x == '.index':
         groups['x'] = '.index'
-        names['x'] = dataframe.index.name if dataframe.index.name is not None else ''
-
-    # aggregate data and reorder columns
-    gdata = agg_data(dataframe, variables, groups, None, fill_groups=True)
-    gdata = gdata[[c for c in ['x', 'y', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
+        names['x'] = df.index.name if isinstance(df, pd.DataFrame) and df.index.name is not None else ''
+
+    if isinstance(df, pd.DataFrame):
+        # aggregate data and reorder columns
+        gdata = agg_data(df, variables, groups, None, fill_groups=False)
+        gdata = gdata[[c for c in ['x', 'y', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
+        box_aes = {'y': 'y'}
+        stat = 'boxplot'
+    else:
+        # box statistics from the quantile sketch of each group
+        gdata = agg_data(df, variables, groups, 'sketch', fill_groups=False)
+        box_stats = pd.DataFrame([box_statistics(sketch) for sketch in gdata.pop('y')])
+        gdata = pd.concat([gdata, box_stats], axis=1)
+        box_aes = {c: c for c in box_stats.columns}
+        stat = 'identity'
 
     # add group_x column
     if group is not None:
@@ -77,18 +89,21 @@ def box_plot(df,
 
     # set groups
     if group is None:
-        g += p9.geom_boxplot(p9.aes(x="factor(x)", y="y", group="factor(x)"),
+        g += p9.geom_boxplot(p9.aes(x="factor(x)", group="factor(x)", **box_aes),
+                             stat = stat,
                              colour = ez_colors(1)[0],
                              na_rm = False,
                              **kwargs)
     else:
         if dodge_groups:
-            g += p9.geom_boxplot(p9.aes(x="factor(x)", y="y", group="factor(group_x)", fill="factor(group)"),
+            g += p9.geom_boxplot(p9.aes(x="factor(x)", group="factor(group_x)", fill="factor(group)", **box_aes),
+                                 stat = stat,
                                  position=p9.position_dodge(0.9, preserve='single'),
                                  na_rm = True,
                                  **kwargs)
         else:
-            g += p9.geom_boxplot(p9.aes(x="factor(x)", y="y", group="factor(group_x)", fill="factor(group)"),
+            g += p9.geom_boxplot(p9.aes(x="factor(x)", group="factor(group_x)", fill="factor(group)", **box_aes),
+                                 stat = stat,
                                  na_rm = True,
                                  **kwargs)
         g += p9.scale_fill_manual(values=ez_colors(g.n_groups('group')))
@@ -7,10 +7,8 @@ from ..utilities.utils import unname, sort_data_groups
 from ..utilities.labellers import ez_labels, percent_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
-from ..utilities.binning import bin_data, qbin_data
-from ..utilities.binning import bin_data, qbin_data
-from .marginal_plot import marginal_plot
-from .ci_plot import ci_plot
+from ..utilities.calibration import calibration_data
+from .ezplot import EZPlot
 
 import logging
 log = logging.getLogger(__name__)
@@ -29,7 +27,9 @@ def calibration_plot(df,
                      xy_range = ((0,1), (0,1)),
                      use_bootstrapping=False,
                      base_size=10,
-                     figure_size=(6, 3)):
+                     figure_size=(6, 3),
+                     seed=None,
+                     method='bootstrap'):
     '''
     Plot calibration curves for classification models
 
@@ -54,13 +54,21 @@ def calibration_plot(df,
       Use count label on each point. Choose between None, 'auto' or 'force'
     label_function : callable
       labelling function
-
     sort_groups : bool
       sort groups by the sum of their value (otherwise alphabetical order is used)
+    xy_range : tuple
+      limits of the x and y axes
+    use_bootstrapping : bool
+      plot the confidence interval of the fraction of positives of each bin
     base_size : int
       base size for theme_ez
     figure_size :tuple of int
       figure size
+    seed : int or None
+      seed of the random number generator used for bootstrapping
+    method : str
+      intervals used when use_bootstrapping is True: 'bootstrap', 'analytic' (Wilson intervals)
+      or 'auto' (analytic intervals for bins with at least 100 values)
 
     Returns
     -------
@@ -69,67 +77,126 @@ def calibration_plot(df,
 
     '''
 
-    if use_bootstrapping:
-
-        # create a copy of the data
-        dataframe = df.copy()
-
-        # define groups and variables; remove and store (eventual) names
-        names = {}
-        groups = {}
-        variables = {}
-
-        for label, var in zip(['x', 'group', 'facet_x', 'facet_y'], [prob, group, facet_x, facet_y]):
-            names[label], groups[label] = unname(var)
-        names['y'], variables['y'] = unname(binary_target)
-
-        # set column names and evaluate expressions
-        tmp_df = agg_data(dataframe, variables, groups, None, fill_groups=False)
-
-        # bin data
-        if use_quantiles:
-            quantile_groups = [c for c in tmp_df.columns if c in ['group', 'facet_x', 'facet_y']]
-            if len(quantile_groups) > 0:
-                tmp_df['x'] = tmp_df.groupby(quantile_groups)['x'].apply(lambda x: qbin_data(x, bins))
-            else:
-                tmp_df['x'] = qbin_data(tmp_df['x'], bins)
-        else:
-            tmp_df['x'], _, _ = bin_data(tmp_df['x'], bins, None)
-
-        tmp_df.rename(columns = {'x':prob,
-                                 'y':binary_target,
-                                 'group':group,
-                                 'facet_x':facet_x,
-                                 'facet_y':facet_y},
-                      inplace=True)
-
-        g = ci_plot(tmp_df,
-                    prob,
-                    binary_target,
-                    group = group,
-                    facet_x = facet_x,
-                    facet_y = facet_y,
-                    base_size = base_size,
-                    figure_size = figure_size,
-                    num_iterations = 10_000,
-                    geom = 'ribbon')
-
+    if label_pos not in [None, 'auto', 'force']:
+        log.error("label_pos not recognized")
+        raise NotImplementedError("label_pos not recognized")
+    elif label_pos == 'auto':
+        show_labels = bins <= 21 and group is None and not use_bootstrapping
     else:
+        show_labels = label_pos == 'force'
+
+    # define groups and variables; remove and store (eventual) names
+    names = {}
+    groups = {}
+    variables = {}
+
+    for label, var in zip(['x', 'group', 'facet_x', 'facet_y'], [prob, group, facet_x, facet_y]):
+        names[label], groups[label] = unname(var)
+    names['y'], variables['y'] = unname(binary_target)
+
+    # evaluate expressions, then bin and aggregate the data (with intervals) in a single pass
+    tmp_df = agg_data(df, variables, groups, None, fill_groups=False)
+    group_cols = [c for c in ['group', 'facet_x', 'facet_y'] if c in tmp_df.columns]
+    gdata = calibration_data(tmp_df, 'y', ['x'], group_cols, bins, use_quantiles,
+                             method=method if use_bootstrapping else None,
+                             num_iterations=10_000,
+                             seed=seed)
+    gdata = gdata.drop(columns='variable').rename(columns={'target': 'y'})
+
+    return draw_calibration(gdata,
+                            names['group'] if group is not None else None,
+                            xy_range,
+                            show_labels=show_labels,
+                            label_function=label_function,
+                            sort_groups=sort_groups,
+                            base_size=base_size,
+                            figure_size=figure_size)
+
+def draw_calibration(gdata,
+                     group_name=None,
+                     xy_range=((0,1), (0,1)),
+                     show_labels=False,
+                     label_function=ez_labels,
+                     sort_groups=False,
+                     base_size=10,
+                     figure_size=(6, 3)):
+    '''
+    Plot precomputed calibration bins (see calibration.calibration_data)
+
+    Parameters
+    ----------
+    gdata : pd.DataFrame
+      x (confidence), y (fraction of positives), count and group of each bin, and optionally
+      facet_x and facet_y, and low and high (bounds of the interval plotted as a ribbon)
+    group_name : str or None
+      title of the legend of the groups (a single curve is plotted without legend if None)
+    xy_range : tuple
+      limits of the x and y axes
+    show_labels : bool
+      label each bin with its count
+    label_function : callable
+      labelling function
+    sort_groups : bool
+      sort groups by the sum of their value (otherwise the order of gdata is used)
+    base_size : int
+      base size for theme_ez
+    figure_size :tuple of int
+      figure size
 
-        g = marginal_plot(df,
-                          prob,
-                          binary_target,
-                          group = group ,
-                          facet_x = facet_x ,
-                          facet_y = facet_y ,
-                          aggfun = 'mean',
-                          bins=bins,
-                          use_quantiles =use_quantiles ,
-                          label_pos=label_pos,
-                          label_function=label_function,
-                          sort_groups=sort_groups,
-                          base_size=base_size,
-                          figure_size=figure_size)
+    Returns
+    -------
+    g : EZPlot
+      EZplot object
+
+    '''
+
+    g = EZPlot(gdata)
+
+    # determine order and create a categorical type
+    if sort_groups:
+        sort_data_groups(g)
+
+    # get colors
+    colors = np.flip(ez_colors(g.n_groups('group')))
+    has_intervals = 'low' in gdata.columns
+
+    # set groups
+    if group_name is None:
+        if has_intervals:
+            g += p9.geom_ribbon(p9.aes(x="x", ymin='low', ymax='high'),
+                                fill=colors[0],
+                                alpha=0.2)
+        g += p9.geom_line(p9.aes(x="x", y="y"), group=1, colour=colors[0])
+        if show_labels:
+            g += p9.geom_point(p9.aes(x="x", y="y"), group=1, colour=colors[0])
+    else:
+        if has_intervals:
+            g += p9.geom_ribbon(p9.aes(x="x", ymin='low', ymax='high',
+                                       group="factor(group)", fill="factor(group)"),
+                                alpha=0.2)
+            g += p9.scale_fill_manual(values=colors, name=group_name)
+        g += p9.geom_line(p9.aes(x="x", y="y", group="factor(group)", colour="factor(group)"))
+        if show_labels:
+            g += p9.geom_point(p9.aes(x="x", y="y", colour="factor(group)"))
+        g += p9.scale_color_manual(values=colors, name=group_name)
+
+    # set labels
+    if show_labels:
+        g.data['label'] = label_function(g.data['count'])
+        g.data['label_pos'] = g.data['y'] + \
+                    np.sign(g.data['y'])*g.data['y'].abs().max()*0.02
+
+        g += p9.geom_text(p9.aes(x='x', y='label_pos', label='label'),
+                          color="#000000",
+                          size=base_size * 0.7,
+                          ha='center',
+                          va='bottom')
+
+    # set facets
+    if 'facet_x' in gdata.columns and 'facet_y' not in gdata.columns:
+        g += p9.facet_wrap('~facet_x')
+    if 'facet_x' in gdata.columns and 'facet_y' in gdata.columns:
+        g += p9.facet_grid('facet_y~facet_x')
 
     g += p9.scale_x_continuous(labels=percent_labels, limits = xy_range[0])
     g += p9.scale_y_continuous(labels=percent_labels, limits = xy_range[1])
@@ -141,4 +208,8 @@ def calibration_plot(df,
     g += p9.xlab('Confidence') + \
          p9.ylab('Fraction of positives')
 
-    return g
\ No newline at end of file
+    # set theme
+    g += theme_ez(figure_size=figure_size,
+                  base_size=base_size)
+
+    return g
@@ -1,14 +1,16 @@
 import plotnine as p9
-from ..utilities.agg_data import agg_data, bootstrapping_aggregation
+from ..utilities.agg_data import agg_data, fill_data
+from ..utilities.bootstrap import get_bootstrap_stat
+from ..utilities.intervals import CI_METHODS, group_intervals
 from ..utilities.utils import unname
 from ..utilities.labellers import ez_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
 from .ezplot import EZPlot
-import pandas as pd
-import numpy as np
 import bootstrapped.stats_functions as bs_stats
-from pandas.io.json import json_normalize
+
+import logging
+log = logging.getLogger(__name__)
 
 
 def ci_plot(df,
@@ -22,6 +24,9 @@ def ci_plot(df,
             aggfun = bs_stats.mean,
             num_iterations = 10_000,
             geom = 'crossbar',
+            seed = None,
+            method = 'bootstrap',
+            tolerance = None,
             **kwargs):
     '''
     Aggregates data in df and plots as a line chart.
@@ -44,8 +49,25 @@ def ci_plot(df,
       base size for theme_ez
     figure_size :tuple of int
       figure size
+    aggfun : fun
+      statistic to be bootstrapped (bs_stats.mean and bs_stats.sum are bootstrapped for all
+      groups at once, other functions use bootstrapped.bootstrap on each group)
+    num_iterations : int
+      number of bootstrap iterations
+    geom : str
+      choose between 'crossbar' and 'ribbon'
+    seed : int or None
+      seed of the random number generator (only used by the batched bootstrap)
+    method : str
+      choose between 'bootstrap', 'analytic' (t intervals, or Wilson intervals for binary
+      values) or 'auto' (analytic intervals for groups with at least 100 values). Analytic
+      intervals are only available for bs_stats.mean and bs_stats.sum
+    tolerance : float or None
+      adaptive bootstrap: iterations are run in blocks and each group stops once its interval
+      bounds move by less than tolerance * (interval width) between blocks. The iterations
+      used by each group are reported in the num_iterations column
     **kwargs : kwargs
-      additional kwargs for geom_boxplot
+      additional kwargs for bootstrapped.bootstrap (eg alpha)
 
     Returns
     -------
@@ -54,9 +76,6 @@ def ci_plot(df,
 
     '''
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -69,25 +88,30 @@ def ci_plot(df,
     # fix special cases
     if x == '.index':
         groups['x'] = '.index'
-        names['x'] = dataframe.index.name if dataframe.index.name is not None else ''
-
-    # aggregate data and reorder columns
-    gdata = agg_data(dataframe,
-                     variables,
-                     groups,
-                     lambda x: bootstrapping_aggregation(x, aggfun, num_iterations, **kwargs),
-                     fill_groups=True)
-
-    empty_dict = {'sample_size': 0,
-                  'num_iterations': num_iterations,
-                  'center': np.nan,
-                  'low': np.nan,
-                  'high': np.nan,
-                  'successful': np.nan}
-    gdata['y'] = gdata['y'] \
-        .apply(lambda x: empty_dict if isinstance(x, float) and np.isnan(x) else x)
-
-    gdata = gdata[[c for c in ['x', 'y', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
+        names['x'] = df.index.name if df.index.name is not None else ''
+
+    if method not in CI_METHODS:
+        log.error('method should be one of {}'.format(CI_METHODS))
+        raise ValueError('method should be one of {}'.format(CI_METHODS))
+
+    # mean and sum are computed for all groups at once, other statistics group by group
+    stat = get_bootstrap_stat(aggfun, kwargs)
+    if (stat is None) and (method == 'analytic'):
+        log.error('analytic intervals are only available for bs_stats.mean and bs_stats.sum')
+        raise ValueError('analytic intervals are only available for bs_stats.mean and bs_stats.sum')
+    elif stat is None:
+        stat, method = aggfun, 'bootstrap'
+
+    # evaluate data and compute the intervals of each group
+    tmp_df = agg_data(df, variables, groups, None, fill_groups=False)
+    group_cols = [c for c in ['x', 'group', 'facet_x', 'facet_y'] if c in tmp_df.columns]
+    gdata = group_intervals(tmp_df, group_cols, 'y', stat, method, num_iterations, seed=seed,
+                            tolerance=tolerance, **kwargs)
+
+    # fill missing groups
+    gdata = fill_data(gdata, group_cols)
+    gdata['sample_size'] = gdata['sample_size'].fillna(0).astype(int)
+    gdata['num_iterations'] = gdata['num_iterations'].fillna(0 if method == 'analytic' else num_iterations).astype(int)
     for k,v in kwargs.items():
         gdata[k] = v
 
@@ -95,10 +119,6 @@ def ci_plot(df,
     if group is not None:
         gdata['group_x'] = gdata['group'].astype('str') + '_' + gdata['x'].astype(str)
 
-    gdata = pd.concat([gdata.drop('y', axis=1),
-                       json_normalize(gdata['y'])],
-                      axis=1)
-
     if geom=='crossbar':
         g = EZPlot(gdata)
 
@@ -6,7 +6,7 @@ from ..utilities.utils import unname
 from ..utilities.labellers import ez_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
-from ..utilities.binning import bin_data
+from ..utilities.kde import supports_kde, kde_data
 from .ezplot import EZPlot
 
 import logging
@@ -20,6 +20,7 @@ def density_plot(df,
                  group = None,
                  facet_x = None,
                  facet_y = None,
+                 w = None,
                  position = 'overlay',
                  sort_groups=True,
                  base_size=10,
@@ -41,6 +42,8 @@ def density_plot(df,
       quoted expression to be used as facet
     facet_y : str
       quoted expression to be used as facet
+    w : str
+      quoted expression representing the weights of the density
     position : str
       if groups are present, choose between `stack` or `overlay`
     base_size : int
@@ -48,7 +51,10 @@ def density_plot(df,
     figure_size :tuple of int
       figure size
     stat_kwargs : kwargs
-      kwargs for the density stat
+      kwargs for the density stat. With a gaussian kernel and only bw ('nrd0' or a number),
+      adjust and n, densities are computed by ezplot9 on a grid of n points (see
+      kde.kde_data) and only the grid is passed to plotnine. Other cases use plotnine's
+      stat_density on the evaluated rows
 
     Returns
     -------
@@ -61,9 +67,6 @@ def density_plot(df,
         log.error("position not recognized")
         raise NotImplementedError("position not recognized")
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -71,15 +74,28 @@ def density_plot(df,
 
     for label, var in zip(['x', 'group', 'facet_x', 'facet_y'], [x, group, facet_x, facet_y]):
         names[label], groups[label] = unname(var)
+    names['w'], variables['w'] = unname(w)
 
     # fix special cases
     if x == '.index':
         groups['x'] = '.index'
-        names['x'] = dataframe.index.name if dataframe.index.name is not None else ''
+        names['x'] = df.index.name if df.index.name is not None else ''
 
     # aggregate data and reorder columns
-    gdata = agg_data(dataframe, variables, groups, None, fill_groups=False)
-    gdata = gdata[[c for c in ['x', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
+    gdata = agg_data(df, variables, groups, None, fill_groups=False)
+    gdata = gdata[[c for c in ['x', 'w', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
+
+    # compute the densities on a grid (unless the stat or x are not supported)
+    precomputed = supports_kde(stat_kwargs) and gdata['x'].dtype.kind in 'iufb'
+    if precomputed:
+        group_cols = [c for c in ['group', 'facet_x', 'facet_y'] if c in gdata.columns]
+        gdata = kde_data(gdata, group_cols, 'x', 'w' if w is not None else None, **stat_kwargs)
+        gdata = gdata.rename(columns={'density': 'y'})[['x', 'y'] + group_cols]
+        stat = 'identity'
+        density_aes = {'y': 'y'}
+    else:
+        stat = p9.stats.stat_density(**stat_kwargs)
+        density_aes = {'weight': 'w'} if w is not None else {}
 
     # start plotting
     g = EZPlot(gdata)
@@ -89,8 +105,8 @@ def density_plot(df,
 
     # set groups
     if group is None:
-        g += p9.geom_density(p9.aes(x="x"),
-                             stat = p9.stats.stat_density(**stat_kwargs),
+        g += p9.geom_density(p9.aes(x="x", **density_aes),
+                             stat = stat,
                              colour = ez_colors(1)[0],
                              fill = ez_colors(1)[0],
                              **POSITION_KWARGS[position])
@@ -98,8 +114,9 @@ def density_plot(df,
         g += p9.geom_density(p9.aes(x="x",
                                     group="factor(group)",
                                     colour="factor(group)",
-                                    fill="factor(group)"),
-                             stat = p9.stats.stat_density(**stat_kwargs),
+                                    fill="factor(group)",
+                                    **density_aes),
+                             stat = stat,
                              **POSITION_KWARGS[position])
         g += p9.scale_fill_manual(values=colors, reverse=False)
         g += p9.scale_color_manual(values=colors, reverse=False)
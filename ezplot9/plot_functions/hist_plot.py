@@ -1,12 +1,13 @@
 import plotnine as p9
 import numpy as np
 
-from ..utilities.agg_data import agg_data
+from ..utilities.agg_data import agg_data, MAX_FILL_ROWS
 from ..utilities.utils import unname
 from ..utilities.labellers import ez_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
-from ..utilities.binning import bin_data
+from ..utilities.binning import bin_codes
+from ..utilities.kernels import group_histogram
 from .ezplot import EZPlot
 
 import logging
@@ -28,6 +29,7 @@ def hist_plot(df,
               position = 'stack',
               normalize = False,
               sort_groups=True,
+              sparse=False,
               base_size=10,
               figure_size=(6, 3)):
 
@@ -60,6 +62,8 @@ def hist_plot(df,
       normalize histogram counts
     sort_groups : bool
       sort groups by the sum of their value (otherwise alphabetical order is used)
+    sparse : bool
+      only draw the non-empty tiles of 2-d histograms
     base_size : int
       base size for theme_ez
     figure_size :tuple of int
@@ -97,9 +101,6 @@ def hist_plot(df,
         if type(bin_width) not in [tuple, list]:
             bin_width = (bin_width, bin_width)
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -110,38 +111,43 @@ def hist_plot(df,
     names['w'], variables['w'] = unname(w)
 
     # set column names and evaluate expressions
-    tmp_df = agg_data(dataframe, variables, groups, None, fill_groups=False)
+    tmp_df = agg_data(df, variables, groups, None, fill_groups=False)
 
-    # redefine groups and variables; remove and store (eventual) names
-    new_groups = {c:c for c in tmp_df.columns if c in ['x', 'y', 'group', 'facet_x', 'facet_y']}
-    non_xy_groups = [g for g  in new_groups.keys() if g not in ['x', 'y']]
-    new_variables = {'w':'w'}
+    # redefine groups; remove and store (eventual) names
+    new_groups = [c for c in tmp_df.columns if c in ['x', 'y', 'group', 'facet_x', 'facet_y']]
+    non_xy_groups = [g for g in new_groups if g not in ['x', 'y']]
 
-    # bin data (if necessary)
+    # bin data (if necessary): binned columns are aggregated on their integer bin codes
+    binnings = {}
     if tmp_df['x'].dtypes != np.dtype('O'):
-        tmp_df['x'], bins_x, bin_width_x= bin_data(tmp_df['x'], bins[0], bin_width[0])
+        tmp_df['x'], binnings['x'] = bin_codes(tmp_df['x'], bins[0], bin_width[0])
+        bin_width_x = binnings['x'].width
     else:
         bin_width_x=1
     if y is not None:
         if tmp_df['y'].dtypes != np.dtype('O'):
-            tmp_df['y'], bins_y, bin_width_y = bin_data(tmp_df['y'], bins[1], bin_width[1])
+            tmp_df['y'], binnings['y'] = bin_codes(tmp_df['y'], bins[1], bin_width[1])
+            bin_width_y = binnings['y'].width
         else:
             bin_width_y=1
     else:
         bin_width_y=1
+    if binnings:
+        tmp_df = tmp_df[(tmp_df[list(binnings.keys())] >= 0).all(axis=1)]
+
+    # count (and normalize) weights on all the combinations of bins and groups
+    gdata = group_histogram(tmp_df, new_groups, 'w',
+                            normalize_cols=non_xy_groups if normalize else None,
+                            sparse=sparse and (y is not None),
+                            max_rows=MAX_FILL_ROWS)
+    if normalize:
+        gdata['w'] /= bin_width_x * bin_width_y
 
-    # aggregate data and reorder columns
-    gdata = agg_data(tmp_df, new_variables, new_groups, 'sum', fill_groups=True)
-    gdata.fillna(0, inplace=True)
+    # replace bin codes with bin centers and reorder columns
+    for c, binning in binnings.items():
+        gdata[c] = binning.labels(gdata[c])
     gdata = gdata[[c for c in ['x', 'y', 'w', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
 
-    # normalize
-    if normalize:
-        if len(non_xy_groups)==0:
-            gdata['w'] = gdata['w']/(gdata['w'].sum()*bin_width_x*bin_width_y)
-        else:
-            gdata['w'] = gdata.groupby(non_xy_groups)['w'].apply(lambda x: x/(x.sum()*bin_width_x*bin_width_y))
-
     # start plotting
     g = EZPlot(gdata)
     # determine order and create a categorical type
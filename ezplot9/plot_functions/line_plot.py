@@ -21,14 +21,17 @@ def line_plot(df,
               err = None,
               show_points=False,
               base_size=10,
-              figure_size=(6, 3)):
+              figure_size=(6, 3),
+              n_jobs=1,
+              where=None):
   '''
   Aggregates data in df and plots multiple columns as a line chart.
 
   Parameters
   ----------
-  df : pd.DataFrame
-    input dataframe
+  df : pd.DataFrame, iterator of pd.DataFrame, str or pyarrow.dataset.Dataset
+    input dataframe (or iterator of dataframe chunks, eg pd.read_csv(..., chunksize=n), or parquet
+    path / pyarrow dataset, reading only the columns used in the plot)
   x : str
     quoted expression to be plotted on the x axis
   y : str or list of str
@@ -49,6 +52,10 @@ def line_plot(df,
     base size for theme_ez
   figure_size :tuple of int
     figure size
+  n_jobs : int
+    number of worker processes used for aggregating (-1 means all the available cores)
+  where : str
+    quoted expression used to filter the rows before aggregating
 
   Returns
   -------
@@ -68,9 +75,6 @@ def line_plot(df,
   if isinstance(y, list) and len(y)==1:
     y = y[0]
 
-  # create a copy of the data
-  dataframe = df.copy()
-
   # define groups and variables; remove and store (eventual) names
   names = {}
   groups = {}
@@ -82,7 +86,7 @@ def line_plot(df,
   # fix special cases
   if x == '.index':
     groups['x'] = '.index'
-    names['x'] = dataframe.index.name if dataframe.index.name is not None else ''
+    names['x'] = df.index.name if isinstance(df, pd.DataFrame) and df.index.name is not None else ''
 
   if isinstance(y, list):
 
@@ -92,7 +96,7 @@ def line_plot(df,
       names['y_{}'.format(i)], variables['y_{}'.format(i)] = unname(var)
 
     # aggregate data
-    tmp_gdata = agg_data(dataframe, variables, groups, aggfun, fill_groups=True)
+    tmp_gdata = agg_data(df, variables, groups, aggfun, fill_groups=True, n_jobs=n_jobs, where=where)
     groups_present = [c for c in ['x', 'facet_x', 'facet_y'] if c in tmp_gdata.columns]
     gdata = pd.melt(tmp_gdata, groups_present, var_name='group', value_name='y')
     gdata['group'] = gdata['group'].replace({var: names[var] for var in ys})
@@ -109,7 +113,7 @@ def line_plot(df,
       names['err'], variables['err'] = unname(err)
 
     # aggregate data
-    gdata = agg_data(dataframe, variables, groups, aggfun, fill_groups=True)
+    gdata = agg_data(df, variables, groups, aggfun, fill_groups=True, n_jobs=n_jobs, where=where)
 
   # reorder columns
   gdata = gdata[[c for c in ['x', 'y', 'err', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
@@ -7,7 +7,7 @@ from ..utilities.utils import unname, sort_data_groups
 from ..utilities.labellers import ez_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
-from ..utilities.binning import bin_data, qbin_data
+from ..utilities.binning import bin_codes, qbin_data
 from .ezplot import EZPlot
 
 import logging
@@ -26,7 +26,8 @@ def marginal_plot(df,
                   label_function=ez_labels,
                   sort_groups=True,
                   base_size=10,
-                  figure_size=(6, 3)):
+                  figure_size=(6, 3),
+                  n_jobs=1):
 
     '''
     Bin the data in a df and plot it using lines.
@@ -61,6 +62,8 @@ def marginal_plot(df,
       base size for theme_ez
     figure_size :tuple of int
       figure size
+    n_jobs : int
+      number of worker processes used for aggregating (-1 means all the available cores)
 
     Returns
     -------
@@ -79,9 +82,6 @@ def marginal_plot(df,
     else:
         show_labels = True if label_pos=='force' else False
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -92,24 +92,25 @@ def marginal_plot(df,
     names['y'], variables['y'] = unname(y)
 
     # set column names and evaluate expressions
-    tmp_df = agg_data(dataframe, variables, groups, None, fill_groups=False)
+    tmp_df = agg_data(df, variables, groups, None, fill_groups=False)
 
     # redefine groups and variables; remove and store (eventual) names
     new_groups = {c:c for c in tmp_df.columns if c in ['x', 'group', 'facet_x', 'facet_y']}
     new_variables = {'y': 'y'}
 
-    # bin data
+    # bin data (equally spaced bins are aggregated on their integer bin codes)
+    binning = None
     if use_quantiles:
         quantile_groups = [c for c in tmp_df.columns if c in ['group', 'facet_x', 'facet_y']]
-        if len(quantile_groups)>0:
-            tmp_df['x'] = tmp_df.groupby(quantile_groups)['x'].apply(lambda x: qbin_data(x, bins))
-        else:
-            tmp_df['x'] = qbin_data(tmp_df['x'], bins)
+        tmp_df['x'] = qbin_data(tmp_df['x'], bins, tmp_df[quantile_groups] if quantile_groups else None)
     else:
-        tmp_df['x'], _, _ = bin_data(tmp_df['x'], bins, None)
+        tmp_df['x'], binning = bin_codes(tmp_df['x'], bins, None)
+        tmp_df = tmp_df[tmp_df['x'] >= 0]
 
     # aggregate data and reorder columns
-    gdata = agg_data(tmp_df, new_variables, new_groups, aggfun, fill_groups=False)
+    gdata = agg_data(tmp_df, new_variables, new_groups, aggfun, fill_groups=False, n_jobs=n_jobs)
+    if binning is not None:
+        gdata['x'] = binning.labels(gdata['x'])
 
     # reorder columns
     gdata = gdata[[c for c in ['x', 'y', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
@@ -143,6 +144,8 @@ def marginal_plot(df,
             .groupby(groups_to_count)['counts'] \
             .sum()\
             .reset_index()
+        if binning is not None:
+            top_labels['x'] = binning.labels(top_labels['x'])
         top_labels['label'] = label_function(top_labels['counts'])
         
         # make sure labels and  data can be joined
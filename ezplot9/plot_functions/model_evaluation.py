@@ -0,0 +1,208 @@
+import pandas as pd
+
+from ..utilities.agg_data import agg_data
+from ..utilities.utils import unname
+from ..utilities.roc import MAX_ROC_POINTS, roc_data
+from ..utilities.calibration import calibration_data
+from .roc_plot import draw_roc
+from .calibration_plot import draw_calibration
+
+import logging
+log = logging.getLogger(__name__)
+
+class ModelEvaluation:
+    '''
+    Metrics of several models (ie probability columns) against the same binary target, without
+    building any plot. The expressions are evaluated once, then AUC and ROC curves of all the
+    models and groups are computed with a single sort (see roc.roc_data) and calibration bins
+    with a single aggregation (see calibration.calibration_data). Plots are built on demand,
+    for the selected models only.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+      input dataframe
+    target : str
+      quoted expression with the target
+    prob : str or list of str
+      quoted expressions with the probabilities of the models (their names are used as model
+      names)
+    group : str
+      quoted expression to be used as group
+    pos_label : int or str
+      positive label
+    bins : int
+      number of calibration bins of each model
+    use_quantiles : bool
+      bin the probabilities of each model (and group) using their quantiles
+    max_points : int or None
+      maximum number of points of each ROC curve (all the thresholds are kept if None)
+
+    Attributes
+    ----------
+    auc_df : pd.DataFrame
+      model, group, auc, positives and negatives of each curve
+    roc_df : pd.DataFrame
+      model, group, x (false positive rate) and y (true positive rate) of each point
+    calibration_df : pd.DataFrame
+      model, group, x (bin center, or mean probability with quantile bins), score (mean
+      probability), y (fraction of positives) and count of each calibration bin
+
+    '''
+
+    def __init__(self,
+                 df,
+                 target,
+                 prob,
+                 group=None,
+                 pos_label=1,
+                 bins=10,
+                 use_quantiles=False,
+                 max_points=MAX_ROC_POINTS):
+
+        if not isinstance(prob, list):
+            prob = [prob]
+
+        # define groups and variables; remove and store (eventual) names
+        names = {}
+        groups = {}
+        variables = {}
+
+        for label, var in zip(['x', 'group'], [target, group]):
+            names[label], groups[label] = unname(var)
+
+        ys = []
+        for i, var in enumerate(prob):
+            ys.append('y_{}'.format(i))
+            names['y_{}'.format(i)], variables['y_{}'.format(i)] = unname(var)
+
+        self.models = [names[y] for y in ys]
+        if len(set(self.models)) < len(self.models):
+            log.error('model names should be unique')
+            raise ValueError('model names should be unique')
+        self.group_name = names['group'] if group is not None else None
+
+        # evaluate the expressions once and compute the metrics of all the models at once
+        data = agg_data(df, variables, groups, None, fill_groups=False)
+        group_cols = [c for c in ['group'] if groups.get(c) is not None]
+        roc_df, auc_df = roc_data(data, 'x', ys, group_cols, pos_label, max_points)
+        calibration_df = calibration_data(data, 'x', ys, group_cols, bins, use_quantiles, pos_label)
+
+        self.auc_df = self._tidy(auc_df, names)
+        self.roc_df = self._tidy(roc_df, names)
+        self.calibration_df = self._tidy(calibration_df.rename(columns={'target': 'y'}), names)
+
+    def __repr__(self):
+        return 'ModelEvaluation(models={}, curves={})'.format(len(self.models), len(self.auc_df))
+
+    @staticmethod
+    def _tidy(df, names):
+        # model names instead of the internal column names
+        df = df.rename(columns={'variable': 'model'})
+        df['model'] = df['model'].map(names)
+        return df
+
+    def _select(self, df, models):
+        # rows of the selected models (in the given order)
+        if models is None:
+            return df
+        if not isinstance(models, list):
+            models = [models]
+        missing = [m for m in models if m not in self.models]
+        if len(missing) > 0:
+            log.error('unknown models: {}'.format(missing))
+            raise ValueError('unknown models: {}'.format(missing))
+        df = df[df['model'].isin(models)].copy()
+        df['model'] = pd.Categorical(df['model'], categories=models, ordered=True)
+        return df.sort_values('model', kind='stable')
+
+    def _plot_data(self, df, models):
+        # data of the selected models with the column used as color
+        df = self._select(df, models)
+        n_models = df['model'].nunique()
+        if self.group_name is not None and n_models > 1:
+            log.error("groups can be plotted only when a single model is selected")
+            raise ValueError("groups can be plotted only when a single model is selected")
+
+        if n_models > 1:
+            return df.assign(group=df['model']), 'Model'
+        elif self.group_name is not None:
+            return df, self.group_name
+        return df.assign(group=''), None
+
+    def top(self, n=10, ascending=False):
+        '''
+        Models sorted by their AUC (the mean AUC of the groups if a group is given)
+
+        Parameters
+        ----------
+        n : int or None
+          number of models to be returned (all the models if None)
+        ascending : bool
+          sort from the lowest AUC
+
+        Returns
+        -------
+        models : list of str
+
+        '''
+        auc = self.auc_df.groupby('model', sort=False)['auc'].mean()
+        auc = auc.sort_values(ascending=ascending, kind='stable')
+        return list(auc.index[:n])
+
+    def roc_plot(self,
+                 models=None,
+                 base_size=10,
+                 figure_size=(6, 3)):
+        '''
+        Plot the ROC curves of the selected models
+
+        Parameters
+        ----------
+        models : str, list of str or None
+          models to be plotted (all the models if None)
+        base_size : int
+          base size for theme_ez
+        figure_size :tuple of int
+          figure size
+
+        Returns
+        -------
+        g : EZPlot
+          EZplot object
+        auc_df : pd.DataFrame
+          auc, group and label of each curve
+
+        '''
+        roc_df, group_name = self._plot_data(self.roc_df, models)
+        auc_df, _ = self._plot_data(self.auc_df, models)
+        return draw_roc(roc_df, auc_df, group_name, base_size, figure_size)
+
+    def calibration_plot(self,
+                         models=None,
+                         xy_range=((0,1), (0,1)),
+                         base_size=10,
+                         figure_size=(6, 3)):
+        '''
+        Plot the calibration curves of the selected models
+
+        Parameters
+        ----------
+        models : str, list of str or None
+          models to be plotted (all the models if None)
+        xy_range : tuple
+          limits of the x and y axes
+        base_size : int
+          base size for theme_ez
+        figure_size :tuple of int
+          figure size
+
+        Returns
+        -------
+        g : EZPlot
+          EZplot object
+
+        '''
+        calibration_df, group_name = self._plot_data(self.calibration_df, models)
+        return draw_calibration(calibration_df[['x', 'y', 'count', 'group']], group_name, xy_range,
+                                base_size=base_size, figure_size=figure_size)
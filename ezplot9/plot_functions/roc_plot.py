@@ -1,13 +1,11 @@
 import plotnine as p9
-from ..utilities.agg_data import agg_data
+from ..utilities.agg_data import agg_data, eval_chunks
 from ..utilities.utils import unname
 from ..utilities.labellers import percent_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
+from ..utilities.roc import MAX_ROC_POINTS, SCORE_BINS, ScoreHistogram, roc_data
 from .ezplot import EZPlot
-from .line_plot import line_plot
-
-from sklearn.metrics import auc, roc_curve
 
 import pandas as pd
 import numpy as np
@@ -15,26 +13,18 @@ import numpy as np
 import logging
 log = logging.getLogger(__name__)
 
+# columns of the AUC dataframe returned with the plot
+AUC_COLUMNS = ['auc', 'auc_error', 'positives', 'negatives', 'group']
 
-def compute_roc_params(target, prob, pos_label):
-    fpr, tpr, th = roc_curve(target, prob, pos_label)
-    auc_value = auc(fpr, tpr)
-    fpr = np.round(fpr, 4)
-    tpr = np.round(tpr, 4)
-
-    roc_df = pd.DataFrame({'x': fpr, 'y': tpr}) \
-        .groupby('x') \
-        .first() \
-        .reset_index()
-
-    auc_df = pd.DataFrame({'auc':auc_value}, index = [0])
-    return roc_df, auc_df
 
 def roc_plot(df,
              target,
              prob,
              group=None,
              pos_label=1,
+             max_points=MAX_ROC_POINTS,
+             resolution=None,
+             score_range=(0, 1),
              base_size=10,
              figure_size=(6, 3)):
     '''
@@ -42,8 +32,9 @@ def roc_plot(df,
 
     Parameters
     ----------
-    df : pd.DataFrame
-      input dataframe
+    df : pd.DataFrame, iterator of pd.DataFrame, str or pyarrow.dataset.Dataset
+      input dataframe. Iterators of chunks, parquet paths and pyarrow datasets are processed
+      chunk by chunk with score histograms (see roc.ScoreHistogram)
     target : str
       columns with targets
     prob : str or list of str
@@ -52,6 +43,16 @@ def roc_plot(df,
       quoted expression to be used as group (ie color)
     pos_label : int
       positive label
+    max_points : int or None
+      maximum number of points of each curve (all the thresholds are kept if None)
+    resolution : int or None
+      if given, approximate the curves with histograms of resolution score bins (the bound
+      of the AUC error is reported in the auc_error column of auc_df). Chunked inputs use
+      roc.SCORE_BINS bins if None
+    score_range : tuple or None
+      (low, high) range of the score bins (scores outside the range are counted in the first
+      or last bin, with a warning). If None, the range of the scores is used, which is only
+      possible when df is a single dataframe (eg for logits)
     base_size : int
       base size for theme_ez
     figure_size :tuple of int
@@ -61,6 +62,9 @@ def roc_plot(df,
     -------
     g : EZPlot
       EZplot object
+    auc_df : pd.DataFrame
+      auc, positives, negatives, group and label of each curve (and auc_error if the curves
+      are approximated with score histograms)
 
     '''
 
@@ -71,9 +75,6 @@ def roc_plot(df,
     if isinstance(prob, list) and len(prob) == 1:
         prob = prob[0]
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -85,65 +86,90 @@ def roc_plot(df,
     # fix special cases
     if target == '.index':
         groups['x'] = '.index'
-        names['x'] = dataframe.index.name if dataframe.index.name is not None else ''
+        names['x'] = df.index.name if isinstance(df, pd.DataFrame) and df.index.name is not None else ''
 
     if isinstance(prob, list):
-
         ys = []
         for i, var in enumerate(prob):
             ys.append('y_{}'.format(i))
             names['y_{}'.format(i)], variables['y_{}'.format(i)] = unname(var)
 
-        # aggregate data
-        tmp_data = agg_data(dataframe, variables, groups, None, fill_groups=True)
-        groups_present = [c for c in ['x'] if c in tmp_data.columns]
-        data = pd.melt(tmp_data, groups_present, var_name='group', value_name='y')
-        data['group'] = data['group'].replace({var: names[var] for var in ys})
-
         # update values for plotting
         names['y'] = 'Value'
         names['group'] = 'Variable'
         group = 'Variable'
-
     else:
-
+        ys = ['y']
         names['y'], variables['y'] = unname(prob)
 
-        # aggregate data
-        data = agg_data(dataframe, variables, groups, None, fill_groups=True)
+    group_cols = [c for c in ['group'] if groups.get(c) is not None]
+    if (resolution is None) and isinstance(df, pd.DataFrame):
+        # compute roc curves and auc of all the groups and probability columns at once
+        data = agg_data(df, variables, groups, None, fill_groups=False)
+        roc_df, auc_df = roc_data(data, 'x', ys, group_cols, pos_label, max_points)
+    else:
+        # accumulate score histograms chunk by chunk
+        if (score_range is None) and not isinstance(df, pd.DataFrame):
+            log.error("score_range should be given for chunked inputs")
+            raise ValueError("score_range should be given for chunked inputs")
+        low, high = score_range if score_range is not None else (None, None)
+        histogram = ScoreHistogram(resolution or SCORE_BINS, low, high)
+        for chunk in eval_chunks(df, variables, groups):
+            histogram.update(chunk, 'x', ys, group_cols, pos_label)
+        roc_df, auc_df = histogram.roc_data(max_points)
+    if len(ys) > 1:
+        roc_df['group'] = roc_df['variable'].map(names)
+        auc_df['group'] = auc_df['variable'].map(names)
+    elif len(group_cols) == 0:
+        roc_df['group'] = ''
+        auc_df['group'] = ''
+    return draw_roc(roc_df, auc_df, names['group'] if group is not None else None,
+                    base_size, figure_size)
+
+def draw_roc(roc_df,
+             auc_df,
+             group_name=None,
+             base_size=10,
+             figure_size=(6, 3)):
+    '''
+    Plot precomputed ROC curves (see roc.roc_data) with their AUC in the legend
 
-    # add fake group column if group is not present
-    if not ('group' in data.columns):
-        data['group'] = ''
+    Parameters
+    ----------
+    roc_df : pd.DataFrame
+      x (false positive rate), y (true positive rate) and group of each point
+    auc_df : pd.DataFrame
+      auc and group of each curve (auc_error, positives and negatives are kept if present)
+    group_name : str or None
+      title of the legend of the groups (a single curve is plotted without legend if None)
+    base_size : int
+      base size for theme_ez
+    figure_size :tuple of int
+      figure size
 
-    # reorder columns and categories
-    data = data[[c for c in ['x', 'y', 'group'] if c in data.columns]]
+    Returns
+    -------
+    g : EZPlot
+      EZplot object
+    auc_df : pd.DataFrame
+      auc, group and label of each curve
 
-    # compute roc curve parameters
-    roc_dfs = {}
-    auc_dfs = {}
-    for g_name, g_df in data.groupby('group'):
-        roc_dfs[g_name], auc_dfs[g_name] = compute_roc_params(g_df['x'], g_df['y'], pos_label)
+    '''
 
-    roc_df = pd.concat(roc_dfs, names = ['group']) \
-        .reset_index()[['x', 'y', 'group']]
+    roc_df = roc_df[['x', 'y', 'group']].copy()
     roc_df['group'] = pd.Categorical(roc_df['group'], ordered=True)
 
-    auc_df = pd.concat(auc_dfs, names = ['group']) \
-        .reset_index()[['auc', 'group']]
-
+    auc_df = auc_df[[c for c in AUC_COLUMNS if c in auc_df.columns]].copy()
     auc_df['label'] = auc_df['auc'].apply(lambda x: '{:.4f}'.format(x))
     auc_df['tmp'] = -1
     
-    # fix group order
+    # fix group order (legend keys are the groups, labelled with their AUC, since different
+    # groups can have the same label)
     auc_df['group'] = pd.Categorical(auc_df['group'],
                                      categories = roc_df['group'].cat.categories,
                                      ordered=True)
-    group_2_auc = auc_df[['group', 'label']].set_index('group').to_dict('index')
-    label_categories = [group_2_auc[c]['label'] for c in roc_df['group'].cat.categories]
-    auc_df['label'] =  pd.Categorical(auc_df['label'],
-                                      categories = label_categories,
-                                      ordered=True)
+    group_2_label = dict(zip(auc_df['group'], auc_df['label']))
+    auc_labels = [group_2_label[c] for c in roc_df['group'].cat.categories]
 
     # init plot obj
     g = EZPlot(roc_df)
@@ -152,11 +178,11 @@ def roc_plot(df,
     colors = np.flip(ez_colors(g.n_groups('group')))
 
     # set groups
-    if group is None:
+    if group_name is None:
         g += p9.geom_line(p9.aes(x="x", y="y"), group=1, colour=ez_colors(1)[0])
     else:
         g += p9.geom_line(p9.aes(x="x", y="y", group="factor(group)", colour="factor(group)"))
-        g += p9.scale_color_manual(values=colors, name = names['group'])
+        g += p9.scale_color_manual(values=colors, name = group_name)
         
     g += p9.geom_line(p9.aes(x='guide_x', y='guide_y'),
                       data=pd.DataFrame(data={'guide_x':[0,1], 'guide_y':[0,1]}),
@@ -169,11 +195,11 @@ def roc_plot(df,
     g += p9.scale_x_continuous(labels=percent_labels, limits=[0,1])
     g += p9.scale_y_continuous(labels=percent_labels, limits=[0,1])
     
-    g+=p9.geom_point(p9.aes(x='tmp', y='tmp', fill = 'label', group='factor(group)'),
+    g+=p9.geom_point(p9.aes(x='tmp', y='tmp', fill = 'group', group='factor(group)'),
                      data = auc_df,
                      stroke=0,
                      size=3)
-    g+=p9.scale_fill_manual(values=colors, name = 'AUC')
+    g+=p9.scale_fill_manual(values=colors, labels=auc_labels, name = 'AUC')
 
     # set theme
     g += theme_ez(figure_size = figure_size,
@@ -1,11 +1,19 @@
+import numpy as np
+import pandas as pd
 import plotnine as p9
 from ..utilities.agg_data import agg_data
 from ..utilities.utils import unname
 from ..utilities.labellers import ez_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
+from ..utilities.raster import raster_data, raster_shape
 from .ezplot import EZPlot
 
+import logging
+log = logging.getLogger(__name__)
+
+RENDER_MODES = ['points', 'raster']
+
 
 def scatter_plot(df,
                  x,
@@ -13,6 +21,7 @@ def scatter_plot(df,
                  group = None,
                  facet_x = None,
                  facet_y = None,
+                 render = 'points',
                  base_size = 10,
                  figure_size = (6,3),
                  **kwargs):
@@ -33,12 +42,17 @@ def scatter_plot(df,
       quoted expression to be used as facet
     facet_y : str
       quoted expression to be used as facet
+    render : str
+      'points' (one marker for each row) or 'raster' (points are aggregated on a grid of
+      figure_size times the figure dpi pixels, split among the facets, and drawn as a single
+      geom_raster layer colored by the number of points of each pixel, or by the most frequent
+      group of each pixel). Use 'raster' for numeric x and y with millions of points
     base_size : int
       base size for theme_ez
     figure_size :tuple of int
       figure size
     **kwargs:
-      additional kwargs passed to geom_point
+      additional kwargs passed to geom_point (or geom_raster)
 
     Returns
     -------
@@ -47,9 +61,6 @@ def scatter_plot(df,
 
     '''
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -62,20 +73,64 @@ def scatter_plot(df,
     # fix special cases
     if x == '.index':
         groups['x'] = '.index'
-        names['x'] = dataframe.index.name if dataframe.index.name is not None else ''
+        names['x'] = df.index.name if df.index.name is not None else ''
+
+    if render not in RENDER_MODES:
+        log.error('render should be one of {}'.format(RENDER_MODES))
+        raise ValueError('render should be one of {}'.format(RENDER_MODES))
 
     # aggregate data and reorder columns
-    gdata = agg_data(dataframe, variables, groups, None, fill_groups=True)
+    gdata = agg_data(df, variables, groups, None, fill_groups=False)
     gdata = gdata[[c for c in ['x', 'y', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
 
+    if render == 'raster':
+        for c in ['x', 'y']:
+            if not np.issubdtype(gdata[c].dtype, np.number):
+                log.error('raster rendering is only available for numeric x and y')
+                raise ValueError('raster rendering is only available for numeric x and y')
+
+        # panels of the facets (as in facet_wrap and facet_grid)
+        n_cols, n_rows = 1, 1
+        if facet_x is not None and facet_y is None:
+            n_panels = gdata['facet_x'].nunique()
+            n_cols = int(np.ceil(np.sqrt(n_panels)))
+            n_rows = int(np.ceil(n_panels / max(n_cols, 1)))
+        if facet_x is not None and facet_y is not None:
+            n_cols, n_rows = gdata['facet_x'].nunique(), gdata['facet_y'].nunique()
+
+        # aggregate the points on the pixels of each panel
+        width, height = raster_shape(figure_size, max(n_cols, 1), max(n_rows, 1))
+        facet_cols = [c for c in ['facet_x', 'facet_y'] if c in gdata.columns]
+        gdata = raster_data(gdata, 'x', 'y', facet_cols, 'group' if group is not None else None,
+                            width, height)
+        if group is not None:
+            # empty pixels are missing values (not a level) of the group
+            gdata['group'] = pd.Categorical(gdata['group'])
+
     # add group_x column
-    if group is not None:
+    elif group is not None:
         gdata['group_x'] = gdata['group'].astype('str') + '_' + gdata['x'].astype(str)
 
     g = EZPlot(gdata)
 
     # set groups
-    if group is None:
+    if render == 'raster' and group is None:
+        g += p9.geom_raster(p9.aes(x="x", y="y", fill="count"), **kwargs)
+        g += p9.scale_fill_gradient(low='#DDDDDD', high=ez_colors(1)[0], trans='log10',
+                                    labels=ez_labels, na_value='#FFFFFF00', name='Count')
+    elif render == 'raster':
+        g += p9.geom_raster(p9.aes(x="x", y="y", fill="group"), show_legend=False, **kwargs)
+        categories = list(g.data['group'].cat.categories)
+        g += p9.scale_fill_manual(values=ez_colors(len(categories)),
+                                  breaks=categories,
+                                  na_value='#FFFFFF00')
+
+        # legend keys of geom_raster cannot be drawn: use transparent points (one for each group)
+        legend_data = g.data.dropna(subset=['group']).drop_duplicates('group')
+        g += p9.geom_point(p9.aes(x="x", y="y", fill="group"),
+                           data=legend_data, shape='s', stroke=0, alpha=0)
+        g += p9.guides(fill=p9.guide_legend(override_aes={'alpha': 1, 'size': 4}))
+    elif group is None:
         g += p9.geom_point(p9.aes(x="x", y="y"),
                            colour = ez_colors(1)[0], **kwargs)
     else:
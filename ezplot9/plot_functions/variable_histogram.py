@@ -7,7 +7,7 @@ from ..utilities.utils import unname
 from ..utilities.labellers import ez_labels
 from ..utilities.colors import ez_colors
 from ..utilities.themes import theme_ez
-from ..utilities.binning import bin_data
+from ..utilities.binning import column_histograms
 from .ezplot import EZPlot
 
 import logging
@@ -16,6 +16,7 @@ log = logging.getLogger(__name__)
 POSITION_KWARGS = {'overlay':{'position':'identity', 'alpha':0.7},
                    'stack':{},
                    'dodge':{'position':'dodge'}}
+MAX_LABEL_FIGURES = 16
 
 def variable_histogram(df,
                        x,
@@ -27,7 +28,8 @@ def variable_histogram(df,
                        position = 'stack',
                        normalize = False,
                        base_size=10,
-                       figure_size=(6, 3)):
+                       figure_size=(6, 3),
+                       n_jobs=1):
 
     '''
     Plot a 1-d histogram
@@ -37,7 +39,8 @@ def variable_histogram(df,
     df : pd.DataFrame
       input dataframe
     x : str or list
-      quoted expressions to be plotted on the x axis
+      quoted expressions to be plotted on the x axis (numeric expressions are binned, other
+      expressions are counted by value)
     group : str
       quoted expression to be used as group (ie color)
     facet_y : str
@@ -56,6 +59,8 @@ def variable_histogram(df,
       base size for theme_ez
     figure_size :tuple of int
       figure size
+    n_jobs : int
+      number of threads used to bin the x expressions (-1 means all the available cores)
 
     Returns
     -------
@@ -64,9 +69,6 @@ def variable_histogram(df,
 
     '''
 
-    # TODO: performance improvement
-    # TODO: add support for categorical variables in x
-
     if position not in ['overlay', 'stack', 'dodge']:
         log.error("position not recognized")
         raise NotImplementedError("position not recognized")
@@ -82,9 +84,6 @@ def variable_histogram(df,
     if isinstance(x, str):
         x=[x]
 
-    # create a copy of the data
-    dataframe = df.copy()
-
     # define groups and variables; remove and store (eventual) names
     names = {}
     groups = {}
@@ -99,63 +98,44 @@ def variable_histogram(df,
     names['w'], variables['w'] = unname(w)
 
     # set column names and evaluate expressions
-    tmp_df = agg_data(dataframe, variables, groups, None, fill_groups=False)
-
-    # redefine groups and variables; remove and store (eventual) names
-    new_groups = {c:c for c in tmp_df.columns if c in ['group', 'facet_y'] + xs}
-    non_x_groups = [g for g  in new_groups.keys() if g not in xs]
-
-    # bin data (if necessary)
-    bins_x={}
-    bin_width_x={}
-    for x in xs:
-        if tmp_df[x].dtypes != np.dtype('O'):
-            tmp_df[x], bins_x[x], bin_width_x[x]= bin_data(tmp_df[x], bins, bin_width)
-        else:
-            bin_width_x[x]=1
-
-    # aggregate data and reorder columns
-    df_ls=[]
-    for x in xs:
-        # aggregate data
-        groups = {g:g for g in non_x_groups}
-        groups[x] = x
-        single_df = agg_data(tmp_df, variables, groups, 'sum', fill_groups=True)
-        single_df.fillna(0, inplace=True)
-        single_df['facet_x']=names[x]
-        single_df.rename(columns={x:'x'}, inplace=True)
-
-        # normalize
-        if normalize:
-            if len(non_x_groups)==0:
-                single_df['w'] = single_df['w']/(single_df['w'].sum()*bin_width_x[x])
-            else:
-                single_df['w'] = single_df.groupby(non_x_groups)['w'].apply(lambda z: z/(z.sum()*bin_width_x[x]))
-
-        df_ls.append(single_df)
-    gdata = pd.concat(df_ls)
-    gdata = gdata[[c for c in ['x', 'w', 'group', 'facet_x', 'facet_y'] if c in gdata.columns]]
+    tmp_df = agg_data(df, variables, groups, None, fill_groups=False)
+
+    # histograms of all the x columns
+    non_x_groups = [g for g in ['group', 'facet_y'] if g in tmp_df.columns]
+    gdata = column_histograms(tmp_df, xs, non_x_groups, 'w', bins, bin_width, normalize, n_jobs)
+    gdata['facet_x'] = gdata.pop('variable').map(names)
+
+    # non numeric x: all the facets use discrete x values (bins are labelled by their centers,
+    # with enough figures to tell the bins of each facet apart)
+    discrete_x = gdata['x'].map(lambda v: isinstance(v, str)).any()
+    if discrete_x:
+        numeric = gdata['x'].map(lambda v: not isinstance(v, str))
+        for _, rows in gdata[numeric].groupby('facet_x', sort=False):
+            gdata.loc[rows.index, 'x'] = bin_labels(rows['x'])
+        gdata['x'] = pd.Categorical(gdata['x'], categories=pd.unique(gdata['x']))
+        gdata['width'] = 1
+    else:
+        gdata['x'] = gdata['x'].astype(float)
+    gdata['width'] *= 0.9
+    gdata = gdata[[c for c in ['x', 'w', 'group', 'facet_x', 'facet_y', 'width'] if c in gdata.columns]]
 
     # start plotting
     g = EZPlot(gdata)
 
     # set groups
-    for single_df in df_ls:
-        if group is None:
-            g += p9.geom_bar(p9.aes(x="x", y="w"),
-                             data=single_df,
-                             stat = 'identity',
-                             colour = None,
-                             fill = ez_colors(1)[0])
-        else:
-            g += p9.geom_bar(p9.aes(x="x", y="w",
-                                    group="factor(group)",
-                                    fill="factor(group)"),
-                             data=single_df,
-                             colour=None,
-                             stat = 'identity',
-                             **POSITION_KWARGS[position])
-            g += p9.scale_fill_manual(values=ez_colors(g.n_groups('group')))
+    if group is None:
+        g += p9.geom_bar(p9.aes(x="x", y="w", width="width"),
+                         stat = 'identity',
+                         colour = None,
+                         fill = ez_colors(1)[0])
+    else:
+        g += p9.geom_bar(p9.aes(x="x", y="w", width="width",
+                                group="factor(group)",
+                                fill="factor(group)"),
+                         colour=None,
+                         stat = 'identity',
+                         **POSITION_KWARGS[position])
+        g += p9.scale_fill_manual(values=ez_colors(g.n_groups('group')))
 
     # set facets
     if facet_y is None:
@@ -164,7 +144,10 @@ def variable_histogram(df,
         g += p9.facet_grid('facet_y~facet_x', scales='free')
 
     # set x scale
-    g += p9.scale_x_continuous(labels=ez_labels)
+    if discrete_x:
+        g += p9.scale_x_discrete()
+    else:
+        g += p9.scale_x_continuous(labels=ez_labels)
 
     # set y scale
     g += p9.scale_y_continuous(labels=ez_labels)
@@ -182,3 +165,26 @@ def variable_histogram(df,
     g += p9.guides(fill=p9.guide_legend(reverse=True))
 
     return g
+
+def bin_labels(centers):
+    '''
+    Labels of bin centers (see ez_labels), with the smallest number of figures that keeps the
+    labels of different bins distinct
+
+    Parameters
+    ----------
+    centers : array
+        bin centers (a center can be repeated, eg once for each group)
+
+    Returns
+    -------
+    labels : list of strings
+
+    '''
+    centers = np.asarray(centers, dtype=float)
+    n_bins = len(np.unique(centers))
+    for signif in range(2, MAX_LABEL_FIGURES):
+        labels = ez_labels(centers, signif)
+        if len(set(labels)) == n_bins:
+            return labels
+    return ['{!r}'.format(c) for c in centers]
@@ -1,4 +1,6 @@
 import pytest
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pydataset import data
 
 from ..utilities import agg_data
@@ -21,4 +23,137 @@ def test_get_groups(df, variables, groups,
     data_groups, data_variables, delayed_variables = agg_data.get_groups(df, variables, groups)
     assert data_groups == expected_data_groups
     assert data_variables == expected_data_variables
-    assert delayed_variables == expected_delayed_variables
\ No newline at end of file
+    assert delayed_variables == expected_delayed_variables
+
+def test_eval_expressions():
+    expressions = {'x': 'mpg * 2', 'name': 'model.str.upper()', 'y': 'hp + 1', 'z': 'y + 1'}
+    for i in range(2):
+        df = mtcars.assign(model = mtcars.index)
+        plan = agg_data.eval_expressions(df, expressions)
+        assert [engine for engine, expr in plan] == ['numexpr', 'python', 'numexpr']
+        assert (df['x'] == mtcars['mpg'] * 2).all()
+        assert (df['name'] == mtcars.index.str.upper()).all()
+        assert (df['z'] == mtcars['hp'] + 2).all()
+
+
+def test_eval_expressions_threads(monkeypatch):
+    # concurrent evaluations share the plans (and evict them) safely
+    monkeypatch.setattr(agg_data, 'MAX_EVAL_PLANS', 4)
+    monkeypatch.setattr(agg_data, '_eval_plans', {})
+    def evaluate(i):
+        out_df = pd.DataFrame(index=mtcars.index)
+        agg_data.eval_expressions(mtcars, {'x': 'mpg * {}'.format(i % 16)}, target=out_df, columns=['mpg'])
+        return (out_df['x'] == mtcars['mpg'] * (i % 16)).all()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(executor.map(evaluate, range(400)))
+    assert len(agg_data._eval_plans) <= 4
+
+
+def test_agg_data_does_not_modify_input():
+    df = mtcars.copy()
+    out_df = agg_data.agg_data(df, {'y': 'mpg'}, {'x': '.index', 'group': 'cyl'}, 'sum')
+    assert df.equals(mtcars)
+    assert df.index.name == mtcars.index.name
+    assert list(out_df.columns) == ['x', 'group', 'y']
+    assert sorted(out_df['x']) == sorted(mtcars.index)
+
+get_columns_testdata = [({'y': 'mpg'}, {'x': 'cyl', 'group': None},
+                         ['mpg', 'cyl']),
+                        ({'y': ['mpg/wt', 'hp'], 'z': '@y_0/y_1'}, {'x': '.index', 'group': 'gear>3'},
+                         ['mpg', 'hp', 'wt', 'gear']),
+                        ({'y': 'mpg +'}, {'x': 'cyl'},
+                         None)]
+@pytest.mark.parametrize("variables, groups, expected_columns", get_columns_testdata)
+def test_get_columns(variables, groups, expected_columns):
+    columns = agg_data.get_columns(mtcars, variables, groups)
+    assert columns == expected_columns
+
+fill_data_testdata = [([], 8),
+                      (['facet_x', 'facet_y'], 4)]
+@pytest.mark.parametrize("scope_cols, expected_rows", fill_data_testdata)
+def test_fill_data(scope_cols, expected_rows):
+    df = pd.DataFrame({'x': [1, 2, 1], 'facet_x': ['a', 'a', 'b'], 'facet_y': ['c', 'c', 'd'], 'y': [1., 2., 3.]})
+    out_df = agg_data.fill_data(df, ['x', 'facet_x', 'facet_y'], scope_cols)
+    assert out_df.shape == (expected_rows, 4)
+    assert out_df['y'].sum() == 6
+    assert not out_df.duplicated(['x', 'facet_x', 'facet_y']).any()
+
+
+def test_fill_data_max_rows():
+    with pytest.raises(ValueError):
+        agg_data.agg_data(mtcars, {'y': 'mpg'}, {'x': 'mpg', 'group': 'hp'}, 'sum',
+                          fill_groups=True, max_fill_rows=100)
+
+
+def test_agg_data_backtick_columns():
+    df = mtcars.rename(columns={'mpg': 'my mpg'})
+    out_df = agg_data.agg_data(df, {'y': '`my mpg`'}, {'x': 'cyl'}, 'sum', where='`my mpg` > 20')
+    expected_df = agg_data.agg_data(mtcars, {'y': 'mpg'}, {'x': 'cyl'}, 'sum', where='mpg > 20')
+    pd.testing.assert_frame_equal(out_df, expected_df)
+
+def test_agg_data_without_aggregation():
+    out_df = agg_data.agg_data(mtcars, {'y': 'mpg', 'z': '@y*2'}, {'x': 'wt', 'group': 'gear'}, None)
+    assert len(out_df) == len(mtcars)
+    assert set(out_df.columns) == {'x', 'y', 'z', 'group'}
+    assert (out_df['z'] == 2 * mtcars['mpg'].values).all()
+
+agg_data_chunks_testdata = ['sum', 'mean', 'max', 'median']
+@pytest.mark.parametrize("aggfun", agg_data_chunks_testdata)
+def test_agg_data_chunks(aggfun):
+    variables = {'y': 'mpg', 'z': '@y/2'}
+    groups = {'x': 'cyl', 'group': 'gear'}
+    chunks = (mtcars.iloc[i:i + 7] for i in range(0, len(mtcars), 7))
+    out_df = agg_data.agg_data(chunks, variables, groups, aggfun)
+    expected_df = agg_data.agg_data(mtcars, variables, groups, aggfun)
+    pd.testing.assert_frame_equal(out_df[expected_df.columns], expected_df, check_dtype=False)
+
+
+agg_data_chunks_fallback_testdata = [({'y': 'mpg'}, {}, 'sum'),
+                                     ({'y': 'mpg'}, {}, 'median'),
+                                     ({'y': 'name'}, {'x': 'cyl'}, 'max'),
+                                     ({'y': 'name'}, {'x': 'gear', 'group': 'am'}, 'min')]
+@pytest.mark.parametrize("variables, groups, aggfun", agg_data_chunks_fallback_testdata)
+def test_agg_data_chunks_fallback(variables, groups, aggfun):
+    df = mtcars.assign(name=mtcars.index)
+    chunks = (df.iloc[i:i + 7] for i in range(0, len(df), 7))
+    out_df = agg_data.agg_data(chunks, variables, groups, aggfun)
+    expected_df = agg_data.agg_data(df, variables, groups, aggfun)
+    pd.testing.assert_frame_equal(out_df, expected_df)
+    if len(groups) == 0:
+        assert out_df['y'][0] == getattr(df['mpg'], aggfun)()
+
+def test_agg_data_parallel(monkeypatch):
+    monkeypatch.setattr(agg_data, 'MIN_ROWS_PER_JOB', 1)
+    variables = {'y': 'mpg/wt', 'z': '@y*2'}
+    groups = {'x': 'cyl', 'group': 'gear'}
+    out_df = agg_data.agg_data(mtcars, variables, groups, 'mean', n_jobs=2)
+    expected_df = agg_data.agg_data(mtcars, variables, groups, 'mean')
+    pd.testing.assert_frame_equal(out_df[expected_df.columns], expected_df, check_dtype=False)
+
+
+agg_data_parallel_fallback_testdata = [({'y': 'name'}, {'x': 'cyl'}, 'max'),
+                                       ({'y': 'name'}, {'x': 'gear', 'group': 'am'}, 'min'),
+                                       ({'y': 'mpg'}, {'x': 'cyl_cat'}, 'sum')]
+@pytest.mark.parametrize("variables, groups, aggfun", agg_data_parallel_fallback_testdata)
+def test_agg_data_parallel_fallback(variables, groups, aggfun, monkeypatch):
+    monkeypatch.setattr(agg_data, 'MIN_ROWS_PER_JOB', 1)
+    df = mtcars.assign(name=mtcars.index, cyl_cat=mtcars['cyl'].astype('category'))
+    out_df = agg_data.agg_data(df, variables, groups, aggfun, n_jobs=2)
+    expected_df = agg_data.agg_data(df, variables, groups, aggfun)
+    pd.testing.assert_frame_equal(out_df, expected_df)
+
+agg_data_dataset_testdata = [None, 'cyl > 4', 'gear.isin([3, 4]) & ~(am == 1)', 'mpg > 15 & wt < 4', 'mpg / wt > 5',
+                             'cyl > 4 & mpg / wt > 5']
+@pytest.mark.parametrize("where", agg_data_dataset_testdata)
+def test_agg_data_dataset(where, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'mtcars.parquet')
+    mtcars.to_parquet(path, row_group_size=10)
+    variables = {'y': 'mpg', 'z': '@y/2'}
+    groups = {'x': 'cyl', 'group': 'gear'}
+    out_df = agg_data.agg_data(path, variables, groups, 'mean', where=where)
+    filtered = mtcars if where is None else mtcars.query(where)
+    expected_df = agg_data.agg_data(filtered, variables, groups, 'mean')
+    pd.testing.assert_frame_equal(out_df[expected_df.columns], expected_df, check_dtype=False)
+    in_memory_df = agg_data.agg_data(mtcars, variables, groups, 'mean', where=where)
+    pd.testing.assert_frame_equal(in_memory_df, expected_df)
@@ -0,0 +1,95 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pydataset import data
+
+from ..utilities import binning
+from ..plot_functions.variable_histogram import variable_histogram
+
+mtcars = data('mtcars')
+
+bin_data_testdata = [('mpg', 21), ('hp', 5), ('wt', 2)]
+@pytest.mark.parametrize("x, bins", bin_data_testdata)
+def test_bin_data(x, bins):
+    values = mtcars[x]
+    bin_width = (values.max() - values.min()) / (bins - 1)
+    start = values.min() - 0.5 * bin_width
+    expected = pd.cut(values,
+                      bins=[start + bin_width * i for i in range(bins + 1)],
+                      labels=[values.min() + bin_width * i for i in range(bins)]).astype(float)
+    binned_x, n_bins, out_bin_width = binning.bin_data(values, bins)
+    pd.testing.assert_series_equal(binned_x, expected)
+    assert (n_bins, out_bin_width) == (bins, bin_width)
+
+
+bin_width_testdata = [(0.6, 2), (0.25, 5), (2, 1)]
+@pytest.mark.parametrize("bin_width, expected_bins", bin_width_testdata)
+def test_bin_data_bin_width(bin_width, expected_bins):
+    x = pd.Series([0, 0.5, 1.0, np.nan])
+    binned_x, n_bins, _ = binning.bin_data(x, None, bin_width)
+    assert n_bins == expected_bins
+    assert binned_x[:3].notnull().all() and np.isnan(binned_x[3])
+    assert (np.abs(binned_x[:3] - x[:3]) <= 0.5 * bin_width).all()
+
+
+def test_bins():
+    bins = binning.Bins(0, 1, 3)
+    np.testing.assert_array_equal(bins.edges, [0, 1, 2, 3])
+    codes = bins.codes([0, 0.5, 1, 1.5, 3, 3.5, np.nan])
+    np.testing.assert_array_equal(codes, [-1, 0, 0, 1, 2, -1, -1])
+    np.testing.assert_array_equal(bins.labels(codes), [np.nan, 0.5, 0.5, 1.5, 2.5, np.nan, np.nan])
+    # values on the computed edges are binned as in pd.cut
+    bins = binning.Bins(0.1, 0.1, 10)
+    expected = pd.cut(bins.edges, bins.edges, labels=False)
+    np.testing.assert_array_equal(bins.codes(bins.edges), np.nan_to_num(expected, nan=-1))
+    with pytest.raises(ValueError):
+        binning.bin_codes(mtcars['mpg'], 10, 1)
+
+
+def qcut_means(x, n_quantiles):
+    binned_x = pd.qcut(x, q=n_quantiles, duplicates='drop')
+    means = x.groupby(binned_x).transform('mean')
+    return means.where(binned_x.notnull())
+
+qbin_data_testdata = [('mpg', [], 5),
+                      ('mpg', ['cyl'], 3),
+                      ('hp', ['am', 'gear'], 2),
+                      ('carb', ['am'], 10),
+                      ('carb', ['am'], 1),
+                      ('vs', ['cyl'], 1)]
+@pytest.mark.parametrize("x, group_cols, n_quantiles", qbin_data_testdata)
+def test_qbin_data(x, group_cols, n_quantiles):
+    if group_cols:
+        expected = mtcars.groupby(group_cols, group_keys=False)[x].apply(lambda v: qcut_means(v, n_quantiles))
+        binned_x = binning.qbin_data(mtcars[x], n_quantiles, mtcars[group_cols])
+    else:
+        expected = qcut_means(mtcars[x], n_quantiles)
+        binned_x = binning.qbin_data(mtcars[x], n_quantiles)
+    pd.testing.assert_series_equal(binned_x, expected[mtcars.index].astype(float))
+
+column_histograms_testdata = [([], False, 1), (['am'], True, 2), (['am', 'gear'], False, 1)]
+@pytest.mark.parametrize("group_cols, normalize, n_jobs", column_histograms_testdata)
+def test_column_histograms(group_cols, normalize, n_jobs):
+    df = mtcars.assign(am_s=np.where(mtcars['am'] == 1, 'manual', 'auto'))
+    out_df = binning.column_histograms(df, ['mpg', 'am_s', 'hp'], group_cols, 'wt', 5,
+                                       normalize=normalize, n_jobs=n_jobs)
+    for c in ['mpg', 'am_s', 'hp']:
+        values = df[c] if c == 'am_s' else binning.bin_data(df[c], 5)[0]
+        binned_df = df.assign(x=values)
+        expected = binned_df.groupby(group_cols + ['x'])['wt'].sum()
+        if normalize:
+            expected = expected / (expected.groupby(group_cols).transform('sum') * out_df.loc[out_df['variable'] == c, 'width'].iloc[0])
+        single_df = out_df[out_df['variable'] == c].set_index(group_cols + ['x'])['wt']
+        assert len(single_df) == np.prod([binned_df[g].nunique() for g in group_cols + ['x']])
+        pd.testing.assert_series_equal(single_df[expected.index], expected, check_names=False,
+                                       check_index_type=False)
+
+
+def test_variable_histogram_mixed_columns():
+    # numeric bins whose short labels are equal are kept apart next to a string column
+    df = mtcars.assign(big=1e6 + mtcars['mpg'] * 10, am_s=np.where(mtcars['am'] == 1, 'manual', 'auto'))
+    g = variable_histogram(df, ['big', 'am_s'], bins=13)
+    big = g.data[g.data['facet_x'] == 'big']
+    assert big['x'].nunique() == 13
+    assert big['w'].sum() == len(df)
+    assert set(g.data.loc[g.data['facet_x'] == 'am_s', 'x']) == {'auto', 'manual'}
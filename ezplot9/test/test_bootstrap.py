@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+import bootstrapped.stats_functions as bs_stats
+
+from ..utilities import bootstrap, agg_data
+
+
+def test_group_bootstrap():
+    values = np.array([1., 2., np.nan, 5., -1., 1.])
+    ids = np.array([0, 0, 0, 2, 3, 3])
+    results = bootstrap.group_bootstrap(values, ids, 4, 'mean', 1000, seed=1)
+    assert list(results['sample_size']) == [2, 0, 1, 2]
+    assert np.isnan(results['center'][1]) and np.isnan(results['low'][1])
+    assert (results['low'][2], results['center'][2], results['high'][2]) == (5, 5, 5)
+    assert results['successful'][3] == 0
+    assert (results['low'] <= results['high'])[[0, 2, 3]].all()
+
+    # fixed seeds give the same intervals
+    other = bootstrap.group_bootstrap(values, ids, 4, 'mean', 1000, seed=1)
+    np.testing.assert_array_equal(results['low'], other['low'])
+
+
+get_bootstrap_stat_testdata = [(bs_stats.mean, {}, 'mean'),
+                               (bs_stats.sum, {'alpha': 0.1}, 'sum'),
+                               (bs_stats.median, {}, None),
+                               (bs_stats.mean, {'denominator_values': [1]}, None)]
+@pytest.mark.parametrize("aggfun, kwargs, expected", get_bootstrap_stat_testdata)
+def test_get_bootstrap_stat(aggfun, kwargs, expected):
+    assert bootstrap.get_bootstrap_stat(aggfun, kwargs) == expected
+
+
+def test_group_bootstrap_tolerance():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=3000)
+    ids = np.r_[np.zeros(2000, dtype=int), np.ones(990, dtype=int), np.full(10, 2)]
+    results = bootstrap.group_bootstrap(values, ids, 3, 'mean', 20_000, seed=0, tolerance=0.05, block_size=500)
+    expected = bootstrap.group_bootstrap(values, ids, 3, 'mean', 20_000, seed=0)
+    assert (results['num_iterations'] < 20_000).all()
+    assert (results['num_iterations'] % 500 == 0).all()
+    width = expected['high'] - expected['low']
+    np.testing.assert_allclose(results['low'], expected['low'], atol=0.1 * width.max())
+    np.testing.assert_allclose(results['high'], expected['high'], atol=0.1 * width.max())
+
+
+bootstrapping_aggregation_testdata = [(None, 2000), (0.5, 200)]
+@pytest.mark.parametrize("tolerance, max_iterations", bootstrapping_aggregation_testdata)
+def test_bootstrapping_aggregation(tolerance, max_iterations):
+    x = pd.Series(np.arange(100.))
+    out = agg_data.bootstrapping_aggregation(x, bs_stats.median, 2000, tolerance, block_size=100)
+    assert out['sample_size'] == 100
+    assert out['num_iterations'] <= max_iterations
+    assert out['low'] <= out['center'] <= out['high']
@@ -0,0 +1,59 @@
+import pytest
+import pandas as pd
+from pydataset import data
+
+from ..utilities import agg_data
+from ..utilities.cache import AggregationCache, fingerprint
+
+mtcars = data('mtcars')
+
+
+def test_agg_data_cache():
+    cache = AggregationCache()
+    df = mtcars.copy()
+    variables = {'y': 'mpg', 'z': '@y/2'}
+    groups = {'x': 'cyl', 'group': 'gear'}
+    out_df = agg_data.agg_data(df, variables, groups, 'mean', fill_groups=True, cache=cache)
+    out_df['y'] = 0
+    cached_df = agg_data.agg_data(df, variables, groups, 'mean', fill_groups=True, cache=cache)
+    expected_df = agg_data.agg_data(df, variables, groups, 'mean', fill_groups=True)
+    pd.testing.assert_frame_equal(cached_df, expected_df)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+    # other specs and modified data are not read from the cache
+    agg_data.agg_data(df, variables, groups, 'sum', fill_groups=True, cache=cache)
+    df.loc[df.index[0], 'mpg'] += 1
+    agg_data.agg_data(df, variables, groups, 'mean', fill_groups=True, cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 3)
+
+    # unused columns do not change the fingerprint
+    df.loc[df.index[0], 'hp'] += 1
+    agg_data.agg_data(df, variables, groups, 'mean', fill_groups=True, cache=cache)
+    assert cache.hits == 2
+
+    cache.invalidate(df)
+    assert len(cache) == 2
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_eviction():
+    df = pd.DataFrame({'x': range(100)})
+    nbytes = df.memory_usage(index=True, deep=True).sum()
+    cache = AggregationCache(max_bytes=2 * nbytes)
+    for key in ['a', 'b', 'c']:
+        cache.put(key, df)
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+    cache.put('d', df)
+    assert cache.get('c') is None
+    assert (len(cache), cache.evictions, cache.nbytes) == (2, 2, 2 * nbytes)
+
+
+fingerprint_testdata = [(pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'a': [1, 2]}), True),
+                        (pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'a': [1., 2.]}), False),
+                        (pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'b': [1, 2]}), False),
+                        (pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'a': [1, 2]}, index=[1, 2]), False)]
+@pytest.mark.parametrize("df1, df2, expected", fingerprint_testdata)
+def test_fingerprint(df1, df2, expected):
+    assert (fingerprint(df1) == fingerprint(df2)) == expected
@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pydataset import data
+
+from ..utilities import calibration
+from ..utilities.binning import bin_data, qbin_data
+from ..utilities.intervals import group_intervals
+from ..plot_functions.calibration_plot import calibration_plot
+from ..plot_functions.model_evaluation import ModelEvaluation
+
+mtcars = data('mtcars')
+mtcars['p'] = mtcars['wt'] / 6
+mtcars['q'] = mtcars['mpg'] / 40
+
+calibration_data_testdata = [(['p', 'q'], [], 5, False),
+                             (['p'], ['cyl'], 3, False),
+                             (['p', 'q'], ['vs'], 4, True),
+                             (['q'], ['cyl', 'vs'], 2, True)]
+@pytest.mark.parametrize("score_cols, group_cols, bins, use_quantiles", calibration_data_testdata)
+def test_calibration_data(score_cols, group_cols, bins, use_quantiles):
+    calibration_df = calibration.calibration_data(mtcars, 'am', score_cols, group_cols, bins, use_quantiles)
+    for c in score_cols:
+        if use_quantiles:
+            x = qbin_data(mtcars[c], bins, mtcars[group_cols])
+        else:
+            x, _, _ = bin_data(mtcars[c], bins)
+        expected = mtcars.assign(x=x) \
+            .groupby(group_cols + ['x']) \
+            .agg(score=(c, 'mean'), target=('am', 'mean'), count=('am', 'size')) \
+            .reset_index()
+        result = calibration_df[calibration_df['variable'] == c] \
+            .drop(columns='variable') \
+            .sort_values(group_cols + ['x']) \
+            .reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+calibration_intervals_testdata = [('analytic', []), ('bootstrap', ['vs']), ('auto', ['cyl'])]
+@pytest.mark.parametrize("method, group_cols", calibration_intervals_testdata)
+def test_calibration_intervals(method, group_cols):
+    calibration_df = calibration.calibration_data(mtcars, 'am', ['p'], group_cols, 4,
+                                                  method=method, num_iterations=1000, seed=0)
+    x, _, _ = bin_data(mtcars['p'], 4)
+    expected = group_intervals(mtcars.assign(x=x), group_cols + ['x'], 'am', 'mean', method,
+                               num_iterations=1000, seed=0)
+    result = calibration_df.sort_values(group_cols + ['x']).reset_index(drop=True)
+    expected = expected.sort_values(group_cols + ['x']).reset_index(drop=True)
+    np.testing.assert_allclose(result['target'], expected['center'])
+    if method == 'bootstrap':
+        assert (result['low'] <= result['high']).all()
+    else:
+        np.testing.assert_allclose(result[['low', 'high']], expected[['low', 'high']])
+
+
+calibration_plot_testdata = [(False, None), (True, 'analytic'), (True, 'bootstrap')]
+@pytest.mark.parametrize("use_bootstrapping, method", calibration_plot_testdata)
+def test_calibration_plot(use_bootstrapping, method):
+    g = calibration_plot(mtcars, 'wt/6', 'am', group='vs', facet_x='cyl', bins=5,
+                         use_bootstrapping=use_bootstrapping, method=method, seed=0)
+    expected = calibration.calibration_data(mtcars.assign(p=mtcars['wt'] / 6), 'am', ['p'], ['vs', 'cyl'], 5)
+    assert g.data['count'].sum() == expected['count'].sum() == len(mtcars)
+    assert ('low' in g.data.columns) == use_bootstrapping
+
+
+def test_model_evaluation():
+    evaluation = ModelEvaluation(mtcars, 'am', ['p', 'q', 'hp'], bins=4)
+    assert evaluation.models == ['p', 'q', 'hp']
+    assert evaluation.top(1) == ['q']
+    assert set(evaluation.calibration_df['model']) == {'p', 'q', 'hp'}
+
+    _, auc_df = evaluation.roc_plot(['hp', 'q'])
+    assert list(auc_df['group']) == ['hp', 'q']
+    with pytest.raises(ValueError):
+        evaluation.calibration_plot('r')
+
+    grouped = ModelEvaluation(mtcars, 'am', ['p', 'q'], group='vs')
+    assert len(grouped.auc_df) == 4
+    with pytest.raises(ValueError):
+        grouped.roc_plot()
@@ -0,0 +1,35 @@
+import pytest
+import pandas as pd
+
+from ..utilities import datasets
+
+where_to_arrow_testdata = [('a > 1', True),
+                           ('(a > 1) & (b == "x")', True),
+                           ('a in [1, 2] or not c', True),
+                           ('b.isin(["x", "y"])', True),
+                           ('-1 < a <= 2', True),
+                           ('a > 1 & b == "x" | c', True),
+                           ('a / 2 > 1', False),
+                           ('log(a) > 1', False),
+                           ('a >', False)]
+@pytest.mark.parametrize("where, expected", where_to_arrow_testdata)
+def test_where_to_arrow(where, expected):
+    pytest.importorskip('pyarrow')
+    assert (datasets.where_to_arrow(where) is not None) == expected
+
+
+dataset_chunks_testdata = [('a > 1', None, 3),
+                           ('a > 1 & a < 4', None, 2),
+                           ('a / 2 > 1', 'a / 2 > 1', 4),
+                           ('a > 1 & a / 2 < 2', 'a / 2 < 2', 3),
+                           ('a / 2 < 2 and c & a > 1 & a * 2 > 1', '(a / 2 < 2) & (a * 2 > 1)', 1)]
+@pytest.mark.parametrize("where, expected_where, expected_rows", dataset_chunks_testdata)
+def test_dataset_chunks(where, expected_where, expected_rows, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'df.parquet')
+    pd.DataFrame({'a': [1, 2, 3, 4], 'b': list('xyzx'), 'c': [True, False, True, False]}).to_parquet(path)
+    chunks, remaining_where = datasets.dataset_chunks(path, ['a'], where)
+    df = pd.concat(chunks)
+    assert list(df.columns) == ['a']
+    assert remaining_where == expected_where
+    assert len(df) == expected_rows
@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pydataset import data
+
+import bootstrapped.bootstrap as bs
+import bootstrapped.stats_functions as bs_stats
+
+from ..utilities import intervals
+
+mtcars = data('mtcars')
+
+group_intervals_testdata = [('mean', 'bootstrap', True),
+                            ('sum', 'bootstrap', True),
+                            ('mean', 'bootstrap', False),
+                            ('mean', 'analytic', True),
+                            ('sum', 'auto', True)]
+@pytest.mark.parametrize("stat, method, is_pivotal", group_intervals_testdata)
+def test_group_intervals(stat, method, is_pivotal):
+    out_df = intervals.group_intervals(mtcars, ['cyl'], 'mpg', stat, method, 20_000, seed=0,
+                                       is_pivotal=is_pivotal)
+    assert list(out_df['cyl']) == [4, 6, 8]
+    for _, row in out_df.iterrows():
+        values = mtcars.loc[mtcars['cyl'] == row['cyl'], 'mpg'].values
+        np.random.seed(0)
+        expected = bs.bootstrap(values, getattr(bs_stats, stat), num_iterations=20_000, is_pivotal=is_pivotal)
+        width = expected.upper_bound - expected.lower_bound
+        tolerance = 0.05 if method != 'analytic' else 0.25
+        assert row['sample_size'] == len(values)
+        assert row['center'] == pytest.approx(expected.value, rel=0.01)
+        assert row['low'] == pytest.approx(expected.lower_bound, abs=tolerance * width)
+        assert row['high'] == pytest.approx(expected.upper_bound, abs=tolerance * width)
+        assert row['successful'] == expected.get_result()
+
+
+def test_analytic_intervals():
+    values = np.r_[np.ones(30), np.zeros(70), np.arange(10.), [np.nan]]
+    ids = np.r_[np.zeros(100, dtype=int), np.ones(11, dtype=int)]
+    results = intervals.analytic_intervals(values, ids, 2, 'mean', alpha=0.05)
+    assert list(results['sample_size']) == [100, 10]
+    assert results['center'][0] == pytest.approx(0.3)
+
+    # wilson interval for binary values, t interval otherwise
+    assert results['low'][0] == pytest.approx(0.2189, abs=1e-4)
+    assert results['high'][0] == pytest.approx(0.3959, abs=1e-4)
+    assert results['low'][1] == pytest.approx(4.5 - 2.262157 * np.std(np.arange(10.), ddof=1) / np.sqrt(10))
+
+
+def test_group_intervals_auto():
+    df = pd.DataFrame({'g': np.r_[np.zeros(200), np.ones(5)], 'y': np.arange(205.)})
+    out_df = intervals.group_intervals(df, ['g'], 'y', 'mean', 'auto', 1000, seed=0)
+    assert list(out_df['num_iterations']) == [0, 1000]
+    with pytest.raises(ValueError):
+        intervals.group_intervals(df, ['g'], 'y', 'mean', 'exact')
+
+
+def test_group_intervals_other_stats():
+    df = mtcars.assign(mpg=mtcars['mpg'].where(mtcars['hp'] < 200))
+    out_df = intervals.group_intervals(df, ['cyl', 'am'], 'mpg', bs_stats.median, 'bootstrap', 500)
+    expected_df = df.groupby(['cyl', 'am'])['mpg'].agg(['median', 'count']).reset_index()
+    np.testing.assert_array_equal(out_df['center'], expected_df['median'])
+    assert out_df['sample_size'].tolist() == expected_df['count'].tolist()
+    assert (out_df.dtypes[['center', 'low', 'high']] == float).all()
+    with pytest.raises(ValueError):
+        intervals.group_intervals(df, ['cyl'], 'mpg', bs_stats.median, 'analytic')
@@ -0,0 +1,41 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pydataset import data
+from plotnine.stats.stat_density import compute_density
+
+from ..utilities import kde
+
+mtcars = data('mtcars')
+
+kde_data_testdata = [([], None, 'nrd0', 1), (['am'], None, 'nrd0', 2), (['cyl'], 'wt', 3, 1), (['am', 'vs'], 'hp', 'nrd0', 0.5)]
+@pytest.mark.parametrize("group_cols, weight_col, bw, adjust", kde_data_testdata)
+def test_kde_data(group_cols, weight_col, bw, adjust):
+    out_df = kde.kde_data(mtcars, group_cols, 'mpg', weight_col, n=512, bw=bw, adjust=adjust)
+    params = {'kernel': 'gau', 'bw': bw, 'adjust': adjust, 'cut': 3, 'gridsize': None,
+              'clip': (-np.inf, np.inf), 'n': 512}
+    value_range = (mtcars['mpg'].min(), mtcars['mpg'].max())
+    for _, group_df in (mtcars.groupby(group_cols) if group_cols else [(None, mtcars)]):
+        weights = group_df[weight_col] if weight_col is not None else None
+        expected = compute_density(group_df['mpg'], weights, value_range, **params)
+        mask = np.ones(len(out_df), dtype=bool)
+        for c in group_cols:
+            mask &= out_df[c] == group_df[c].iloc[0]
+        np.testing.assert_allclose(out_df.loc[mask, 'mpg'], expected['x'])
+        np.testing.assert_allclose(out_df.loc[mask, 'density'], expected['density'],
+                                   atol=5e-3 * expected['density'].max())
+
+
+def test_group_nrd0():
+    from plotnine.stats.stat_density import nrd0
+    ids = mtcars['cyl'].factorize(sort=True)[0]
+    bw = kde.group_nrd0(mtcars['hp'].to_numpy(dtype=float), ids, 3)
+    expected = mtcars.groupby('cyl')['hp'].apply(nrd0)
+    np.testing.assert_allclose(bw, expected)
+
+
+def test_kde_data_small_groups():
+    df = pd.DataFrame({'x': [1., 2., 3., 4.], 'g': ['a', 'a', 'a', 'b']})
+    out_df = kde.kde_data(df, ['g'], 'x', n=16)
+    assert list(out_df['g'].unique()) == ['a']
+    assert np.isclose(out_df['density'].sum() * (3 / 15), 1, atol=0.2)
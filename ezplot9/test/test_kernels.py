@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pydataset import data
+
+from ..utilities import kernels
+
+mtcars = data('mtcars')
+mtcars['am_s'] = np.where(mtcars['am'] == 1, 'manual', 'auto')
+mtcars['mpg_nan'] = mtcars['mpg'].where(mtcars['hp'] > 100)
+
+group_aggregate_testdata = [(['cyl'], 'sum'),
+                            (['am_s', 'gear'], 'mean'),
+                            (['gear', 'am_s'], 'count'),
+                            (['carb'], 'min'),
+                            (['am_s', 'carb'], 'max')]
+@pytest.mark.parametrize("group_cols, aggfun", group_aggregate_testdata)
+def test_group_aggregate(group_cols, aggfun):
+    value_cols = ['mpg', 'hp', 'mpg_nan']
+    out_df = kernels.group_aggregate(mtcars, group_cols, value_cols, aggfun)
+    expected_df = mtcars.groupby(group_cols)[value_cols].agg(aggfun).reset_index()
+    pd.testing.assert_frame_equal(out_df, expected_df)
+
+
+def test_encode_groups():
+    df = pd.DataFrame({'g': ['b', 'a', None, 'b'], 'x': [2, 1, 1, 1]})
+    ids, keys = kernels.encode_groups(df, ['g', 'x'])
+    assert list(ids) == [2, 0, -1, 1]
+    assert list(keys['g']) == ['a', 'b', 'b']
+    assert keys['g'].dtype == np.dtype('O')
+    assert list(keys['x']) == [1, 1, 2]
+
+
+def test_merge_partials():
+    parts = [mtcars.iloc[:10], mtcars.iloc[10:25], mtcars.iloc[25:]]
+    partial_dfs = [kernels.group_partials(p, ['am_s', 'cyl'], ['mpg'], 'mean') for p in parts]
+    partial_df = kernels.merge_partials(partial_dfs, ['am_s', 'cyl'], ['mpg'], 'mean')
+    out_df = kernels.finalize_partials(partial_df, ['am_s', 'cyl'], ['mpg'], 'mean')
+    expected_df = mtcars.groupby(['am_s', 'cyl'])['mpg'].mean().reset_index()
+    assert np.allclose(out_df['mpg'], expected_df['mpg'])
+
+group_histogram_testdata = [(['cyl'], None), (['cyl', 'am_s', 'gear'], ['am_s']), (['gear', 'carb'], [])]
+@pytest.mark.parametrize("group_cols, normalize_cols", group_histogram_testdata)
+def test_group_histogram(group_cols, normalize_cols):
+    out_df = kernels.group_histogram(mtcars, group_cols, 'hp', normalize_cols)
+    expected_df = pd.MultiIndex.from_product([sorted(mtcars[c].unique()) for c in group_cols], names=group_cols) \
+        .to_frame(index=False) \
+        .merge(mtcars.groupby(group_cols)['hp'].sum().reset_index(), how='left') \
+        .fillna(0)
+    if normalize_cols is not None:
+        totals = expected_df.groupby(normalize_cols)['hp'].transform('sum') if normalize_cols \
+            else expected_df['hp'].sum()
+        expected_df['hp'] = expected_df['hp'] / totals
+    pd.testing.assert_frame_equal(out_df, expected_df, check_dtype=False)
+    sparse_df = kernels.group_histogram(mtcars, group_cols, 'hp', normalize_cols, sparse=True)
+    pd.testing.assert_frame_equal(sparse_df, out_df[out_df['hp'] > 0].reset_index(drop=True), check_dtype=False)
+
+
+def test_group_histogram_max_rows():
+    with pytest.raises(ValueError):
+        kernels.group_histogram(mtcars, ['mpg', 'hp'], max_rows=100)
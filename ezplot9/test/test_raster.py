@@ -0,0 +1,41 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pydataset import data
+
+from ..utilities import raster
+from ..utilities.binning import bin_data
+from ..plot_functions.scatter_plot import scatter_plot
+
+mtcars = data('mtcars')
+
+raster_data_testdata = [([], None, 10, 5), (['am'], 'cyl', 4, 3), (['am', 'vs'], 'gear', 20, 20)]
+@pytest.mark.parametrize("facet_cols, group_col, width, height", raster_data_testdata)
+def test_raster_data(facet_cols, group_col, width, height):
+    out_df = raster.raster_data(mtcars, 'wt', 'mpg', facet_cols, group_col, width, height)
+    filled = out_df.dropna(subset=['count'])
+    assert filled['count'].sum() == len(mtcars)
+
+    binned_df = mtcars.assign(x=bin_data(mtcars['wt'], width)[0], y=bin_data(mtcars['mpg'], height)[0])
+    expected = binned_df.groupby(facet_cols + ['x', 'y']).size()
+    result = filled.set_index(facet_cols + ['x', 'y'])['count']
+    pd.testing.assert_series_equal(result.sort_index(), expected.sort_index().astype(float),
+                                   check_names=False)
+
+    if group_col is not None:
+        majority = binned_df.groupby(facet_cols + ['x', 'y'])[group_col].agg(lambda v: v.value_counts().max())
+        counts = binned_df.groupby(facet_cols + ['x', 'y', group_col]).size()
+        found = filled.set_index(facet_cols + ['x', 'y', group_col]).index
+        np.testing.assert_array_equal(counts[found].to_numpy(), majority[filled.set_index(facet_cols + ['x', 'y']).index])
+
+    # every facet has a full row and a full column of pixels
+    for _, facet_df in (out_df.groupby(facet_cols) if facet_cols else [(None, out_df)]):
+        assert facet_df['x'].nunique() == width and facet_df['y'].nunique() == height
+
+
+def test_scatter_plot_raster():
+    g = scatter_plot(mtcars, 'wt', 'mpg', group='cyl', facet_x='am', render='raster', figure_size=(4, 2))
+    assert g.data['count'].sum() == len(mtcars)
+    assert g.data['x'].nunique() <= raster.raster_shape((4, 2), 2, 1)[0]
+    with pytest.raises(ValueError):
+        scatter_plot(mtcars, 'wt', 'mpg', render='pixels')
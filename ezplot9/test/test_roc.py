@@ -0,0 +1,101 @@
+import json
+import pytest
+import numpy as np
+from pydataset import data
+from sklearn.metrics import roc_auc_score, roc_curve
+
+from ..utilities import roc
+from ..plot_functions.roc_plot import roc_plot
+
+mtcars = data('mtcars')
+mtcars['wt_r'] = mtcars['wt'].round()
+
+roc_data_testdata = [(['wt', 'mpg'], []), (['wt_r'], ['vs']), (['hp', 'qsec', 'wt_r'], ['cyl'])]
+@pytest.mark.parametrize("score_cols, group_cols", roc_data_testdata)
+def test_roc_data(score_cols, group_cols):
+    roc_df, auc_df = roc.roc_data(mtcars, 'am', score_cols, group_cols, max_points=None)
+    for _, row in auc_df.iterrows():
+        mask = np.ones(len(mtcars), dtype=bool)
+        point_mask = roc_df['variable'] == row['variable']
+        for c in group_cols:
+            mask &= mtcars[c] == row[c]
+            point_mask &= roc_df[c] == row[c]
+        group_df = mtcars[mask]
+        if group_df['am'].nunique() < 2:
+            assert np.isnan(row['auc'])
+            continue
+        assert np.isclose(row['auc'], roc_auc_score(group_df['am'], group_df[row['variable']]))
+        fpr, tpr, _ = roc_curve(group_df['am'], group_df[row['variable']], drop_intermediate=False)
+        np.testing.assert_allclose(roc_df.loc[point_mask, 'x'], fpr)
+        np.testing.assert_allclose(roc_df.loc[point_mask, 'y'], tpr)
+
+
+def test_group_roc_max_points():
+    rng = np.random.default_rng(0)
+    target = rng.integers(2, size=10_000)
+    scores = target[:, None] + rng.normal(size=(10_000, 2))
+    results = roc.group_roc(target, scores, np.zeros(10_000, dtype=np.int64), 1, max_points=50)
+    assert np.bincount(results['curve']).max() <= 50
+    assert np.allclose(results['auc'], [roc_auc_score(target, s) for s in scores.T])
+    assert (results['fpr'][results['curve'] == 0][[0, -1]] == [0, 1]).all()
+
+
+def test_roc_data_pos_label():
+    roc_df, auc_df = roc.roc_data(mtcars, 'am', ['wt'], pos_label=0)
+    assert np.isclose(auc_df['auc'][0], roc_auc_score(1 - mtcars['am'], mtcars['wt']))
+
+
+score_histogram_testdata = [(10, []), (100, ['vs']), (1000, ['vs', 'gear'])]
+@pytest.mark.parametrize("n_bins, group_cols", score_histogram_testdata)
+def test_score_histogram(n_bins, group_cols):
+    df = mtcars.assign(p=mtcars['wt'] / 6, q=mtcars['mpg'] / 40)
+    parts = [df.iloc[:10], df.iloc[10:]]
+    histogram = roc.ScoreHistogram(n_bins).update(parts[0], 'am', ['p', 'q'], group_cols)
+    other = roc.ScoreHistogram(n_bins).update(parts[1], 'am', ['p', 'q'], group_cols)
+    histogram = roc.ScoreHistogram.from_dict(json.loads(json.dumps(histogram.to_dict()))).merge(other)
+    _, auc_df = histogram.roc_data()
+    _, expected_df = roc.roc_data(df, 'am', ['p', 'q'], group_cols)
+    merged = auc_df.merge(expected_df, on=['variable'] + group_cols, suffixes=('', '_exact'))
+    assert len(merged) == len(expected_df)
+    valid = merged['auc_exact'].notnull()
+    assert (np.abs(merged['auc'] - merged['auc_exact'])[valid] <= merged['auc_error'][valid] + 1e-12).all()
+    assert (merged[['positives', 'negatives']].values == merged[['positives_exact', 'negatives_exact']].values).all()
+
+
+def test_score_histogram_range(caplog):
+    # logits: the inferred range covers the scores, a fixed [0, 1] range clips them
+    df = mtcars.assign(s=np.log(mtcars['wt'] / (6 - mtcars['wt'])) * 3)
+    _, expected_df = roc.roc_data(df, 'am', ['s'])
+    _, auc_df = roc.ScoreHistogram(1000, None, None).update(df, 'am', ['s']).roc_data()
+    assert np.abs(auc_df['auc'][0] - expected_df['auc'][0]) <= auc_df['auc_error'][0] + 1e-12
+    assert auc_df['auc_error'][0] < 0.01
+    histogram = roc.ScoreHistogram(1000).update(df, 'am', ['s'])
+    assert histogram.clipped == (df['s'] < 0).sum() + (df['s'] > 1).sum()
+    assert 'outside' in caplog.text
+    with pytest.raises(ValueError):
+        roc.ScoreHistogram(10, 0, None)
+
+
+def test_roc_plot_histogram_auc():
+    df = mtcars.assign(s=np.log(mtcars['wt'] / (6 - mtcars['wt'])))
+    _, auc_df = roc_plot(df, 'am', 's', resolution=1000, score_range=None)
+    _, expected_df = roc.roc_data(df, 'am', ['s'])
+    assert {'auc_error', 'positives', 'negatives'} <= set(auc_df.columns)
+    assert np.abs(auc_df['auc'][0] - expected_df['auc'][0]) <= auc_df['auc_error'][0] + 1e-12
+    _, auc_df = roc_plot(df, 'am', 's', resolution=10, score_range=(-5, 5))
+    assert auc_df['positives'][0] == mtcars['am'].sum()
+    with pytest.raises(ValueError):
+        roc_plot(iter([df.iloc[:10], df.iloc[10:]]), 'am', 's', score_range=None)
+
+def test_roc_plot_equal_auc():
+    # two curves with the same AUC label
+    g, auc_df = roc_plot(mtcars.assign(p=mtcars['mpg']), 'am', ['mpg', 'p'])
+    assert list(auc_df['label']) == list(auc_df['label'][:1]) * 2
+    g.draw()
+
+def test_score_histogram_calibration():
+    df = mtcars.assign(p=mtcars['wt'] / 6)
+    calibration_df = roc.ScoreHistogram(100).update(df, 'am', ['p']).calibration_data(10)
+    codes = np.floor(df['p'] * 10)
+    expected = df.groupby(codes).agg(score=('p', 'mean'), target=('am', 'mean'), count=('am', 'size'))
+    np.testing.assert_allclose(calibration_df[['score', 'target', 'count']], expected)
@@ -0,0 +1,76 @@
+import json
+import pytest
+import numpy as np
+import pandas as pd
+from pydataset import data
+
+from ..utilities import agg_data, sketches, binning
+
+mtcars = data('mtcars')
+
+quantile_sketch_testdata = [(200, [1., 2., 3., 4.]), (50, np.arange(50.)), (8, [3., 1., np.nan, 2.])]
+@pytest.mark.parametrize("k, values", quantile_sketch_testdata)
+def test_quantile_sketch_exact(k, values):
+    sketch = sketches.QuantileSketch(k).update(values)
+    q = np.linspace(0, 1, 11)
+    np.testing.assert_allclose(sketch.quantile(q), np.nanquantile(values, q))
+    assert sketch.n == np.sum(~np.isnan(values))
+
+
+sketch_rank_error_testdata = [(100, 1), (200, 10), (400, 100)]
+@pytest.mark.parametrize("k, n_parts", sketch_rank_error_testdata)
+def test_quantile_sketch_rank_error(k, n_parts):
+    x = np.random.default_rng(0).lognormal(size=100_000)
+    parts = [sketches.QuantileSketch(k, i).update(p) for i, p in enumerate(np.array_split(x, n_parts))]
+    sketch = parts[0]
+    for p in parts[1:]:
+        sketch.merge(p)
+    q = np.linspace(0, 1, 101)
+    true_rank = np.searchsorted(np.sort(x), sketch.quantile(q)) / len(x)
+    assert np.abs(true_rank - q).max() <= sketches.rank_error(k)
+    assert np.abs(sketch.rank(np.quantile(x, q)) - q).max() <= sketches.rank_error(k)
+    assert sketch.retained < 4 * k
+    assert (sketch.quantile(0), sketch.quantile(1)) == (x.min(), x.max())
+
+
+def test_quantile_sketch_serialization():
+    sketch = sketches.QuantileSketch(20, 0).update(np.arange(1000.))
+    restored = sketches.QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    np.testing.assert_array_equal(restored.quantile([0.1, 0.5, 0.9]), sketch.quantile([0.1, 0.5, 0.9]))
+    assert restored.n == sketch.n
+    assert np.isnan(sketches.QuantileSketch().quantile(0.5))
+
+
+def test_merge_sketches():
+    parts = [mtcars.iloc[:10], mtcars.iloc[10:25], mtcars.iloc[25:]]
+    sketch_dfs = [sketches.group_sketches(p, ['cyl', 'am'], ['mpg', 'hp']) for p in parts]
+    sketch_df = sketches.merge_sketches(sketch_dfs, ['cyl', 'am'], ['mpg', 'hp'])
+    out_df = sketches.finalize_sketches(sketch_df, ['cyl', 'am'], ['mpg', 'hp'], 'median')
+    expected_df = mtcars.groupby(['cyl', 'am'])[['mpg', 'hp']].median().reset_index()
+    pd.testing.assert_frame_equal(out_df, expected_df, check_dtype=False)
+
+
+def test_agg_data_median_parallel(monkeypatch):
+    monkeypatch.setattr(agg_data, 'MIN_ROWS_PER_JOB', 1)
+    variables = {'y': 'mpg', 'z': '@y/2'}
+    groups = {'x': 'cyl', 'group': 'gear'}
+    out_df = agg_data.agg_data(mtcars, variables, groups, 'median', n_jobs=2)
+    expected_df = agg_data.agg_data(mtcars, variables, groups, 'median')
+    pd.testing.assert_frame_equal(out_df[expected_df.columns], expected_df, check_dtype=False)
+
+
+def test_box_statistics():
+    values = np.r_[np.arange(1., 11.), 100.]
+    stats = sketches.box_statistics(sketches.QuantileSketch().update(values))
+    assert stats == {'ymin': 1., 'lower': 3.5, 'middle': 6., 'upper': 8.5, 'ymax': 10.}
+
+
+def test_quantile_bins():
+    x = mtcars['hp']
+    bins = binning.QuantileBins.from_sketch(sketches.QuantileSketch().update(x), 4)
+    expected = pd.qcut(x, 4, labels=False, duplicates='drop')
+    np.testing.assert_array_equal(bins.codes(x), expected)
+    assert list(bins.codes([np.nan, x.max() + 1])) == [-1, -1]
+    # a single distinct value is one bin
+    bins = binning.QuantileBins.from_sketch(sketches.QuantileSketch().update(np.full(5, 3.0)), 1)
+    assert list(bins.codes([3.0, 4.0])) == [0, -1]
@@ -17,3 +17,19 @@ def test_unname(x, expected_name, expected_var):
     name, var = utils.unname(x)
     assert name == expected_name
     assert var == expected_var
+
+expression_columns_testdata = [
+    ('x', {'x'}),
+    ('a + b * 2', {'a', 'b'}),
+    ('(b==c)&(d>=0)', {'b', 'c', 'd'}),
+    ('@a/b', {'a', 'b'}),
+    ('name.str.upper()', {'name'}),
+    ('`a b` + c', {'a b', 'c'}),
+    ('.index', set()),
+    ('a +', None),
+]
+
+@pytest.mark.parametrize("x, expected_columns", expression_columns_testdata)
+def test_expression_columns(x, expected_columns):
+    columns = utils.expression_columns(x)
+    assert columns == expected_columns
@@ -1,6 +1,20 @@
+import numpy as np
 import pandas as pd
-from itertools import product
 import types
+import threading
+
+from pandas.api.types import is_categorical_dtype
+from pandas.core.computation.parsing import clean_column_name
+
+from .utils import expression_columns
+from .cache import get_cache, cache_key
+from .datasets import is_dataset, dataset_chunks
+from .bootstrap import BLOCK_SIZE, confidence_interval
+from .parallel import MIN_ROWS_PER_JOB, get_n_jobs, parallel_partials
+from .kernels import supports_kernels, is_decomposable, group_aggregate, group_partials, \
+    merge_partials, finalize_partials
+from .sketches import is_sketchable, supports_sketches, group_sketches, merge_sketches, \
+    finalize_sketches
 
 import bootstrapped.bootstrap as bs
 import bootstrapped.stats_functions as bs_stats
@@ -9,28 +23,67 @@ import logging
 log = logging.getLogger(__name__)
 
 DELAYED_VARIABLES_KEY='@'
+INDEX_KEY='.index'
+WHERE_KEY='__where__'
+EVAL_ENGINES = ['numexpr', 'python']
+MAX_EVAL_PLANS = 1024
+MAX_FILL_ROWS = 10_000_000
+CHUNK_MERGE_SIZE = 16
+FACET_GROUPS = ['facet_x', 'facet_y']
+PARALLEL_SAMPLE_ROWS = 1000
+
+# compiled evaluation plans, keyed by expressions and input dtypes (shared by all threads)
+_eval_plans = {}
+_eval_plans_lock = threading.Lock()
 
 def agg_data(df,
              variables,
              groups,
              aggfun='sum',
-             fill_groups=False):
+             fill_groups=False,
+             max_fill_rows=MAX_FILL_ROWS,
+             n_jobs=1,
+             executor=None,
+             where=None,
+             cache=None):
 
     '''
     Aggregate the variable columns of a dataframe after grouping.
 
     Parameters
     ----------
-    df : pd.DataFrame
-        input dataframe to be aggregated
+    df : pd.DataFrame, iterator of pd.DataFrame, str or pyarrow.dataset.Dataset
+        input dataframe to be aggregated (not modified). An iterator of dataframe chunks (eg
+        pd.read_csv(..., chunksize=n)) is aggregated chunk by chunk, a parquet path (or a
+        pyarrow dataset) is read batch by batch, only reading the referenced columns
     variables : dict
         variables dictionary (name:expr or name:list(expr))
     groups : dict
         groups dictionary (name:expr)
     aggfun : str of fun
-        function to be used for aggregation
-    fill_groups : bool
-        make sure that all groups have at least one row in the output dataframe
+        function to be used for aggregation (if None, the data is only evaluated). On
+        iterators, datasets and in parallel, 'median' is estimated from quantile sketches
+        (exact for groups with at most sketches.DEFAULT_K values, see sketches.rank_error
+        otherwise) and 'sketch' returns the QuantileSketch of each group
+    fill_groups : bool or str
+        make sure that all groups have at least one row in the output dataframe. If 'scoped',
+        the other groups are only filled within the observed combinations of the facet groups
+    max_fill_rows : int
+        maximum number of rows allowed in the filled dataframe
+    n_jobs : int
+        number of worker processes used to evaluate and aggregate the data (-1 means all the
+        available cores). Only decomposable aggregation functions ('sum', 'mean', 'count',
+        'min', 'max') and 'median' on dataframes with at least MIN_ROWS_PER_JOB rows per job
+        are aggregated in parallel, all other cases are aggregated serially
+    executor : concurrent.futures.Executor or None
+        executor used for the parallel aggregation (a process pool is created if None)
+    where : str or None
+        quoted expression used to filter the rows before aggregating. For parquet inputs,
+        simple filters (comparisons, isin, &, |, ~) are pushed down to the dataset scanner
+    cache : bool, AggregationCache or None
+        cache of aggregated dataframes (only used for dataframe inputs). If None, the default
+        cache is used when enabled (`aggregation_cache.enabled = True`), if True the default
+        cache is always used and if False no cache is used
 
     Returns
     -------
@@ -40,58 +93,646 @@ def agg_data(df,
     '''
 
     # get groups, varibales and delayed variables
-    groups, variables, delayed_variables = get_groups(df, variables,groups)
+    groups, variables, delayed_variables = get_groups(None, variables,groups)
+    group_cols = list(groups.keys())
+
+    # cached results for the same data and spec
+    cache = get_cache(cache) if isinstance(df, pd.DataFrame) else None
+    if cache is not None:
+        spec = (tuple(variables.items()), tuple(groups.items()), tuple(delayed_variables.items()),
+                aggfun, fill_groups, max_fill_rows, where)
+        key = cache_key(df, get_columns(df, variables, groups, where), spec)
+        out_df = cache.get(key) if key is not None else None
+        if out_df is not None:
+            return out_df
+
+    if isinstance(df, pd.DataFrame):
+        n_jobs = min(get_n_jobs(n_jobs), len(df) // MIN_ROWS_PER_JOB)
+
+    if isinstance(df, pd.DataFrame) and (n_jobs > 1) and is_mergeable(aggfun):
+        # check the evaluated types on the first rows (categorical groups are aggregated
+        # serially, to keep their dtype in the output)
+        sample = eval_data(df.iloc[:PARALLEL_SAMPLE_ROWS], variables, groups, where)
+        categorical = any(is_categorical_dtype(sample[c].dtype) for c in group_cols)
+        sample = partial_types(sample, group_cols, list(variables.keys()))
+        if categorical or not supports_partials(sample, group_cols, list(variables.keys()), aggfun):
+            log.info('{} cannot be computed on partial data with these groups and variables, '
+                     'aggregating serially'.format(aggfun))
+            n_jobs = 1
+
+    if isinstance(df, pd.DataFrame) and (n_jobs > 1) and is_mergeable(aggfun):
+        # evaluate and partially aggregate partitions of the data in parallel
+        partial_dfs = parallel_partials(df, variables, groups, aggfun,
+                                        columns=get_columns(df, variables, groups, where),
+                                        n_jobs=n_jobs,
+                                        executor=executor,
+                                        where=where)
+        merge, finalize = partial_functions(aggfun)
+        partial_df = merge(partial_dfs, group_cols, list(variables.keys()), aggfun)
+        df = finalize(partial_df, group_cols, list(variables.keys()), aggfun)
+    elif isinstance(df, pd.DataFrame):
+        # evaluation before aggregating (only the derived columns are stored in a new dataframe)
+        df = eval_data(df, variables, groups, where)
+
+        # no aggregation and no filling: return the evaluated columns
+        if (aggfun is None) and (not fill_groups):
+            eval_expressions(df, delayed_variables)
+            df.index = pd.RangeIndex(len(df))
+            if (cache is not None) and (key is not None):
+                cache.put(key, df)
+            return df
+
+        # aggregate df
+        if aggfun == 'sketch':
+            df = group_sketches(df, group_cols, list(variables.keys()))
+        elif aggfun is not None:
+            df = aggregate(df, group_cols, list(variables.keys()), aggfun)
+    else:
+        if is_dataset(df):
+            # read only the referenced columns (and push the filter down when possible)
+            df, where = dataset_chunks(df, get_columns(None, variables, groups, where), where)
+
+        # evaluate and aggregate chunk by chunk
+        df = aggregate_chunks(df, variables, groups, aggfun, where)
+
+    # evaluation after aggregation
+    eval_expressions(df, delayed_variables)
+
+    # select output
+    all_variables = list(set(variables.keys()) | set(delayed_variables.keys()))
+    out_df = df[group_cols + all_variables].reset_index(drop=True)
+
+    if fill_groups:
+        scope_cols = [c for c in FACET_GROUPS if c in group_cols] if fill_groups == 'scoped' else []
+        out_df = fill_data(out_df, group_cols, scope_cols, max_fill_rows)
+
+    if (cache is not None) and (key is not None):
+        cache.put(key, out_df)
+
+    return out_df
+
+def aggregate(df, group_cols, value_cols, aggfun):
+    '''
+    Aggregate value columns after grouping. Decomposable aggregation functions ('sum', 'mean',
+    'count', 'min' and 'max') on numeric columns are computed with the group kernels on
+    dictionary-encoded groups, all other cases use DataFrame.groupby (all the rows are
+    aggregated into a single row if there are no groups).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe (with evaluated columns)
+    group_cols : list
+        group columns
+    value_cols : list
+        columns to be aggregated
+    aggfun : str or fun
+        function to be used for aggregation
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        aggregated dataframe
+
+    '''
+
+    if len(group_cols) == 0:
+        # a single row with the aggregates of all the rows
+        return pd.DataFrame({c: [df[c].agg(aggfun)] for c in value_cols})
+
+    if supports_kernels(df, group_cols, value_cols, aggfun):
+        try:
+            return group_aggregate(df, group_cols, value_cols, aggfun)
+        except TypeError:
+            # group values that cannot be sorted
+            pass
+
+    return df.groupby(group_cols)[value_cols] \
+        .agg(aggfun) \
+        .reset_index()
+
+def aggregate_chunks(chunks, variables, groups, aggfun, where=None):
+    '''
+    Evaluate and aggregate an iterator of dataframe chunks. Decomposable aggregation functions
+    are computed from partial aggregates of each chunk and 'median' from quantile sketches of
+    each chunk (merged as they are produced), all other aggregation functions are computed
+    after concatenating the evaluated chunks. Chunks are also concatenated when the first
+    chunk cannot be partially aggregated (eg without groups or with non numeric values).
+
+    Parameters
+    ----------
+    chunks : iterator of pd.DataFrame
+        input dataframe chunks
+    variables : dict
+        variables dictionary (name:expr), as returned by get_groups
+    groups : dict
+        groups dictionary (name:expr), as returned by get_groups
+    aggfun : str or fun
+        function to be used for aggregation (if None, the evaluated chunks are concatenated)
+    where : str or None
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        aggregated dataframe
+
+    '''
+
+    group_cols = list(groups.keys())
+    value_cols = list(variables.keys())
+
+    serial = not is_mergeable(aggfun)
+    merge, finalize = partial_functions(aggfun) if not serial else (None, None)
+    data_ls = []
+    partial_dfs = []
+    for chunk in chunks:
+        data = eval_data(chunk, variables, groups, where)
+        if (not serial) and (len(partial_dfs) == 0):
+            # check the evaluated types on the first chunk
+            sample = partial_types(data.copy(deep=False), group_cols, value_cols)
+            if not supports_partials(sample, group_cols, value_cols, aggfun):
+                log.info('{} cannot be computed on partial data with these groups and variables, '
+                         'aggregating the concatenated chunks'.format(aggfun))
+                serial = True
+        if serial:
+            data_ls.append(data)
+            continue
+
+        partial_dfs.append(compute_partials(partial_types(data, group_cols, value_cols),
+                                            group_cols, value_cols, aggfun))
+        if len(partial_dfs) >= CHUNK_MERGE_SIZE:
+            partial_dfs = [merge(partial_dfs, group_cols, value_cols, aggfun)]
+
+    if serial and (len(data_ls) > 0):
+        df = pd.concat(data_ls, ignore_index=True)
+        return df if aggfun is None else aggregate(df, group_cols, value_cols, aggfun)
+
+    if len(partial_dfs) == 0:
+        return pd.DataFrame(columns=group_cols + value_cols)
+
+    partial_df = merge(partial_dfs, group_cols, value_cols, aggfun)
+
+    return finalize(partial_df, group_cols, value_cols, aggfun)
+
+def is_mergeable(aggfun):
+    '''
+    Check if an aggregation function can be computed from mergeable partial results, ie
+    partial aggregates (decomposable aggregation functions) or quantile sketches
+
+    Parameters
+    ----------
+    aggfun : str or fun
+        aggregation function
+
+    Returns
+    -------
+    flag : bool
+
+    '''
+    return is_decomposable(aggfun) or is_sketchable(aggfun)
+
+def partial_functions(aggfun):
+    '''
+    Functions used to merge and finalize the partial results of an aggregation function
+
+    Parameters
+    ----------
+    aggfun : str
+        decomposable or sketchable aggregation function
+
+    Returns
+    -------
+    merge : fun
+        merge_partials or merge_sketches
+    finalize : fun
+        finalize_partials or finalize_sketches
+
+    '''
+    if is_sketchable(aggfun):
+        return merge_sketches, finalize_sketches
+    return merge_partials, finalize_partials
+
+def eval_chunks(df, variables, groups, where=None):
+    '''
+    Evaluate variables and groups chunk by chunk, without concatenating the chunks (delayed
+    variables are not evaluated).
+
+    Parameters
+    ----------
+    df : pd.DataFrame, iterator of pd.DataFrame, str or pyarrow.dataset.Dataset
+        input data (a dataframe is a single chunk, parquet paths and pyarrow datasets are read
+        batch by batch, only reading the referenced columns)
+    variables : dict
+        variables dictionary (name:expr or name:list(expr))
+    groups : dict
+        groups dictionary (name:expr)
+    where : str or None
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    chunks : generator of pd.DataFrame
+        evaluated chunks
+
+    '''
+    groups, variables, _ = get_groups(None, variables, groups)
+
+    if isinstance(df, pd.DataFrame):
+        chunks = [df]
+    elif is_dataset(df):
+        chunks, where = dataset_chunks(df, get_columns(None, variables, groups, where), where)
+    else:
+        chunks = df
+
+    for chunk in chunks:
+        yield eval_data(chunk, variables, groups, where)
+
+def eval_partials(df, variables, groups, aggfun, where=None):
+    '''
+    Evaluate variables and groups on a part of the data and compute the partial aggregates
+    needed by a decomposable aggregation function (or the quantile sketches needed by a
+    sketchable one).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe (or chunk)
+    variables : dict
+        variables dictionary (name:expr), as returned by get_groups
+    groups : dict
+        groups dictionary (name:expr), as returned by get_groups
+    aggfun : str
+        decomposable or sketchable aggregation function
+    where : str or None
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    partial_df : pd.DataFrame
+        group columns and partial aggregates (or sketches)
+
+    '''
+
+    group_cols = list(groups.keys())
+    value_cols = list(variables.keys())
+
+    data = partial_types(eval_data(df, variables, groups, where), group_cols, value_cols)
+
+    return compute_partials(data, group_cols, value_cols, aggfun)
+
+def compute_partials(data, group_cols, value_cols, aggfun):
+    '''
+    Compute the partial aggregates (or quantile sketches) of evaluated data
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        evaluated data, as returned by partial_types
+    group_cols : list
+        group columns
+    value_cols : list
+        columns to be aggregated
+    aggfun : str
+        decomposable or sketchable aggregation function
+
+    Returns
+    -------
+    partial_df : pd.DataFrame
+        group columns and partial aggregates (or sketches)
+
+    '''
+    if not supports_partials(data, group_cols, value_cols, aggfun):
+        log.error('{} cannot be computed on partial data with these groups and variables'.format(aggfun))
+        raise ValueError('{} cannot be computed on partial data with these groups and variables'.format(aggfun))
+
+    if is_sketchable(aggfun):
+        return group_sketches(data, group_cols, value_cols)
+
+    return group_partials(data, group_cols, value_cols, aggfun)
+
+def partial_types(data, group_cols, value_cols):
+    '''
+    Convert evaluated data to the column types used by the partial aggregates (categorical
+    groups as objects and booleans as integers)
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        evaluated dataframe
+    group_cols : list
+        group columns
+    value_cols : list
+        columns to be aggregated
+
+    Returns
+    -------
+    data : pd.DataFrame
+        converted dataframe
+
+    '''
+
+    for c in group_cols:
+        if is_categorical_dtype(data[c].dtype):
+            data[c] = data[c].astype(object)
+    for c in value_cols:
+        if data[c].dtype.kind == 'b':
+            data[c] = data[c].astype(int)
+
+    return data
+
+def supports_partials(data, group_cols, value_cols, aggfun):
+    '''
+    Check if an aggregation function can be computed from partial aggregates (or quantile
+    sketches) of evaluated data
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        evaluated data, as returned by partial_types
+    group_cols : list
+        group columns
+    value_cols : list
+        columns to be aggregated
+    aggfun : str or fun
+        function to be used for aggregation
 
-    # evaluation before aggregating (also changes column names)
-    for key, val in dict(variables, **groups).items():
-        if val is not None:
-            expr = '{}=({})'.format(key, val)
+    Returns
+    -------
+    flag : bool
+
+    '''
+    if is_sketchable(aggfun):
+        return supports_sketches(data, group_cols, value_cols, aggfun)
+    return supports_kernels(data, group_cols, value_cols, aggfun)
+
+def fill_data(df,
+              group_cols,
+              scope_cols=[],
+              max_rows=MAX_FILL_ROWS):
+    '''
+    Add empty rows to a dataframe so that every combination of the unique values of the group
+    columns is present. Combinations of the scope columns are not expanded: the other group
+    columns are only filled within the observed combinations of the scope columns.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+    scope_cols : list
+        group columns whose observed combinations define the scopes to be filled
+    max_rows : int
+        maximum number of rows allowed in the filled dataframe
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        filled dataframe
+
+    '''
+
+    if len(group_cols) == 0:
+        return df
+
+    inner_cols = [c for c in group_cols if c not in scope_cols]
+    uniques = [pd.unique(df[c]) for c in inner_cols]
+    n_inner = int(np.prod([len(u) for u in uniques]))
+
+    if len(scope_cols) > 0:
+        scopes = df[scope_cols].drop_duplicates()
+    else:
+        scopes = pd.DataFrame(index=[0])
+    n_rows = len(scopes) * n_inner
+
+    if n_rows > max_rows:
+        log.error('Filling the groups would create {} rows (max_fill_rows is {})'.format(n_rows, max_rows))
+        raise ValueError('Filling the groups would create {} rows (max_fill_rows is {})'.format(n_rows, max_rows))
+
+    # index with all the combinations (within each scope)
+    inner_index = pd.MultiIndex.from_product(uniques, names=inner_cols)
+    levels = list(inner_index.levels)
+    codes = [np.tile(c, len(scopes)) for c in inner_index.codes]
+    for c in scope_cols:
+        level = pd.Index(pd.unique(scopes[c]))
+        levels.append(level)
+        codes.append(np.repeat(level.get_indexer(scopes[c]), n_inner))
+    filled_index = pd.MultiIndex(levels=levels, codes=codes, names=inner_cols + scope_cols) \
+        .reorder_levels(group_cols)
+    if len(group_cols) == 1:
+        filled_index = filled_index.get_level_values(0)
+
+    # add missing rows
+    indexed_df = df.set_index(group_cols)
+    if indexed_df.index.is_unique:
+        out_df = indexed_df.reindex(filled_index).reset_index()
+    else:
+        out_df = pd.merge(filled_index.to_frame(index=False), df, how='left', on=group_cols)
+
+    return out_df
+
+def eval_data(df, variables, groups, where=None):
+    '''
+    Evaluate variables and groups into a new dataframe that only contains the derived columns.
+    The input dataframe is not modified (nor copied) and groups equal to `.index` are read
+    directly from its index.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    variables : dict
+        variables dictionary (name:expr), as returned by get_groups
+    groups : dict
+        groups dictionary (name:expr), as returned by get_groups
+    where : str or None
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        dataframe with one column for each variable and group
+
+    '''
+
+    out_df = pd.DataFrame(index=df.index)
+    columns = get_columns(df, variables, groups, where)
+    expressions = dict(variables, **groups) if where is None else dict({WHERE_KEY: where}, **variables, **groups)
+    eval_expressions(df, expressions, target=out_df, columns=columns)
+
+    if where is not None:
+        mask = out_df.pop(WHERE_KEY)
+        out_df = out_df[np.asarray(mask, dtype=bool)]
+
+    return out_df
+
+def eval_expressions(df, expressions, target=None, columns=None):
+    '''
+    Evaluate a set of expressions and store the results as columns of target. The engine that
+    works for each expression is determined once and stored in a plan (cached by expressions
+    and input dtypes), so that later calls run consecutive expressions as a single multi-line
+    eval without retrying failed engines.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe used for the evaluation
+    expressions : dict
+        expressions dictionary (name:expr)
+    target : pd.DataFrame or None
+        dataframe where the results are stored (df is modified inplace if None). Columns of
+        target take precedence over columns of df with the same name.
+    columns : list or None
+        columns of df referenced by the expressions (all columns are used if None)
+
+    Returns
+    -------
+    plan : list
+        list of (engine, expression) steps that have been evaluated
+
+    '''
+
+    if target is None:
+        target = df
+
+    # index groups are read directly from the index
+    for key, val in expressions.items():
+        if val == INDEX_KEY:
+            target[key] = df.index
+
+    assignments = tuple('{}=({})'.format(key, val) for key, val in expressions.items()
+                        if val is not None and val != INDEX_KEY)
+    if len(assignments) == 0:
+        return []
+
+    if columns is None:
+        source = df
+        dtypes = tuple((str(c), str(t)) for c, t in df.dtypes.items())
+    else:
+        source = {c: df[c] for c in columns}
+        dtypes = tuple((str(c), str(v.dtype)) for c, v in source.items())
+
+    plan_key = (assignments, dtypes, str(df.index.dtype))
+    with _eval_plans_lock:
+        plan = _eval_plans.get(plan_key)
+
+    if plan is None:
+        plan = compile_plan(df, assignments, target, source)
+        with _eval_plans_lock:
+            if (plan_key not in _eval_plans) and (len(_eval_plans) >= MAX_EVAL_PLANS):
+                _eval_plans.pop(next(iter(_eval_plans)))
+            _eval_plans[plan_key] = plan
+    else:
+        for engine, expr in plan:
             try:
-                df.eval(expr, inplace=True, engine = 'numexpr')
+                _eval(df, expr, engine, target, source)
             except Exception as e:
-                try:
-                    df.eval(expr, inplace=True, engine='python')
-                except Exception as e:
-                    log.error('The type in {} is not be supported and '
-                              'the expression cannot be evaluated.'.format(key))
-                    raise e
+                with _eval_plans_lock:
+                    _eval_plans.pop(plan_key, None)
+                log.error('The expression {} cannot be evaluated.'.format(expr))
+                raise e
 
-    # aggregate df
-    group_cols = list(groups.keys())
+    return plan
 
-    if aggfun is not None:
-        df = df.groupby(group_cols)[list(variables.keys())] \
-            .agg(aggfun) \
-            .reset_index()
+def compile_plan(df, assignments, target=None, source=None):
+    '''
+    Evaluate assignments one by one (trying the engines in EVAL_ENGINES) and group consecutive
+    assignments that share the same engine into multi-line expressions.
 
-    # evaluation after aggregation
-    for key, val in delayed_variables.items():
-        if not (val is None):
-            expr = '{}=({})'.format(key, val)
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe used for the evaluation
+    assignments : tuple of str
+        assignment expressions (name=(expr))
+    target : pd.DataFrame or None
+        dataframe where the results are stored (df is modified inplace if None)
+    source : dict or None
+        columns of df used for the evaluation (name:series), all columns are used if None
+
+    Returns
+    -------
+    plan : list
+        list of (engine, expression) steps
+
+    '''
+
+    engines = []
+    for expr in assignments:
+        for i, engine in enumerate(EVAL_ENGINES):
             try:
-                df.eval(expr, inplace=True, engine = 'numexpr')
+                _eval(df, expr, engine, target, source)
+                engines.append(engine)
+                break
             except Exception as e:
-                try:
-                    df.eval(expr, inplace=True, engine='python')
-                except Exception as e:
+                if i == len(EVAL_ENGINES) - 1:
                     log.error('The type in {} is not be supported and '
-                              'the expression cannot be evaluated.'.format(key))
+                              'the expression cannot be evaluated.'.format(expr.split('=', 1)[0]))
                     raise e
 
-    # select output
-    all_variables = list(set(variables.keys()) | set(delayed_variables.keys()))
-    out_df = df[group_cols + all_variables].reset_index(drop=True)
+    plan = []
+    for engine, expr in zip(engines, assignments):
+        if len(plan) > 0 and plan[-1][0] == engine:
+            plan[-1] = (engine, plan[-1][1] + '\n' + expr)
+        else:
+            plan.append((engine, expr))
+
+    return plan
+
+def _eval(df, expr, engine, target=None, source=None):
+    # evaluate assignments in df or, if a target is given, store them in target
+    if (target is None) or (target is df):
+        df.eval(expr, inplace=True, engine=engine)
+    else:
+        # backtick quoted names are resolved with their cleaned names (as in DataFrame.eval)
+        source = df if source is None else source
+        resolvers = (target, {clean_column_name(c): v for c, v in source.items()})
+        if (df.index.name is not None) and (df.index.name not in df.columns):
+            resolvers += ({df.index.name: df.index.to_series()},)
+        pd.eval(expr, engine=engine, target=target, inplace=True, resolvers=resolvers)
+
+def get_columns(df = None,
+                variables = {},
+                groups = {},
+                where = None):
+    '''
+    Find the columns of a dataframe that are needed to evaluate variables and groups. Delayed
+    variables are evaluated after aggregation (on the variables and groups), so they do not
+    reference any input column.
 
-    if fill_groups:
-        all_groups = [list(out_df[c].unique()) for c in group_cols]
-        all_groups = list(product(*all_groups))
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe (if None, all the referenced names are returned)
+    variables : dict
+        variables dictionary (name:expr or name:list(expr))
+    groups : dict
+        groups dictionary (name:expr)
+    where : str or None
+        quoted expression used to filter the rows
 
-        filled_df = pd.DataFrame(data = all_groups,
-                                 columns = group_cols)
+    Returns
+    -------
+    columns : list or None
+        referenced columns, in the same order as df.columns (None if an expression cannot be
+        analysed, in which case all columns should be used)
 
-        out_df = pd.merge(filled_df, out_df, how='left', on=list(groups.keys()))
+    '''
 
-    return out_df
+    data_groups, data_variables, _ = get_groups(None, variables, groups)
+
+    referenced = set()
+    for expr in list(data_variables.values()) + list(data_groups.values()) + [where]:
+        names = expression_columns(expr)
+        if names is None:
+            return None
+        referenced |= names
+
+    if df is None:
+        return sorted(referenced)
+    else:
+        return [c for c in df.columns if c in referenced]
 
 def get_groups(df = None,
                variables = {},
@@ -103,7 +744,8 @@ def get_groups(df = None,
     Parameters
     ----------
     df : pd.DataFrame
-        input dataframe (used if one of the groups/variables is the index)
+        input dataframe (not modified; groups equal to `.index` are read from the index when
+        the expressions are evaluated)
     variables : dict
         variables dictionary (name:expr or name:list(expr))
     groups : dict
@@ -124,17 +766,8 @@ def get_groups(df = None,
     data_groups={}
 
     for group, expr in groups.items():
-
-        if (expr=='.index') & (df is not None):
-            if df.index.name is None:
-                df.index.name = group
-
-            data_groups[group] = df.index.name
-            df.reset_index(inplace=True)
-
-        else:
-            if expr is not None:
-                data_groups[group] = expr
+        if expr is not None:
+            data_groups[group] = expr
 
     # define variables
     data_variables={}
@@ -167,22 +800,59 @@ def get_groups(df = None,
 def bootstrapping_aggregation(x,
                               agg_fun = bs_stats.mean,
                               num_iterations = 10_000,
+                              tolerance = None,
+                              block_size = BLOCK_SIZE,
                               **kwargs):
 
     # get x values and sample size
     xvals = x.astype(float).values
     sample_size = x.shape[0]
 
-    # get bootstrap results
-    bs_results = bs.bootstrap(values = xvals,
-                              stat_func = agg_fun,
-                              num_iterations = num_iterations,
-                              **kwargs)
-    out_dict = {'sample_size': sample_size,
-                'num_iterations': num_iterations,
-                'center': bs_results.value,
-                'low': bs_results.lower_bound,
-                'high': bs_results.upper_bound,
-                'successful': bs_results.get_result()}
+    if tolerance is None:
+        # get bootstrap results
+        bs_results = bs.bootstrap(values = xvals,
+                                  stat_func = agg_fun,
+                                  num_iterations = num_iterations,
+                                  **kwargs)
+        out_dict = {'sample_size': sample_size,
+                    'num_iterations': num_iterations,
+                    'center': bs_results.value,
+                    'low': bs_results.lower_bound,
+                    'high': bs_results.upper_bound,
+                    'successful': bs_results.get_result()}
+    else:
+        # run blocks of iterations until the interval bounds stop moving
+        alpha = kwargs.pop('alpha', 0.05)
+        is_pivotal = kwargs.pop('is_pivotal', True)
+        stat_val = agg_fun(xvals)[0]
+        if kwargs.get('denominator_values') is not None:
+            stat_val = stat_val / agg_fun(kwargs['denominator_values'])[0]
+
+        dist_ls = []
+        low, high = np.nan, np.nan
+        iterations = 0
+        while iterations < num_iterations:
+            block = min(block_size, num_iterations - iterations)
+            dist_ls.append(bs.bootstrap(values = xvals,
+                                        stat_func = agg_fun,
+                                        num_iterations = block,
+                                        return_distribution = True,
+                                        **kwargs))
+            iterations += block
+            new_low, center, new_high = confidence_interval(np.concatenate(dist_ls)[:, None],
+                                                            np.array([stat_val]),
+                                                            alpha,
+                                                            is_pivotal)
+            change = max(abs(new_low[0] - low), abs(new_high[0] - high))
+            low, high = new_low[0], new_high[0]
+            if change <= tolerance * (high - low):
+                break
+
+        out_dict = {'sample_size': sample_size,
+                    'num_iterations': iterations,
+                    'center': center[0],
+                    'low': low,
+                    'high': high,
+                    'successful': int(np.sign(low) == np.sign(high)) * np.sign(center[0])}
 
     return out_dict
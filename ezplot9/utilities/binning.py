@@ -1,5 +1,216 @@
+import numpy as np
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
+
+from .kernels import encode_groups
+from .parallel import get_n_jobs
+
+import logging
+log = logging.getLogger(__name__)
+
+class Bins:
+    '''
+    Equally spaced bins. Bins are closed on the right (as in pd.cut), ie the bin of code i is
+    (start + i * width, start + (i + 1) * width].
+
+    Parameters
+    ----------
+    start : float
+        left edge of the first bin
+    width : float
+        width of each bin
+    n_bins : int
+        number of bins
+
+    '''
+
+    def __init__(self, start, width, n_bins):
+        self.start = start
+        self.width = width
+        self.n_bins = n_bins
+
+    def __repr__(self):
+        return 'Bins(start={}, width={}, n_bins={})'.format(self.start, self.width, self.n_bins)
+
+    @classmethod
+    def from_data(cls, x, bins=21, bin_width=None):
+        '''
+        Bins covering the range of x, centered on its minimum and maximum
+
+        Parameters
+        ----------
+        x : array
+            vector to be binned
+        bins : int or None
+            number of bins (the centers of the first and last bins are the minimum and
+            maximum of x)
+        bin_width : float or None
+            width of each bin
+
+        Returns
+        -------
+        bins : Bins
+
+        '''
+        max_val = np.nanmax(x)
+        min_val = np.nanmin(x)
+
+        if (bins is not None) and (bin_width is None):
+            bin_width = (max_val - min_val) / (bins - 1)
+        elif (bins is None) and (bin_width is not None):
+            bins = int((max_val - min_val) / bin_width) + 1
+        else:
+            log.error("Only one between nbins and bin_width should be defined")
+            raise ValueError("Only one between nbins and binwidth should be defined")
+
+        delta = 0.5 * (bin_width * bins - (max_val - min_val))
+
+        return cls(min_val - delta, bin_width, bins)
+
+    @property
+    def edges(self):
+        return self.start + self.width * np.arange(self.n_bins + 1)
+
+    @property
+    def centers(self):
+        return self.start + self.width * (np.arange(self.n_bins) + 0.5)
+
+    def codes(self, x):
+        '''
+        Integer bin codes of the values of x (-1 for missing values and values outside the bins)
+
+        Parameters
+        ----------
+        x : array
+            vector to be binned
+
+        Returns
+        -------
+        codes : np.array
+            bin code of each value
+
+        '''
+        x = np.asarray(x, dtype=float)
+        if self.width > 0:
+            # compare with the edges (as pd.cut), so that values on an edge are binned exactly
+            codes = np.searchsorted(self.edges, x, side='left') - 1
+        else:
+            codes = np.where(x == self.start, 0, -1)
+        inside = (codes >= 0) & (codes < self.n_bins)
+
+        return np.where(inside, codes, -1).astype(np.int64)
+
+    def labels(self, codes):
+        '''
+        Bin centers of integer bin codes (NaN for negative codes)
+
+        Parameters
+        ----------
+        codes : array
+            bin codes
+
+        Returns
+        -------
+        labels : np.array
+            bin centers
+
+        '''
+        codes = np.asarray(codes)
+        return np.where(codes >= 0, self.centers[np.maximum(codes, 0)], np.nan)
+
+class QuantileBins:
+    '''
+    Quantile bins (as in pd.qcut with duplicates='drop'). Edges can be estimated in bounded
+    memory from a QuantileSketch of chunked or partitioned data, and then used to bin each
+    chunk. The first bin is closed on both sides, the others are closed on the right.
+
+    Parameters
+    ----------
+    edges : array
+        increasing bin edges
+
+    '''
+
+    def __init__(self, edges):
+        edges = np.asarray(edges, dtype=float)
+        # a single bin is kept even if its edges are equal (as in pd.qcut with one quantile)
+        self.edges = edges if len(edges) == 2 else np.unique(edges)
+        self.n_bins = max(len(self.edges) - 1, 0)
+
+    def __repr__(self):
+        return 'QuantileBins(n_bins={})'.format(self.n_bins)
+
+    @classmethod
+    def from_sketch(cls, sketch, n_quantiles=20):
+        '''
+        Quantile bins estimated from a quantile sketch
+
+        Parameters
+        ----------
+        sketch : QuantileSketch
+            sketch of the values to be binned
+        n_quantiles : int
+            number of quantiles to be used
+
+        Returns
+        -------
+        bins : QuantileBins
+
+        '''
+        return cls(sketch.quantile(np.linspace(0, 1, n_quantiles + 1)))
+
+    def codes(self, x):
+        '''
+        Integer bin codes of the values of x (-1 for missing values and values outside the bins)
+
+        Parameters
+        ----------
+        x : array
+            vector to be binned
+
+        Returns
+        -------
+        codes : np.array
+            bin code of each value
+
+        '''
+        x = np.asarray(x, dtype=float)
+        codes = np.searchsorted(self.edges, x, side='left') - 1
+        if self.n_bins > 0:
+            codes[x == self.edges[0]] = 0
+        inside = (codes >= 0) & (codes < self.n_bins) & ~np.isnan(x)
+
+        return np.where(inside, codes, -1).astype(np.int64)
+
+def bin_codes(x,
+              bins=21,
+              bin_width=None):
+    '''
+    Compute the integer bin codes of a vector
+
+    Parameters
+    ----------
+    x : array
+        vector to be binned
+    bins : int, Bins or None
+        number of bins (or precomputed bins, eg from a previous chunk)
+    bin_width : float or None
+        width of each bin
+
+    Returns
+    -------
+    codes : np.array
+        bin code of each value (-1 for missing values)
+    bins : Bins
+        bins used
+
+    '''
+    if not isinstance(bins, Bins):
+        bins = Bins.from_data(x, bins, bin_width)
+
+    return bins.codes(x), bins
+
 def bin_data(x,
              bins=21,
              bin_width=None):
@@ -21,31 +232,102 @@ def bin_data(x,
         binnded version of the input
 
     '''
-    max_val = x.max()
-    min_val = x.min()
-
-    if (bins is not None) and (bin_width is None):
-        bin_width = (max_val - min_val) / (bins - 1)
-        delta = 0.5 * bin_width
-    elif (bins is None) and (bin_width is not None):
-        bins = int((max_val - min_val) / bin_width) + 1
-        delta = 0.5 * (max_val - min_val - bin_width * bins)
-    else:
-        log.error("Only one between nbins and bin_width should be defined")
-        raise ValueError("Only one between nbins and binwidth should be defined")
+    codes, bins = bin_codes(x, bins, bin_width)
+    binned_x = bins.labels(codes)
+    if isinstance(x, pd.Series):
+        binned_x = pd.Series(binned_x, index=x.index, name=x.name)
+
+    return binned_x, bins.n_bins, bins.width
+
+def quantile_codes(values,
+                   ids,
+                   n_groups,
+                   n_quantiles=20):
+    '''
+    Quantile bin codes of values within each group (as pd.qcut with duplicates='drop'). Values
+    are sorted once by group and value, and the edges and codes of all groups are computed at
+    once.
+
+    Parameters
+    ----------
+    values : np.array
+        values to be binned
+    ids : np.array
+        group code of each value (values with negative codes are not binned)
+    n_groups : int
+        number of groups
+    n_quantiles : int
+        number of quantiles to be used
+
+    Returns
+    -------
+    codes : np.array
+        bin code of each value (-1 for values not binned). Bins are numbered consecutively
+        across groups, ie the bins of group i follow the bins of group i - 1
+    n_bins : np.array
+        number of bins of each group
+
+    '''
+
+    values = np.asarray(values, dtype=float)
+
+    # sort by group and value
+    valid = np.flatnonzero((ids >= 0) & ~np.isnan(values))
+    order = valid[np.lexsort((values[valid], ids[valid]))]
+    sorted_ids = ids[order]
+    sorted_values = values[order]
+    sizes = np.bincount(sorted_ids, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+
+    # quantile edges of each group (linear interpolation, as in np.quantile)
+    quantiles = np.linspace(0, 1, n_quantiles + 1)
+    observed = np.flatnonzero(sizes)
+    virtual = (sizes[observed, None] - 1) * quantiles[None, :]
+    previous = np.floor(virtual)
+    gamma = virtual - previous
+    previous = previous.astype(np.int64)
+    following = np.minimum(previous + 1, sizes[observed, None] - 1)
+    a = sorted_values[starts[observed, None] + previous]
+    b = sorted_values[starts[observed, None] + following]
+    diff = b - a
+    edges = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+
+    # drop duplicated edges (a single bin is kept as it is, so that a group with a single
+    # distinct value is one bin, as in pd.qcut)
+    keep = np.ones(edges.shape, dtype=bool)
+    if n_quantiles > 1:
+        keep[:, 1:] = edges[:, 1:] != edges[:, :-1]
+    edge_ids = np.repeat(observed, keep.sum(axis=1))
+    edges = edges[keep]
 
-    start_bin = min_val - delta
-    bins_intervals = [start_bin + bin_width * i for i in range(bins + 1)]
-    bins_labels = [min_val + bin_width * i for i in range(bins)]
-    binned_x = pd.cut(x, bins=bins_intervals, labels=bins_labels)
-    binned_x = binned_x.astype(float)
+    # bin codes: number of edges (of the same group) lower than each value, found by merging
+    # edges and values sorted by group and value (values before equal edges)
+    n_edges = np.bincount(edge_ids, minlength=n_groups)
+    is_edge = np.r_[np.ones(len(edges), dtype=bool), np.zeros(len(sorted_values), dtype=bool)]
+    merged_ids = np.r_[edge_ids, sorted_ids]
+    merged = np.lexsort((is_edge, np.r_[edges, sorted_values], merged_ids))
+    lower_edges = np.cumsum(is_edge[merged]) - (np.cumsum(n_edges) - n_edges)[merged_ids[merged]]
+    is_value = ~is_edge[merged]
+    sorted_codes = np.empty(len(sorted_values), dtype=np.int64)
+    sorted_codes[merged[is_value] - len(edges)] = np.maximum(lower_edges[is_value] - 1, 0)
+    n_bins = np.maximum(n_edges - 1, 0)
+    binned = sorted_codes < n_bins[sorted_ids]
 
-    return binned_x, bins, bin_width
+    # number the bins of all groups consecutively
+    offsets = np.cumsum(n_bins) - n_bins
+    codes = np.full(len(values), -1, dtype=np.int64)
+    codes[order[binned]] = offsets[sorted_ids[binned]] + sorted_codes[binned]
+
+    return codes, n_bins
 
 def qbin_data(x,
-              n_quantiles=20):
+              n_quantiles=20,
+              groups=None):
     '''
-    Bin the values of a vector according to its quantiles
+    Bin the values of a vector according to its quantiles (as pd.qcut with duplicates='drop')
+    and label each bin with the mean of its values. If groups are given, quantiles are computed
+    within each group: values are sorted once by group and value, and bin codes and means are
+    computed for all groups at once (see quantile_codes).
 
     Parameters
     ----------
@@ -53,6 +335,8 @@ def qbin_data(x,
         vector to be binned
     n_quantiles : int
         number of quantiles to be used
+    groups : pd.DataFrame, array or None
+        group values of each element of x (rows with missing groups are not binned)
 
     Returns
     -------
@@ -61,12 +345,140 @@ def qbin_data(x,
 
     '''
 
-    binned_x = pd.qcut(x, q=n_quantiles, duplicates='drop')
-    rename_dict = \
-        pd.DataFrame({'x':x, 'q_x':binned_x})\
-        .groupby('q_x')['x']\
-        .mean()\
-        .to_dict()
-    binned_x = binned_x.cat.rename_categories(rename_dict).astype(float)
+    values = np.asarray(x, dtype=float)
+    if groups is None:
+        ids, n_groups = np.zeros(len(values), dtype=np.int64), 1
+    else:
+        groups = pd.DataFrame(groups).reset_index(drop=True)
+        ids, keys = encode_groups(groups, list(groups.columns))
+        n_groups = len(keys)
+    codes, n_bins = quantile_codes(values, ids, n_groups, n_quantiles)
+
+    # label each bin with the mean of its values
+    binned = codes >= 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bin_means = np.bincount(codes[binned], weights=values[binned], minlength=n_bins.sum()) \
+                    / np.bincount(codes[binned], minlength=n_bins.sum())
+
+    binned_x = np.full(len(values), np.nan)
+    binned_x[binned] = bin_means[codes[binned]]
+    if isinstance(x, pd.Series):
+        binned_x = pd.Series(binned_x, index=x.index, name=x.name)
+
+    return binned_x
+
+def column_histograms(df,
+                      columns,
+                      group_cols=[],
+                      weight_col=None,
+                      bins=21,
+                      bin_width=None,
+                      normalize=False,
+                      n_jobs=1):
+    '''
+    Weighted histograms of many columns for each group, returned as a single long table.
+    Numeric columns are binned (see Bins.from_data) and other columns are counted by value.
+    The codes of all the columns are combined with the group codes into a single cell index
+    and counted with one np.bincount. Each histogram has one row for every combination of its
+    observed bins and group values (with zero weights for empty combinations), as agg_data
+    with fill_groups=True on each column.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    columns : list
+        columns whose histograms are computed
+    group_cols : list
+        group columns (rows with missing group values are ignored)
+    weight_col : str or None
+        column with the weight of each row (missing weights count as 0). Rows are counted
+        if None
+    bins : int or None
+        number of bins of each numeric column
+    bin_width : float or None
+        width of the bins of each numeric column
+    normalize : bool
+        normalize each histogram (within each group) to a density
+    n_jobs : int
+        number of threads used to bin the columns (-1 means all the available cores)
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        variable (column name), x (bin center or value), group columns, weight column ('w'
+        if weight_col is None) and width (bin width, 1 for non numeric columns)
+
+    '''
+
+    # group cell of each row
+    valid = np.ones(len(df), dtype=bool)
+    group_codes = []
+    group_uniques = []
+    for c in group_cols:
+        codes, uniques = pd.factorize(df[c], sort=True)
+        valid &= codes >= 0
+        group_codes.append(codes)
+        group_uniques.append(uniques)
+    group_shape = tuple(max(len(u), 1) for u in group_uniques)
+    n_cells = int(np.prod(group_shape))
+    cells = np.ravel_multi_index([codes[valid] for codes in group_codes], group_shape) if group_cols \
+        else np.zeros(valid.sum(), dtype=np.int64)
+    if weight_col is None:
+        weights = np.ones(len(cells))
+    else:
+        weights = np.nan_to_num(df[weight_col].to_numpy(dtype=float)[valid])
+
+    def encode(column):
+        # bin code, labels and bin width of each column
+        if df[column].dtype.kind in 'iufb':
+            codes, binning = bin_codes(df[column].to_numpy(dtype=float), bins, bin_width)
+            return codes[valid], binning.centers, binning.width
+        codes, uniques = pd.factorize(df[column], sort=True)
+        return codes[valid], np.asarray(uniques, dtype=object), 1
+
+    n_jobs = min(get_n_jobs(n_jobs), len(columns))
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            encoded = list(executor.map(encode, columns))
+    else:
+        encoded = [encode(c) for c in columns]
+
+    # count all the columns at once: column j, bin i and group cell k go to offset_j + i * n_cells + k
+    sizes = np.array([len(labels) * n_cells for _, labels, _ in encoded], dtype=np.int64)
+    offsets = np.cumsum(sizes) - sizes
+    index = np.concatenate([np.where(codes >= 0, offset + codes * n_cells + cells, -1)
+                            for (codes, _, _), offset in zip(encoded, offsets)]) if columns \
+        else np.array([], dtype=np.int64)
+    observed = index >= 0
+    all_weights = np.tile(weights, len(columns))[observed]
+    index = index[observed]
+    counts = np.bincount(index, weights=all_weights, minlength=sizes.sum())
+    rows = np.bincount(index, minlength=sizes.sum())
+
+    out_ls = []
+    for column, (_, labels, width), offset, size in zip(columns, encoded, offsets, sizes):
+        shape = (len(labels),) + group_shape
+        hist = counts[offset:offset + size].reshape(shape)
+        present = rows[offset:offset + size].reshape(shape) > 0
+
+        # keep the observed bins and group values
+        axes = range(len(shape))
+        keep = [present.any(axis=tuple(a for a in axes if a != i)) for i in axes]
+        hist = hist[np.ix_(*keep)]
+        if normalize:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                hist = hist / (hist.sum(axis=0, keepdims=True) * width)
+
+        grid = np.meshgrid(*[np.flatnonzero(k) for k in keep], indexing='ij')
+        out_df = pd.DataFrame({'variable': column, 'x': labels[grid[0].ravel()]})
+        for c, codes, uniques in zip(group_cols, grid[1:], group_uniques):
+            out_df[c] = uniques.take(codes.ravel())
+        out_df['w' if weight_col is None else weight_col] = hist.ravel()
+        out_df['width'] = width
+        out_ls.append(out_df)
+
+    if len(out_ls) == 0:
+        return pd.DataFrame(columns=['variable', 'x'] + group_cols + ['w' if weight_col is None else weight_col, 'width'])
 
-    return binned_x
\ No newline at end of file
+    return pd.concat(out_ls, ignore_index=True)
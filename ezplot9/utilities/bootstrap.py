@@ -0,0 +1,220 @@
+import numpy as np
+
+import bootstrapped.stats_functions as bs_stats
+
+import logging
+log = logging.getLogger(__name__)
+
+# statistics supported by the batched bootstrap
+BOOTSTRAP_STATS = {'mean': 'mean',
+                   'sum': 'sum',
+                   bs_stats.mean: 'mean',
+                   bs_stats.sum: 'sum'}
+
+# keyword arguments of bootstrapped.bootstrap supported by the batched bootstrap
+BOOTSTRAP_KWARGS = ['alpha', 'is_pivotal']
+
+# maximum number of resampled values in each batch of iterations
+MAX_BATCH_SIZE = 2**22
+
+# number of iterations between convergence checks of the adaptive bootstrap
+BLOCK_SIZE = 500
+
+CI_COLUMNS = ['sample_size', 'num_iterations', 'center', 'low', 'high', 'successful']
+
+def get_bootstrap_stat(aggfun, kwargs={}):
+    '''
+    Get the statistic to be computed with the batched bootstrap
+
+    Parameters
+    ----------
+    aggfun : str or fun
+        aggregation function (eg bootstrapped.stats_functions.mean)
+    kwargs : dict
+        keyword arguments for bootstrapped.bootstrap
+
+    Returns
+    -------
+    stat : str or None
+        'mean' or 'sum' (None if the batched bootstrap does not support aggfun or kwargs)
+
+    '''
+    try:
+        stat = BOOTSTRAP_STATS.get(aggfun)
+    except TypeError:
+        return None
+    if any(k not in BOOTSTRAP_KWARGS for k in kwargs):
+        return None
+    return stat
+
+def group_bootstrap(values,
+                    ids,
+                    n_groups,
+                    stat='mean',
+                    num_iterations=10_000,
+                    alpha=0.05,
+                    is_pivotal=True,
+                    seed=None,
+                    tolerance=None,
+                    block_size=BLOCK_SIZE,
+                    max_batch_size=MAX_BATCH_SIZE):
+    '''
+    Bootstrap a statistic of values for all groups at once. Each iteration resamples (with
+    replacement) every group within its own segment of the sorted values, and the statistics
+    of all groups are computed in batches of iterations. Intervals are computed as in
+    bootstrapped.bootstrap. Missing values are ignored.
+
+    If a tolerance is given, iterations are run in blocks and each group stops as soon as its
+    interval bounds move by less than tolerance * (interval width) between two blocks (or when
+    num_iterations is reached).
+
+    Parameters
+    ----------
+    values : np.array
+        values to be bootstrapped
+    ids : np.array
+        group code of each value (values with negative codes are ignored)
+    n_groups : int
+        number of groups
+    stat : str
+        'mean' or 'sum'
+    num_iterations : int
+        (maximum) number of bootstrap iterations
+    alpha : float
+        alpha value of the confidence interval (eg 0.05 for 95% intervals)
+    is_pivotal : bool
+        use the pivotal method (otherwise the percentile method is used)
+    seed : int, np.random.Generator or None
+        seed of the random number generator
+    tolerance : float or None
+        relative change of the interval bounds between blocks below which a group stops
+        (all groups run num_iterations iterations if None)
+    block_size : int
+        number of iterations between convergence checks
+    max_batch_size : int
+        maximum number of resampled values in each batch of iterations
+
+    Returns
+    -------
+    results : dict
+        arrays with sample_size, num_iterations, center, low, high and successful of each group
+
+    '''
+
+    if stat not in ['mean', 'sum']:
+        log.error('{} is not supported by the batched bootstrap'.format(stat))
+        raise ValueError('{} is not supported by the batched bootstrap'.format(stat))
+
+    rng = np.random.default_rng(seed)
+
+    # sort values by group (each group is a contiguous segment)
+    values = np.asarray(values, dtype=float)
+    keep = (ids >= 0) & ~np.isnan(values)
+    order = np.argsort(ids[keep], kind='stable')
+    sorted_ids = ids[keep][order]
+    sorted_values = values[keep][order]
+
+    sizes = np.bincount(sorted_ids, minlength=n_groups)
+    observed = np.flatnonzero(sizes)
+    starts = np.cumsum(sizes) - sizes
+
+    # segment and (observed) group of each position
+    row_starts = starts[sorted_ids]
+    row_sizes = sizes[sorted_ids]
+    row_groups = np.cumsum(sizes > 0)[sorted_ids] - 1
+
+    sums = np.bincount(sorted_ids, weights=sorted_values, minlength=n_groups)[observed]
+    center = sums / sizes[observed] if stat == 'mean' else sums
+
+    dist = np.empty((num_iterations, len(observed)))
+    iterations = np.zeros(len(observed), dtype=int)
+    active = np.ones(len(observed), dtype=bool)
+    low, high = np.full(len(observed), np.nan), np.full(len(observed), np.nan)
+    block_size = num_iterations if tolerance is None else max(block_size, 1)
+    done = 0
+    while (done < num_iterations) and active.any():
+
+        # resample the rows of the active groups
+        rows = active[row_groups]
+        group_starts = np.cumsum(sizes[observed][active]) - sizes[observed][active]
+        n = rows.sum()
+        block = min(block_size, num_iterations - done)
+        batch_size = max(min(max_batch_size // n, block), 1)
+        for i in range(done, done + block, batch_size):
+            b = min(batch_size, done + block - i)
+            idx = row_starts[rows] + (rng.random((b, n)) * row_sizes[rows]).astype(np.int64)
+            dist[i:i + b, active] = np.add.reduceat(sorted_values[idx], group_starts, axis=1)
+        if stat == 'mean':
+            dist[done:done + block, active] /= sizes[observed][active]
+        done += block
+        iterations[active] = done
+
+        if tolerance is not None:
+            # stop the groups whose intervals have converged
+            prev_low, prev_high = low[active], high[active]
+            new_low, _, new_high = confidence_interval(dist[:done, active], center[active], alpha, is_pivotal)
+            with np.errstate(invalid='ignore'):
+                converged = np.maximum(np.abs(new_low - prev_low), np.abs(new_high - prev_high)) \
+                            <= tolerance * (new_high - new_low)
+            low[active], high[active] = new_low, new_high
+            active[np.flatnonzero(active)[converged]] = False
+
+    # confidence intervals (for each number of iterations)
+    low, high = np.empty(len(observed)), np.empty(len(observed))
+    for k in np.unique(iterations):
+        cols = iterations == k
+        low[cols], center[cols], high[cols] = confidence_interval(dist[:k, cols], center[cols], alpha, is_pivotal)
+
+    results = {'sample_size': sizes,
+               'num_iterations': np.full(n_groups, num_iterations),
+               'center': np.full(n_groups, np.nan),
+               'low': np.full(n_groups, np.nan),
+               'high': np.full(n_groups, np.nan),
+               'successful': np.full(n_groups, np.nan)}
+    results['num_iterations'][observed] = iterations
+    results['center'][observed] = center
+    results['low'][observed] = low
+    results['high'][observed] = high
+    results['successful'][observed] = (np.sign(low) == np.sign(high)) * np.sign(center)
+
+    return results
+
+def confidence_interval(dist,
+                        center,
+                        alpha=0.05,
+                        is_pivotal=True):
+    '''
+    Bootstrap confidence intervals (as in bootstrapped.bootstrap) from the bootstrap
+    distribution of each group
+
+    Parameters
+    ----------
+    dist : np.array
+        bootstrap distributions (one column for each group)
+    center : np.array
+        statistic of each group
+    alpha : float
+        alpha value of the confidence interval (eg 0.05 for 95% intervals)
+    is_pivotal : bool
+        use the pivotal method (otherwise the percentile method is used)
+
+    Returns
+    -------
+    low : np.array
+        lower bounds
+    center : np.array
+        center of the intervals (median of the distribution if is_pivotal is False)
+    high : np.array
+        upper bounds
+
+    '''
+    if dist.shape[1] == 0:
+        return np.array([]), np.array([]), np.array([])
+
+    q_low, q_mid, q_high = np.percentile(dist, [100 * alpha / 2., 50, 100 * (1 - alpha / 2.)], axis=0)
+    if is_pivotal:
+        low, high = 2 * center - q_high, 2 * center - q_low
+    else:
+        low, center, high = q_low, q_mid, q_high
+
+    return np.minimum(low, high), center, np.maximum(low, high)
@@ -0,0 +1,202 @@
+import hashlib
+import threading
+import pandas as pd
+
+from collections import OrderedDict
+
+import logging
+log = logging.getLogger(__name__)
+
+MAX_CACHE_BYTES = 256 * 2**20
+
+class AggregationCache:
+    '''
+    Memory bounded LRU cache of aggregated dataframes, keyed by a fingerprint of the input data
+    and by the aggregation spec. Cached dataframes are copied when stored and when returned, so
+    they can be modified by the caller.
+
+    Parameters
+    ----------
+    max_bytes : int
+        maximum memory used by the cached dataframes (least recently used entries are evicted
+        first)
+    enabled : bool
+        if False, agg_data does not use the cache unless it is passed explicitly
+
+    '''
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, enabled=False):
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        '''
+        Get a copy of a cached dataframe (None if the key is not in the cache)
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[0].copy()
+
+    def put(self, key, df):
+        '''
+        Store a copy of a dataframe in the cache, evicting the least recently used entries
+        if needed (dataframes larger than max_bytes are not stored)
+        '''
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            log.debug('aggregated dataframe too large to be cached ({} bytes)'.format(nbytes))
+            return
+        df = df.copy()
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_bytes
+                self.evictions += 1
+
+    def invalidate(self, df=None):
+        '''
+        Remove the cached results computed from df (all the entries are removed if None)
+        '''
+        with self._lock:
+            if df is None:
+                self._entries.clear()
+                self.nbytes = 0
+                return
+            fingerprints = {}
+            for key in list(self._entries.keys()):
+                columns = key[1]
+                if columns not in fingerprints:
+                    fingerprints[columns] = fingerprint(df, columns)
+                if key[0] == fingerprints[columns]:
+                    self.nbytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        '''
+        Remove all the entries and reset the statistics
+        '''
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        '''
+        Cache statistics
+
+        Returns
+        -------
+        stats : dict
+            hits, misses, evictions, number of entries and memory used by the cache
+
+        '''
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes}
+
+# default cache used by agg_data (disabled until aggregation_cache.enabled is set to True)
+aggregation_cache = AggregationCache()
+
+def get_cache(cache=None):
+    '''
+    Resolve the cache argument of agg_data
+
+    Parameters
+    ----------
+    cache : bool, AggregationCache or None
+        cache to be used. If None, the default cache is used when enabled, if True the default
+        cache is always used and if False no cache is used
+
+    Returns
+    -------
+    cache : AggregationCache or None
+
+    '''
+    if isinstance(cache, AggregationCache):
+        return cache
+    elif cache is None:
+        return aggregation_cache if aggregation_cache.enabled else None
+    elif cache:
+        return aggregation_cache
+    else:
+        return None
+
+def fingerprint(df, columns=None):
+    '''
+    Fast fingerprint of the content of a dataframe (values, dtypes, column names and index)
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    columns : tuple or None
+        columns to be used (all columns are used if None)
+
+    Returns
+    -------
+    fingerprint : str or None
+        hex digest (None if the data cannot be hashed, eg unhashable objects)
+
+    '''
+    if columns is not None:
+        if not all(c in df.columns for c in columns):
+            return None
+        df = df[list(columns)]
+    try:
+        hashes = pd.util.hash_pandas_object(df if len(df.columns) > 0 else df.index).to_numpy()
+    except TypeError:
+        return None
+
+    h = hashlib.blake2b(hashes.tobytes(), digest_size=16)
+    h.update(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode())
+    h.update(repr((df.index.names, str(df.index.dtype))).encode())
+    return h.hexdigest()
+
+def cache_key(df, columns, spec):
+    '''
+    Cache key of an aggregation
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    columns : list or None
+        columns of df used by the aggregation (all columns are used if None)
+    spec : tuple
+        hashable aggregation spec (expressions, aggregation function and options)
+
+    Returns
+    -------
+    key : tuple or None
+        cache key (None if the data or the spec cannot be hashed)
+
+    '''
+    columns = tuple(columns) if columns is not None else None
+    data_key = fingerprint(df, columns)
+    if data_key is None:
+        return None
+    try:
+        hash(spec)
+    except TypeError:
+        return None
+    return (data_key, columns, spec)
@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+
+from .kernels import encode_groups
+from .binning import Bins, quantile_codes
+from .intervals import compute_intervals
+
+import logging
+log = logging.getLogger(__name__)
+
+def group_calibration(target,
+                      scores,
+                      ids,
+                      n_groups,
+                      bins=10,
+                      use_quantiles=False,
+                      method=None,
+                      num_iterations=10_000,
+                      alpha=0.05,
+                      seed=None):
+    '''
+    Calibration bins of several score columns for each group at once. Each score column is
+    binned (equally spaced bins covering its range, or quantile bins within each group), then
+    the rows of all the columns are counted and summed with a single bincount over
+    (column, group, bin) cells. Confidence intervals of the mean target of all the cells are
+    computed at once with the same cell codes (see intervals.compute_intervals).
+
+    Parameters
+    ----------
+    target : np.array
+        target of each row (eg 0/1), averaged within each bin
+    scores : np.array
+        scores (one column for each model)
+    ids : np.array
+        group code of each row (rows with negative codes are ignored)
+    n_groups : int
+        number of groups
+    bins : int
+        number of bins (or quantiles) of each curve
+    use_quantiles : bool
+        bin each curve using its quantiles
+    method : str or None
+        intervals of the mean target: 'bootstrap', 'analytic' (Wilson intervals for 0/1
+        targets), 'auto' or None (no intervals)
+    num_iterations : int
+        number of bootstrap iterations
+    alpha : float
+        alpha value of the confidence intervals (eg 0.05 for 95% intervals)
+    seed : int, np.random.Generator or None
+        seed of the random number generator used for bootstrapping
+
+    Returns
+    -------
+    results : dict
+        curve (code of the curve of each bin, ie column * n_groups + group), bin (code of the
+        bin within its curve), label (bin center, or mean score with quantile bins), score
+        (mean score), target (mean target) and count of each non empty bin, and low and high
+        (bounds of the interval of the mean target) if method is not None
+
+    '''
+
+    target = np.asarray(target, dtype=float)
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    n_curves = scores.shape[1] * n_groups
+
+    # rows of all the curves (rows with missing scores or groups are not binned)
+    curves = (np.arange(scores.shape[1])[None, :] * n_groups + ids[:, None]).ravel(order='F')
+    values = scores.ravel(order='F')
+    valid = (np.tile(ids, scores.shape[1]) >= 0) & ~np.isnan(values)
+
+    if use_quantiles:
+        codes, n_bins = quantile_codes(values, np.where(valid, curves, -1), n_curves, bins)
+        cell_curves = np.repeat(np.arange(n_curves), n_bins)
+        cell_bins = np.arange(n_bins.sum()) - np.repeat(np.cumsum(n_bins) - n_bins, n_bins)
+    else:
+        codes = np.full(len(values), -1, dtype=np.int64)
+        centers = []
+        for i, column in enumerate(np.split(np.arange(len(values)), scores.shape[1])):
+            column = column[valid[column]]
+            if len(column) == 0:
+                centers.append(np.full(bins, np.nan))
+                continue
+            column_bins = Bins.from_data(values[column], bins)
+            column_codes = column_bins.codes(values[column])
+            codes[column] = np.where(column_codes >= 0, curves[column] * bins + column_codes, -1)
+            centers.append(column_bins.centers)
+        cell_curves = np.repeat(np.arange(n_curves), bins)
+        cell_bins = np.tile(np.arange(bins), n_curves)
+
+    # aggregate all the cells at once (rows with missing targets are not counted)
+    counted = (codes >= 0) & ~np.tile(np.isnan(target), scores.shape[1])
+    codes, values, y = codes[counted], values[counted], np.tile(target, scores.shape[1])[counted]
+    n_cells = len(cell_curves)
+    count = np.bincount(codes, minlength=n_cells)
+    score_sums = np.bincount(codes, weights=values, minlength=n_cells)
+    target_sums = np.bincount(codes, weights=y, minlength=n_cells)
+
+    cells = np.flatnonzero(count)
+    score = score_sums[cells] / count[cells]
+    if use_quantiles:
+        label = score
+    else:
+        label = np.concatenate(centers).reshape(-1, bins)[cell_curves[cells] // n_groups, cell_bins[cells]] \
+            if len(cells) > 0 else np.zeros(0)
+
+    results = {'curve': cell_curves[cells],
+               'bin': cell_bins[cells],
+               'label': label,
+               'score': score,
+               'target': target_sums[cells] / count[cells],
+               'count': count[cells]}
+
+    if method is not None:
+        intervals = compute_intervals(y, codes, n_cells, 'mean', method, num_iterations, alpha, seed)
+        results['low'] = intervals['low'][cells]
+        results['high'] = intervals['high'][cells]
+
+    return results
+
+def calibration_data(df,
+                     target_col,
+                     score_cols,
+                     group_cols=[],
+                     bins=10,
+                     use_quantiles=False,
+                     pos_label=None,
+                     method=None,
+                     num_iterations=10_000,
+                     alpha=0.05,
+                     seed=None):
+    '''
+    Calibration bins of several score columns for each group of a dataframe (see
+    group_calibration)
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    target_col : str
+        target column
+    score_cols : list
+        score columns (eg the probabilities of different models)
+    group_cols : list
+        group columns
+    bins : int
+        number of bins (or quantiles) of each curve
+    use_quantiles : bool
+        bin each curve using its quantiles
+    pos_label : int, str or None
+        label of the positive class (the target is averaged as it is if None)
+    method : str or None
+        intervals of the mean target: 'bootstrap', 'analytic', 'auto' or None (no intervals)
+    num_iterations : int
+        number of bootstrap iterations
+    alpha : float
+        alpha value of the confidence intervals (eg 0.05 for 95% intervals)
+    seed : int, np.random.Generator or None
+        seed of the random number generator used for bootstrapping
+
+    Returns
+    -------
+    calibration_df : pd.DataFrame
+        variable (score column), group columns, x (bin center, or mean score with quantile
+        bins), score (mean score), target (mean target, ie rate of positives) and count of
+        each non empty bin, and low and high (bounds of the interval of the mean target) if
+        method is not None
+
+    '''
+
+    if len(group_cols) > 0:
+        ids, keys = encode_groups(df, group_cols)
+    else:
+        ids, keys = np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=pd.RangeIndex(1))
+
+    target = df[target_col] if pos_label is None else df[target_col] == pos_label
+    results = group_calibration(target.to_numpy(dtype=float),
+                                df[score_cols].to_numpy(dtype=float),
+                                ids,
+                                len(keys),
+                                bins,
+                                use_quantiles,
+                                method,
+                                num_iterations,
+                                alpha,
+                                seed)
+
+    calibration_df = keys.iloc[results['curve'] % len(keys)].reset_index(drop=True)
+    calibration_df.insert(0, 'variable', np.asarray(score_cols, dtype=object)[results['curve'] // len(keys)])
+    calibration_df['x'] = results['label']
+    calibration_df['score'] = results['score']
+    calibration_df['target'] = results['target']
+    calibration_df['count'] = results['count']
+    if method is not None:
+        calibration_df['low'] = results['low']
+        calibration_df['high'] = results['high']
+
+    return calibration_df
@@ -0,0 +1,230 @@
+import io
+import os
+import ast
+import operator
+import tokenize
+
+import logging
+log = logging.getLogger(__name__)
+
+COMPARISON_OPERATORS = {ast.Eq: operator.eq,
+                        ast.NotEq: operator.ne,
+                        ast.Lt: operator.lt,
+                        ast.LtE: operator.le,
+                        ast.Gt: operator.gt,
+                        ast.GtE: operator.ge}
+
+# & and | have the precedence of `and` and `or` in pandas expressions
+BOOLEAN_OPERATORS = {'&': 'and', '|': 'or'}
+
+def is_dataset(df):
+    '''
+    Check if the input is a parquet path or a pyarrow dataset
+
+    Parameters
+    ----------
+    df : object
+        input data
+
+    Returns
+    -------
+    flag : bool
+
+    '''
+    return isinstance(df, (str, os.PathLike)) or type(df).__module__.startswith('pyarrow')
+
+def get_dataset(source):
+    '''
+    Open a parquet path (file or directory) as a pyarrow dataset
+
+    Parameters
+    ----------
+    source : str or pyarrow.dataset.Dataset
+        parquet path or dataset
+
+    Returns
+    -------
+    dataset : pyarrow.dataset.Dataset
+
+    '''
+    try:
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        log.error('pyarrow is required to read parquet datasets')
+        raise e
+
+    if isinstance(source, (str, os.PathLike)):
+        return ds.dataset(source, format='parquet')
+    else:
+        return source
+
+def dataset_chunks(source,
+                   columns=None,
+                   where=None):
+    '''
+    Read a parquet path or a pyarrow dataset batch by batch, reading only the requested columns
+    and pushing the conjuncts of the filter that can be translated (see split_where) down to
+    the dataset scanner.
+
+    Parameters
+    ----------
+    source : str or pyarrow.dataset.Dataset
+        parquet path or dataset
+    columns : list or None
+        columns to be read (all columns are read if None)
+    where : str or None
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    chunks : iterator of pd.DataFrame
+        dataframe chunks
+    where : str or None
+        part of the filter that could not be pushed down (and still needs to be applied)
+
+    '''
+
+    dataset = get_dataset(source)
+
+    if columns is not None:
+        columns = [c for c in dataset.schema.names if c in columns]
+
+    row_filter, where = split_where(where) if where is not None else (None, None)
+    if where is not None:
+        log.info('{} cannot be pushed down to the dataset and is applied after reading'.format(where))
+
+    batches = dataset.to_batches(columns=columns, filter=row_filter)
+
+    return (batch.to_pandas() for batch in batches), where
+
+def where_to_arrow(where):
+    '''
+    Translate a simple filter expression (comparisons between columns and constants, `isin`,
+    `in`, boolean columns, combined with &, |, ~, and, or, not) into a pyarrow expression.
+
+    Parameters
+    ----------
+    where : str
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    expression : pyarrow.dataset.Expression or None
+        filter expression (None if the expression cannot be translated)
+
+    '''
+    try:
+        tree = ast.parse(_replace_booleans(where.strip()), mode='eval')
+        return _to_arrow(tree.body)
+    except (SyntaxError, ValueError, TypeError, tokenize.TokenError):
+        return None
+
+def split_where(where):
+    '''
+    Split a filter expression into the conjuncts (terms combined with & or and) that can be
+    translated into a pyarrow expression and the remaining ones. Filtering with both parts
+    gives the same rows as the whole expression.
+
+    Parameters
+    ----------
+    where : str
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    expression : pyarrow.dataset.Expression or None
+        filter expression of the translated conjuncts (None if no conjunct can be translated)
+    where : str or None
+        quoted expression of the remaining conjuncts (None if all conjuncts are translated)
+
+    '''
+    import pyarrow.dataset as ds
+
+    try:
+        tree = ast.parse(_replace_booleans(where.strip()), mode='eval')
+    except (SyntaxError, tokenize.TokenError):
+        return None, where
+
+    body = tree.body
+    conjuncts = body.values if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.And) else [body]
+    expression = None
+    remaining = []
+    for node in conjuncts:
+        try:
+            term = _to_arrow(node)
+        except (ValueError, TypeError):
+            term = None
+        if isinstance(term, ds.Expression):
+            expression = term if expression is None else expression & term
+        else:
+            remaining.append(node)
+
+    if len(remaining) == 0:
+        return expression, None
+    if len(remaining) == len(conjuncts):
+        return None, where
+    if len(remaining) == 1:
+        return expression, ast.unparse(remaining[0])
+    return expression, ' & '.join('({})'.format(ast.unparse(n)) for n in remaining)
+
+def _replace_booleans(where):
+    # replace & and | with `and` and `or`, so that the expression is parsed with the
+    # operator precedence of pandas (eg `a > 1 & b < 2` is `(a > 1) & (b < 2)`)
+    tokens = tokenize.generate_tokens(io.StringIO(where).readline)
+    return tokenize.untokenize((tokenize.NAME, BOOLEAN_OPERATORS[t.string])
+                               if (t.type == tokenize.OP) and (t.string in BOOLEAN_OPERATORS)
+                               else (t.type, t.string) for t in tokens)
+
+def _to_arrow(node):
+    # recursively translate an ast node into a pyarrow expression
+    import pyarrow.dataset as ds
+
+    if isinstance(node, ast.Name):
+        return ds.field(node.id)
+
+    elif isinstance(node, ast.Constant):
+        return node.value
+
+    elif isinstance(node, (ast.List, ast.Tuple)):
+        return [_constant(n) for n in node.elts]
+
+    elif isinstance(node, ast.BoolOp):
+        values = [_to_arrow(n) for n in node.values]
+        out = values[0]
+        for v in values[1:]:
+            out = (out & v) if isinstance(node.op, ast.And) else (out | v)
+        return out
+
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)):
+        return ~_to_arrow(node.operand)
+
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_constant(node.operand)
+
+    elif isinstance(node, ast.Compare):
+        out = None
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                cmp = _to_arrow(left).isin(_to_arrow(right))
+                cmp = ~cmp if isinstance(op, ast.NotIn) else cmp
+            elif type(op) in COMPARISON_OPERATORS:
+                cmp = COMPARISON_OPERATORS[type(op)](_to_arrow(left), _to_arrow(right))
+            else:
+                raise ValueError('unsupported comparison')
+            out = cmp if out is None else out & cmp
+            left = right
+        return out
+
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+            and node.func.attr == 'isin' and len(node.args) == 1:
+        return _to_arrow(node.func.value).isin(_to_arrow(node.args[0]))
+
+    raise ValueError('unsupported expression')
+
+def _constant(node):
+    # value of a constant node
+    value = _to_arrow(node)
+    if not isinstance(value, (int, float, str, bool, list)):
+        raise ValueError('unsupported constant')
+    return value
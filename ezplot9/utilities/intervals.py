@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+
+from scipy import stats
+
+from .kernels import encode_groups
+from .bootstrap import CI_COLUMNS, group_bootstrap
+from .agg_data import bootstrapping_aggregation
+
+import logging
+log = logging.getLogger(__name__)
+
+CI_METHODS = ['bootstrap', 'analytic', 'auto']
+
+# minimum sample size of the groups using analytic intervals when method is 'auto'
+MIN_ANALYTIC_SAMPLE_SIZE = 100
+
+def analytic_intervals(values,
+                       ids,
+                       n_groups,
+                       stat='mean',
+                       alpha=0.05):
+    '''
+    Closed form confidence intervals of a statistic for each group: Wilson score intervals for
+    groups of binary values (0/1) and t intervals otherwise (intervals of sums are the intervals
+    of the means multiplied by the sample size). Missing values are ignored.
+
+    Parameters
+    ----------
+    values : np.array
+        values
+    ids : np.array
+        group code of each value (values with negative codes are ignored)
+    n_groups : int
+        number of groups
+    stat : str
+        'mean' or 'sum'
+    alpha : float
+        alpha value of the confidence interval (eg 0.05 for 95% intervals)
+
+    Returns
+    -------
+    results : dict
+        arrays with sample_size, num_iterations (always 0), center, low, high and successful
+        of each group
+
+    '''
+
+    if stat not in ['mean', 'sum']:
+        log.error('{} is not supported by analytic intervals'.format(stat))
+        raise ValueError('{} is not supported by analytic intervals'.format(stat))
+
+    values = np.asarray(values, dtype=float)
+    keep = (ids >= 0) & ~np.isnan(values)
+    ids = ids[keep]
+    values = values[keep]
+
+    n = np.bincount(ids, minlength=n_groups)
+    non_binary = np.bincount(ids, weights=(values != 0) & (values != 1), minlength=n_groups)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(ids, weights=values, minlength=n_groups) / n
+        ss = np.bincount(ids, weights=(values - mean[ids])**2, minlength=n_groups)
+
+        # t intervals
+        half_width = stats.t.ppf(1 - alpha / 2., n - 1) * np.sqrt(ss / (n - 1) / n)
+        low, high = mean - half_width, mean + half_width
+
+        # wilson intervals
+        z = stats.norm.ppf(1 - alpha / 2.)
+        denominator = 1 + z**2 / n
+        wilson_center = (mean + z**2 / (2 * n)) / denominator
+        wilson_half_width = z * np.sqrt(mean * (1 - mean) / n + z**2 / (4 * n**2)) / denominator
+        binary = (non_binary == 0) & (n > 0)
+        low[binary] = (wilson_center - wilson_half_width)[binary]
+        high[binary] = (wilson_center + wilson_half_width)[binary]
+
+    center = mean
+    if stat == 'sum':
+        center, low, high = center * n, low * n, high * n
+
+    return {'sample_size': n,
+            'num_iterations': np.zeros(n_groups, dtype=int),
+            'center': center,
+            'low': low,
+            'high': high,
+            'successful': np.where(np.isnan(low) | np.isnan(high),
+                                   np.nan,
+                                   (np.sign(low) == np.sign(high)) * np.sign(center))}
+
+def bootstrapped_intervals(values,
+                           ids,
+                           n_groups,
+                           stat,
+                           num_iterations=10_000,
+                           tolerance=None,
+                           **kwargs):
+    '''
+    Bootstrap any statistic group by group with bootstrapped.bootstrap (see
+    bootstrapping_aggregation). Missing values are ignored.
+
+    Parameters
+    ----------
+    values : np.array
+        values to be bootstrapped
+    ids : np.array
+        group code of each value (values with negative codes are ignored)
+    n_groups : int
+        number of groups
+    stat : fun
+        statistic to be bootstrapped (eg bs_stats.median)
+    num_iterations : int
+        (maximum) number of bootstrap iterations
+    tolerance : float or None
+        tolerance of the adaptive bootstrap (see bootstrapping_aggregation)
+    **kwargs : kwargs
+        additional kwargs for bootstrapped.bootstrap (eg alpha)
+
+    Returns
+    -------
+    results : dict
+        arrays with sample_size, num_iterations, center, low, high and successful of each group
+
+    '''
+
+    keep = (ids >= 0) & ~np.isnan(values)
+    order = np.argsort(ids[keep], kind='stable')
+    sizes = np.bincount(ids[keep], minlength=n_groups)
+    group_values = np.split(values[keep][order], np.cumsum(sizes)[:-1])
+
+    results = {'sample_size': sizes,
+               'num_iterations': np.full(n_groups, num_iterations),
+               'center': np.full(n_groups, np.nan),
+               'low': np.full(n_groups, np.nan),
+               'high': np.full(n_groups, np.nan),
+               'successful': np.full(n_groups, np.nan)}
+    for i in np.flatnonzero(sizes):
+        out_dict = bootstrapping_aggregation(pd.Series(group_values[i]), stat, num_iterations,
+                                             tolerance, **kwargs)
+        for c in CI_COLUMNS[1:]:
+            results[c][i] = out_dict[c]
+
+    return results
+
+def compute_intervals(values,
+                      ids,
+                      n_groups,
+                      stat='mean',
+                      method='bootstrap',
+                      num_iterations=10_000,
+                      alpha=0.05,
+                      seed=None,
+                      min_analytic_size=MIN_ANALYTIC_SAMPLE_SIZE,
+                      **kwargs):
+    '''
+    Confidence intervals of a statistic for each group of integer group codes (see
+    group_intervals)
+
+    Parameters
+    ----------
+    values : np.array
+        values
+    ids : np.array
+        group code of each value (values with negative codes are ignored)
+    n_groups : int
+        number of groups
+    stat : str or fun
+        'mean' or 'sum', or any statistic bootstrapped group by group
+    method : str
+        'bootstrap', 'analytic' or 'auto'
+    num_iterations : int
+        number of bootstrap iterations
+    alpha : float
+        alpha value of the confidence interval (eg 0.05 for 95% intervals)
+    seed : int, np.random.Generator or None
+        seed of the random number generator
+    min_analytic_size : int
+        minimum sample size of the groups using analytic intervals when method is 'auto'
+    **kwargs : kwargs
+        additional kwargs for group_bootstrap or bootstrapped.bootstrap (eg is_pivotal)
+
+    Returns
+    -------
+    results : dict
+        arrays with sample_size, num_iterations, center, low, high and successful of each group
+
+    '''
+
+    if method not in CI_METHODS:
+        log.error('method should be one of {}'.format(CI_METHODS))
+        raise ValueError('method should be one of {}'.format(CI_METHODS))
+
+    values = np.asarray(values, dtype=float)
+
+    if not isinstance(stat, str):
+        if method != 'bootstrap':
+            log.error('analytic intervals are only available for means and sums')
+            raise ValueError('analytic intervals are only available for means and sums')
+        results = bootstrapped_intervals(values, ids, n_groups, stat, num_iterations,
+                                         alpha=alpha, **kwargs)
+    elif method == 'bootstrap':
+        results = group_bootstrap(values, ids, n_groups, stat, num_iterations,
+                                  alpha=alpha, seed=seed, **kwargs)
+    else:
+        results = analytic_intervals(values, ids, n_groups, stat, alpha)
+
+    if method == 'auto':
+        # bootstrap the small groups only
+        small = results['sample_size'] < min_analytic_size
+        if small.any():
+            small_ids = np.where(small[np.maximum(ids, 0)] & (ids >= 0), ids, -1)
+            bootstrap_results = group_bootstrap(values, small_ids, n_groups, stat, num_iterations,
+                                                alpha=alpha, seed=seed, **kwargs)
+            for c in CI_COLUMNS:
+                results[c] = np.where(small, bootstrap_results[c], results[c])
+
+    return results
+
+def group_intervals(df,
+                    group_cols,
+                    value_col,
+                    stat='mean',
+                    method='bootstrap',
+                    num_iterations=10_000,
+                    alpha=0.05,
+                    seed=None,
+                    min_analytic_size=MIN_ANALYTIC_SAMPLE_SIZE,
+                    **kwargs):
+    '''
+    Confidence intervals of a statistic of a column for each group of a dataframe
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+    value_col : str
+        column used to compute the intervals
+    stat : str or fun
+        'mean' or 'sum'. Other statistics (eg bs_stats.median) are bootstrapped group by
+        group with bootstrapped.bootstrap (only with method 'bootstrap')
+    method : str
+        choose between 'bootstrap' (see group_bootstrap), 'analytic' (see analytic_intervals)
+        or 'auto' (analytic intervals for groups with at least min_analytic_size values,
+        bootstrap intervals otherwise)
+    num_iterations : int
+        number of bootstrap iterations
+    alpha : float
+        alpha value of the confidence interval (eg 0.05 for 95% intervals)
+    seed : int, np.random.Generator or None
+        seed of the random number generator
+    min_analytic_size : int
+        minimum sample size of the groups using analytic intervals when method is 'auto'
+    **kwargs : kwargs
+        additional kwargs for group_bootstrap or bootstrapped.bootstrap (eg is_pivotal)
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        group columns and sample_size, num_iterations, center, low, high and successful columns
+
+    '''
+
+    ids, out_df = encode_groups(df, group_cols)
+    results = compute_intervals(df[value_col].to_numpy(dtype=float), ids, len(out_df), stat, method,
+                                num_iterations, alpha, seed, min_analytic_size, **kwargs)
+
+    for c in CI_COLUMNS:
+        out_df[c] = results[c]
+
+    return out_df
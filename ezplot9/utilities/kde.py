@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+from .kernels import encode_groups
+
+import logging
+log = logging.getLogger(__name__)
+
+# number of points of the density grid
+GRID_SIZE = 1024
+
+# keyword arguments of plotnine's stat_density supported by the binned kernel density
+KDE_KWARGS = ['kernel', 'bw', 'adjust', 'n']
+
+def supports_kde(stat_kwargs):
+    '''
+    Check if a density can be computed by group_kde instead of plotnine's stat_density
+    (gaussian kernel and only the bw, adjust and n parameters)
+
+    Parameters
+    ----------
+    stat_kwargs : dict
+        keyword arguments for stat_density
+
+    Returns
+    -------
+    flag : bool
+
+    '''
+    return all(k in KDE_KWARGS for k in stat_kwargs) \
+        and stat_kwargs.get('kernel', 'gaussian') in ['gaussian', 'gau'] \
+        and (isinstance(stat_kwargs.get('bw', 'nrd0'), (int, float)) or stat_kwargs.get('bw', 'nrd0') == 'nrd0')
+
+def group_nrd0(values, ids, n_groups):
+    '''
+    Bandwidth of each group with R's bw.nrd0 rule (as plotnine's nrd0): 0.9 times the minimum
+    between standard deviation and interquartile range / 1.349, times n^(-1/5)
+
+    Parameters
+    ----------
+    values : np.array
+        values (without missing values)
+    ids : np.array
+        group code of each value
+    n_groups : int
+        number of groups
+
+    Returns
+    -------
+    bw : np.array
+        bandwidth of each group (NaN for groups with less than 2 values)
+
+    '''
+    order = np.lexsort((values, ids))
+    sorted_values = values[order]
+    sizes = np.bincount(ids, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(ids, weights=values, minlength=n_groups) / sizes
+        std = np.sqrt(np.bincount(ids, weights=(values - mean[ids])**2, minlength=n_groups) / (sizes - 1))
+
+    # interquartile range (linear interpolation, as in np.percentile)
+    quartiles = []
+    observed = sizes > 0
+    for q in [0.25, 0.75]:
+        virtual = (sizes[observed] - 1) * q
+        previous = np.floor(virtual).astype(np.int64)
+        following = np.minimum(previous + 1, sizes[observed] - 1)
+        a = sorted_values[starts[observed] + previous]
+        b = sorted_values[starts[observed] + following]
+        quartile = np.full(n_groups, np.nan)
+        quartile[observed] = a + (b - a) * (virtual - previous)
+        quartiles.append(quartile)
+    std_estimate = (quartiles[1] - quartiles[0]) / 1.349
+
+    # first value of each group
+    first = np.zeros(n_groups)
+    rows = np.arange(len(values))[::-1]
+    first[ids[rows]] = values[rows]
+
+    low_std = np.fmin(std, std_estimate)
+    fallback = np.where(std_estimate != 0, std_estimate, np.where(first != 0, np.abs(first), 1))
+    low_std = np.where(low_std == 0, fallback, low_std)
+
+    return np.where(sizes > 1, 0.9 * low_std * sizes ** -0.2, np.nan)
+
+def group_kde(values,
+              ids,
+              n_groups,
+              grid,
+              weights=None,
+              bw='nrd0',
+              adjust=1):
+    '''
+    Gaussian kernel density of each group on an equally spaced grid. Values are linearly
+    binned on the grid and the binned weights of all groups are convolved with their kernels
+    at once with a zero-padded FFT, so that the cost is O(n + groups * grid * log(grid)).
+    Values outside the grid are ignored.
+
+    Parameters
+    ----------
+    values : np.array
+        values
+    ids : np.array
+        group code of each value (values with negative codes or missing values are ignored)
+    n_groups : int
+        number of groups
+    grid : np.array
+        equally spaced points where the densities are evaluated
+    weights : np.array or None
+        weight of each value (densities integrate to 1 whatever the weights)
+    bw : str or float
+        bandwidth ('nrd0' computes the bandwidth of each group, see group_nrd0)
+    adjust : float
+        multiplicative adjustment of the bandwidth
+
+    Returns
+    -------
+    density : np.array
+        density of each group (one row for each group)
+    sizes : np.array
+        number of values of each group
+    bandwidths : np.array
+        bandwidth of each group (NaN if it cannot be computed)
+
+    '''
+
+    values = np.asarray(values, dtype=float)
+    weights = np.ones(len(values)) if weights is None else np.nan_to_num(np.asarray(weights, dtype=float))
+    keep = (ids >= 0) & ~np.isnan(values)
+    values, ids, weights = values[keep], ids[keep], weights[keep]
+    sizes = np.bincount(ids, minlength=n_groups)
+
+    if isinstance(bw, str):
+        bandwidths = group_nrd0(values, ids, n_groups) * adjust
+    else:
+        bandwidths = np.where(sizes > 0, bw * adjust, np.nan)
+
+    # linear binning
+    n = len(grid)
+    dx = (grid[-1] - grid[0]) / (n - 1) if n > 1 else 0
+    position = (values - grid[0]) / (dx if dx > 0 else 1)
+    inside = (position >= 0) & (position <= n - 1)
+    position, ids, weights = position[inside], ids[inside], weights[inside]
+    left = np.minimum(np.floor(position).astype(np.int64), max(n - 2, 0))
+    fraction = position - left
+    binned = np.bincount(ids * n + left, weights=weights * (1 - fraction), minlength=n_groups * n)
+    if n > 1:
+        binned += np.bincount(ids * n + left + 1, weights=weights * fraction, minlength=n_groups * n)
+    binned = binned.reshape(n_groups, n)
+    totals = binned.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        binned /= totals[:, None]
+
+    # gaussian kernels sampled at the grid offsets (negative offsets wrap around)
+    size = 1 << int(np.ceil(np.log2(max(2 * n, 2))))
+    offsets = np.arange(size)
+    offsets = np.where(offsets < n, offsets, np.where(offsets > size - n, offsets - size, np.nan)) * dx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = offsets[None, :] / bandwidths[:, None]
+        kernels = np.nan_to_num(np.exp(-0.5 * z**2) / (np.sqrt(2 * np.pi) * bandwidths[:, None]))
+
+    density = np.fft.irfft(np.fft.rfft(np.nan_to_num(binned), size) * np.fft.rfft(kernels, size), size)[:, :n]
+    density = np.maximum(density, 0)
+    density[np.isnan(bandwidths) | (totals == 0)] = np.nan
+
+    return density, sizes, bandwidths
+
+def kde_data(df,
+             group_cols,
+             value_col,
+             weight_col=None,
+             n=GRID_SIZE,
+             bw='nrd0',
+             adjust=1,
+             kernel='gaussian'):
+    '''
+    Kernel densities of a column for each group of a dataframe, evaluated on n points
+    spanning the range of the column (as plotnine's stat_density with trim=False). Groups
+    whose density cannot be computed (eg less than 2 values with bw='nrd0') are dropped.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+    value_col : str
+        column whose density is computed
+    weight_col : str or None
+        column with the weight of each row
+    n : int
+        number of grid points
+    bw : str or float
+        bandwidth ('nrd0' or a number)
+    adjust : float
+        multiplicative adjustment of the bandwidth
+    kernel : str
+        only 'gaussian' is supported
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        group columns, value column (grid points), density and count (density times the
+        number of values) columns
+
+    '''
+
+    if kernel not in ['gaussian', 'gau']:
+        log.error('only gaussian kernels are supported')
+        raise ValueError('only gaussian kernels are supported')
+
+    values = df[value_col].to_numpy(dtype=float)
+    if len(group_cols) > 0:
+        ids, keys = encode_groups(df, group_cols)
+    else:
+        ids, keys = np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=pd.RangeIndex(1))
+
+    if np.isnan(values).all():
+        grid = np.array([])
+    else:
+        grid = np.linspace(np.nanmin(values), np.nanmax(values), n)
+    weights = None if weight_col is None else df[weight_col].to_numpy(dtype=float)
+    density, sizes, _ = group_kde(values, ids, len(keys), grid, weights, bw, adjust)
+
+    valid = ~np.isnan(density).any(axis=1) if len(grid) > 0 else np.zeros(len(keys), dtype=bool)
+    if (~valid & (sizes > 0)).any():
+        log.warning('Groups with fewer than 2 data points have been removed.')
+    rows = np.repeat(np.flatnonzero(valid), len(grid))
+
+    out_df = keys.iloc[rows].reset_index(drop=True)
+    out_df[value_col] = np.tile(grid, valid.sum())
+    out_df['density'] = density[valid].ravel()
+    out_df['count'] = out_df['density'] * sizes[rows]
+
+    return out_df
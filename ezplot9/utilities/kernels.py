@@ -0,0 +1,388 @@
+import numpy as np
+import pandas as pd
+
+from pandas.api.types import is_categorical_dtype
+
+import logging
+log = logging.getLogger(__name__)
+
+# partial statistics needed by each decomposable aggregation function
+DECOMPOSABLE_AGGFUNS = {'sum': ['sum'],
+                        'mean': ['sum', 'count'],
+                        'count': ['count'],
+                        'min': ['min'],
+                        'max': ['max']}
+
+# aggregation used to merge each partial statistic
+PARTIAL_MERGE_FUNS = {'sum': 'sum',
+                      'count': 'sum',
+                      'min': 'min',
+                      'max': 'max'}
+
+PARTIAL_COLUMN = '{}__{}'
+
+def is_decomposable(aggfun):
+    '''
+    Check if an aggregation function can be computed from partial aggregates
+
+    Parameters
+    ----------
+    aggfun : str or fun
+        aggregation function
+
+    Returns
+    -------
+    flag : bool
+
+    '''
+    return isinstance(aggfun, str) and aggfun in DECOMPOSABLE_AGGFUNS
+
+def supports_kernels(df, group_cols, value_cols, aggfun):
+    '''
+    Check if the aggregation can be computed with the group kernels (decomposable aggregation
+    function, non categorical groups and numeric values)
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+    value_cols : list
+        columns to be aggregated
+    aggfun : str or fun
+        aggregation function
+
+    Returns
+    -------
+    flag : bool
+
+    '''
+    return is_decomposable(aggfun) \
+        and len(group_cols) > 0 \
+        and not any(is_categorical_dtype(df[c].dtype) for c in group_cols) \
+        and all(df[c].dtype.kind in 'iuf' for c in value_cols)
+
+def encode_groups(df, group_cols):
+    '''
+    Dictionary-encode the group columns of a dataframe into a single integer code per row.
+    Codes follow the lexicographic order of the group values (as in DataFrame.groupby) and
+    rows with missing group values get a code of -1.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+
+    Returns
+    -------
+    ids : np.array
+        group code of each row
+    keys : pd.DataFrame
+        group values for each code (with the dtype of the unique values of each column)
+
+    '''
+
+    n = len(df)
+    combined = np.zeros(n, dtype=np.int64)
+    valid = np.ones(n, dtype=bool)
+    cardinality = 1
+    col_codes = []
+    col_uniques = []
+
+    for c in group_cols:
+        codes, uniques = pd.factorize(df[c], sort=True)
+        valid &= codes >= 0
+        col_codes.append(codes)
+        col_uniques.append(uniques)
+
+        # combine with the previous columns (compacting if the codes get too large)
+        if cardinality * max(len(uniques), 1) >= 2**31:
+            combined, combined_uniques = pd.factorize(combined, sort=True)
+            cardinality = len(combined_uniques)
+        combined = combined * max(len(uniques), 1) + codes
+        cardinality *= max(len(uniques), 1)
+
+    ids = np.full(n, -1, dtype=np.int64)
+    ids[valid], _ = pd.factorize(combined[valid], sort=True)
+    n_groups = ids.max() + 1 if n > 0 else 0
+
+    # first row of each group
+    first = np.zeros(n_groups, dtype=np.int64)
+    rows = np.flatnonzero(valid)[::-1]
+    first[ids[rows]] = rows
+
+    keys = pd.DataFrame(index=pd.RangeIndex(n_groups))
+    for c, codes, uniques in zip(group_cols, col_codes, col_uniques):
+        keys[c] = uniques.take(codes[first])
+
+    return ids, keys
+
+def group_reduce(values, ids, n_groups, stat):
+    '''
+    Compute a statistic of values for each group code (missing values are ignored).
+
+    Parameters
+    ----------
+    values : np.array
+        values to be aggregated
+    ids : np.array
+        group code of each value (values with negative codes are ignored)
+    n_groups : int
+        number of groups
+    stat : str
+        one between 'sum', 'count', 'min' or 'max'
+
+    Returns
+    -------
+    out : np.array
+        statistic for each group (NaN for min and max of empty groups)
+
+    '''
+
+    keep = ids >= 0
+    if values.dtype.kind == 'f':
+        keep &= ~np.isnan(values)
+    ids = ids[keep]
+    values = values[keep]
+
+    if stat == 'count':
+        return np.bincount(ids, minlength=n_groups)
+    elif stat == 'sum':
+        out = np.bincount(ids, weights=values, minlength=n_groups)
+        if values.dtype.kind in 'iu':
+            out = np.rint(out).astype(values.dtype)
+        return out
+    elif stat in ['min', 'max']:
+        order = np.argsort(ids, kind='stable')
+        sorted_ids = ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]) if len(ids) > 0 else []
+        ufunc = np.minimum if stat == 'min' else np.maximum
+        out = np.full(n_groups, np.nan)
+        if len(starts) > 0:
+            reduced = ufunc.reduceat(values[order], starts)
+            if (values.dtype.kind in 'iu') and (len(starts) == n_groups):
+                return reduced
+            out[sorted_ids[starts]] = reduced
+        return out
+    else:
+        log.error('{} is not a supported statistic'.format(stat))
+        raise ValueError('{} is not a supported statistic'.format(stat))
+
+def group_partials(df, group_cols, value_cols, aggfun):
+    '''
+    Compute the partial aggregates of value columns for each group, ie the statistics needed
+    to compute (or merge) a decomposable aggregation.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+    value_cols : list
+        columns to be aggregated
+    aggfun : str
+        decomposable aggregation function
+
+    Returns
+    -------
+    partial_df : pd.DataFrame
+        group columns and partial aggregates (one column for each variable and statistic)
+
+    '''
+
+    ids, partial_df = encode_groups(df, group_cols)
+    for c in value_cols:
+        values = df[c].to_numpy()
+        for stat in DECOMPOSABLE_AGGFUNS[aggfun]:
+            partial_df[PARTIAL_COLUMN.format(c, stat)] = group_reduce(values, ids, len(partial_df), stat)
+
+    return partial_df
+
+def merge_partials(partial_dfs, group_cols, value_cols, aggfun):
+    '''
+    Merge partial aggregates computed on different parts of the data.
+
+    Parameters
+    ----------
+    partial_dfs : list of pd.DataFrame
+        partial aggregates, as returned by group_partials
+    group_cols : list
+        group columns
+    value_cols : list
+        aggregated columns
+    aggfun : str
+        decomposable aggregation function
+
+    Returns
+    -------
+    partial_df : pd.DataFrame
+        merged partial aggregates
+
+    '''
+
+    partial_df = pd.concat(partial_dfs, ignore_index=True)
+    for c in group_cols:
+        if is_categorical_dtype(partial_df[c].dtype):
+            partial_df[c] = partial_df[c].astype(object)
+
+    ids, merged_df = encode_groups(partial_df, group_cols)
+    for c in value_cols:
+        for stat in DECOMPOSABLE_AGGFUNS[aggfun]:
+            col = PARTIAL_COLUMN.format(c, stat)
+            merged_df[col] = group_reduce(partial_df[col].to_numpy(), ids, len(merged_df),
+                                          PARTIAL_MERGE_FUNS[stat])
+
+    return merged_df
+
+def finalize_partials(partial_df, group_cols, value_cols, aggfun):
+    '''
+    Compute the aggregated values from partial aggregates.
+
+    Parameters
+    ----------
+    partial_df : pd.DataFrame
+        partial aggregates, as returned by group_partials or merge_partials
+    group_cols : list
+        group columns
+    value_cols : list
+        aggregated columns
+    aggfun : str
+        decomposable aggregation function
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        group columns and aggregated values
+
+    '''
+
+    out_df = partial_df[group_cols].copy()
+    for c in value_cols:
+        if aggfun == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out_df[c] = partial_df[PARTIAL_COLUMN.format(c, 'sum')] \
+                            / partial_df[PARTIAL_COLUMN.format(c, 'count')]
+        else:
+            out_df[c] = partial_df[PARTIAL_COLUMN.format(c, aggfun)]
+
+    return out_df
+
+def group_aggregate(df, group_cols, value_cols, aggfun):
+    '''
+    Aggregate value columns for each group using the group kernels (equivalent to
+    `df.groupby(group_cols)[value_cols].agg(aggfun).reset_index()`).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+    value_cols : list
+        columns to be aggregated
+    aggfun : str
+        decomposable aggregation function
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        group columns and aggregated values
+
+    '''
+
+    partial_df = group_partials(df, group_cols, value_cols, aggfun)
+
+    return finalize_partials(partial_df, group_cols, value_cols, aggfun)
+
+def group_histogram(df,
+                    group_cols,
+                    weight_col=None,
+                    normalize_cols=None,
+                    sparse=False,
+                    max_rows=None):
+    '''
+    Weighted counts of the combinations of the group columns (eg bin codes and groups), in a
+    single pass with np.bincount on the combined group codes. The dense output has one row for
+    every combination of the observed values of each column (as agg_data with
+    fill_groups=True, with zero weights for empty combinations), the sparse output only has
+    the observed combinations. Rows with missing group values are ignored.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    group_cols : list
+        group columns
+    weight_col : str or None
+        column with the weight of each row (missing weights count as 0). Rows are counted
+        if None
+    normalize_cols : list or None
+        group columns within which the weights are normalized to sum to 1 ([] normalizes over
+        all rows, None does not normalize)
+    sparse : bool
+        only return the observed combinations
+    max_rows : int or None
+        maximum number of rows allowed in the dense output
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        group columns and weight column ('w' if weight_col is None)
+
+    '''
+
+    # code and observed values of each column
+    col_codes = []
+    col_uniques = []
+    valid = np.ones(len(df), dtype=bool)
+    for c in group_cols:
+        codes, uniques = pd.factorize(df[c], sort=True)
+        valid &= codes >= 0
+        col_codes.append(codes)
+        col_uniques.append(uniques)
+    shape = tuple(max(len(u), 1) for u in col_uniques)
+    n_cells = int(np.prod(shape, dtype=float))
+
+    if (not sparse) and (max_rows is not None) and (n_cells > max_rows):
+        log.error('Filling the groups would create {} rows (max_fill_rows is {})'.format(n_cells, max_rows))
+        raise ValueError('Filling the groups would create {} rows (max_fill_rows is {})'.format(n_cells, max_rows))
+
+    # cell of each row
+    cells = np.ravel_multi_index([codes[valid] for codes in col_codes], shape) if group_cols \
+        else np.zeros(valid.sum(), dtype=np.int64)
+    if weight_col is None:
+        weights = np.ones(len(cells))
+    else:
+        weights = np.nan_to_num(df[weight_col].to_numpy(dtype=float)[valid])
+    if sparse:
+        cells, cell_ids = np.unique(cells, return_inverse=True)
+        counts = np.bincount(cell_ids, weights=weights, minlength=len(cells))
+    else:
+        counts = np.bincount(cells, weights=weights, minlength=n_cells)
+        cells = np.arange(n_cells) if len(cells) > 0 else np.arange(0)
+        counts = counts[:len(cells)]
+
+    # group values of each cell
+    out_df = pd.DataFrame(index=pd.RangeIndex(len(cells)))
+    cell_codes = np.unravel_index(cells, shape)
+    for c, codes, uniques in zip(group_cols, cell_codes, col_uniques):
+        out_df[c] = uniques.take(codes)
+
+    # normalize within each combination of the normalize columns
+    if normalize_cols is not None:
+        if len(normalize_cols) > 0:
+            scope_shape = tuple(shape[group_cols.index(c)] for c in normalize_cols)
+            scopes = np.ravel_multi_index([cell_codes[group_cols.index(c)] for c in normalize_cols], scope_shape)
+        else:
+            scopes = np.zeros(len(cells), dtype=np.int64)
+        totals = np.bincount(scopes, weights=counts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            counts = counts / totals[scopes]
+
+    out_df['w' if weight_col is None else weight_col] = counts
+
+    return out_df
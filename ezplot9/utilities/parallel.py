@@ -0,0 +1,127 @@
+import os
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import logging
+log = logging.getLogger(__name__)
+
+MIN_ROWS_PER_JOB = 100_000
+
+def get_n_jobs(n_jobs):
+    '''
+    Get the number of jobs to be used (-1 means all the available cores)
+
+    Parameters
+    ----------
+    n_jobs : int or None
+        requested number of jobs
+
+    Returns
+    -------
+    n_jobs : int
+        number of jobs
+
+    '''
+    if n_jobs is None:
+        return 1
+    elif n_jobs < 0:
+        return max(os.cpu_count() + 1 + n_jobs, 1)
+    else:
+        return max(n_jobs, 1)
+
+def parallel_partials(df,
+                      variables,
+                      groups,
+                      aggfun,
+                      columns=None,
+                      n_jobs=-1,
+                      executor=None,
+                      where=None):
+    '''
+    Evaluate and partially aggregate a dataframe in worker processes. The dataframe is split
+    by rows and numeric columns are passed to the workers through shared memory (other
+    columns and the index are pickled).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    variables : dict
+        variables dictionary (name:expr), as returned by get_groups
+    groups : dict
+        groups dictionary (name:expr), as returned by get_groups
+    aggfun : str
+        decomposable or sketchable aggregation function
+    columns : list or None
+        columns of df referenced by variables and groups (all columns are used if None)
+    n_jobs : int
+        number of worker processes (-1 means all the available cores)
+    executor : concurrent.futures.Executor or None
+        executor used to run the workers (a ProcessPoolExecutor is created if None)
+    where : str or None
+        quoted expression used to filter the rows
+
+    Returns
+    -------
+    partial_dfs : list of pd.DataFrame
+        partial aggregates (or sketches) of each partition
+
+    '''
+
+    n_jobs = get_n_jobs(n_jobs)
+    columns = list(df.columns) if columns is None else columns
+    shared_cols = [c for c in columns if df[c].dtype.kind in 'iufb' and isinstance(df[c].dtype, np.dtype)]
+    pickled_cols = [c for c in columns if c not in shared_cols]
+
+    # copy numeric columns to shared memory
+    blocks = {}
+    try:
+        specs = []
+        for c in shared_cols:
+            values = df[c].to_numpy()
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            blocks[c] = block
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            specs.append((c, block.name, values.dtype.str, values.shape))
+
+        bounds = np.linspace(0, len(df), n_jobs + 1).astype(int)
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=n_jobs)
+        try:
+            futures = [executor.submit(_partials_worker,
+                                       specs,
+                                       df.iloc[start:stop][pickled_cols],
+                                       start,
+                                       stop,
+                                       variables,
+                                       groups,
+                                       aggfun,
+                                       where)
+                       for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+            partial_dfs = [f.result() for f in futures]
+        finally:
+            if own_executor:
+                executor.shutdown()
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+    return partial_dfs
+
+def _partials_worker(specs, pickled_df, start, stop, variables, groups, aggfun, where):
+    # rebuild a partition from shared memory and compute its partial aggregates
+    from .agg_data import eval_partials
+
+    df = pickled_df.copy()
+    for c, name, dtype, shape in specs:
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            df[c] = np.array(np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)[start:stop])
+        finally:
+            block.close()
+
+    return eval_partials(df, variables, groups, aggfun, where)
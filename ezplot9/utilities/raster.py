@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+from .kernels import encode_groups
+from .binning import Bins
+from .themes import EZ_DPI
+
+import logging
+log = logging.getLogger(__name__)
+
+def raster_shape(figure_size,
+                 n_cols=1,
+                 n_rows=1,
+                 dpi=EZ_DPI):
+    '''
+    Number of pixels of each panel of a figure (the whole figure is split evenly among the
+    panels)
+
+    Parameters
+    ----------
+    figure_size : tuple
+        figure size (in inches)
+    n_cols : int
+        number of columns of panels
+    n_rows : int
+        number of rows of panels
+    dpi : int
+        resolution of the figure
+
+    Returns
+    -------
+    width : int
+        number of horizontal pixels of each panel
+    height : int
+        number of vertical pixels of each panel
+
+    '''
+    return max(int(figure_size[0] * dpi / n_cols), 1), max(int(figure_size[1] * dpi / n_rows), 1)
+
+def pixel_bins(values, n_pixels):
+    '''
+    Equally spaced bins whose first and last centers are the minimum and maximum of values
+
+    Parameters
+    ----------
+    values : np.array
+        values (without missing values)
+    n_pixels : int
+        number of pixels
+
+    Returns
+    -------
+    bins : Bins
+
+    '''
+    if len(values) == 0:
+        return Bins(-0.5, 1, 1)
+    min_val, max_val = values.min(), values.max()
+    if (n_pixels == 1) or (max_val == min_val):
+        return Bins(min_val - 0.5, 1, 1)
+    return Bins.from_data(values, n_pixels)
+
+def raster_data(df,
+                x_col,
+                y_col,
+                facet_cols=[],
+                group_col=None,
+                width=900,
+                height=450):
+    '''
+    Aggregate the points of a scatter plot on a grid of width x height pixels for each facet
+    (shared by all the facets), counting the points of each pixel and, if a group column is
+    given, finding the most frequent group of each pixel. The cost is O(n) in the number of
+    points, and the output size depends on the number of filled pixels only.
+
+    Only the filled pixels are returned, together with a full row and a full column of empty
+    pixels (with missing count) for each facet, so that geom_raster finds the pixel size of
+    every panel.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    x_col : str
+        numeric column with the horizontal coordinates
+    y_col : str
+        numeric column with the vertical coordinates
+    facet_cols : list
+        facet columns
+    group_col : str or None
+        group column
+    width : int
+        number of horizontal pixels
+    height : int
+        number of vertical pixels
+
+    Returns
+    -------
+    out_df : pd.DataFrame
+        facet columns, x and y (pixel centers), count and group column (most frequent group)
+        of each pixel
+
+    '''
+
+    x = df[x_col].to_numpy(dtype=float)
+    y = df[y_col].to_numpy(dtype=float)
+    if len(facet_cols) > 0:
+        ids, keys = encode_groups(df, facet_cols)
+    else:
+        ids, keys = np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=pd.RangeIndex(1))
+    valid = (ids >= 0) & ~np.isnan(x) & ~np.isnan(y)
+    if group_col is not None:
+        group_ids, group_keys = encode_groups(df, [group_col])
+        valid &= group_ids >= 0
+
+    # pixel of each point (all the facets share the same grid)
+    x_bins = pixel_bins(x[valid], width)
+    y_bins = pixel_bins(y[valid], height)
+    n_x, n_y = x_bins.n_bins, y_bins.n_bins
+    n_pixels = len(keys) * n_y * n_x
+    pixels = (ids[valid] * n_y + y_bins.codes(y[valid])) * n_x + x_bins.codes(x[valid])
+    count = np.bincount(pixels, minlength=n_pixels)
+
+    # filled pixels, and a full row and column of empty pixels for each facet
+    filled = np.flatnonzero(count)
+    facets = np.arange(len(keys))
+    guides = np.r_[(facets[:, None] * n_y * n_x + np.arange(n_x)[None, :]).ravel(),
+                   (facets[:, None] * n_y * n_x + np.arange(n_y)[None, :] * n_x).ravel()]
+    guides = np.setdiff1d(guides, filled)
+    cells = np.r_[filled, guides]
+
+    out_df = keys.iloc[cells // (n_y * n_x)].reset_index(drop=True)
+    out_df['x'] = x_bins.centers[cells % n_x]
+    out_df['y'] = y_bins.centers[cells // n_x % n_y]
+    out_df['count'] = np.r_[count[filled], np.full(len(guides), np.nan)]
+
+    if group_col is not None:
+        # most frequent group of each filled pixel
+        n_groups = len(group_keys)
+        rank = np.zeros(n_pixels, dtype=np.int64)
+        rank[filled] = np.arange(len(filled))
+        group_count = np.bincount(rank[pixels] * n_groups + group_ids[valid], minlength=len(filled) * n_groups)
+        majority = group_count.reshape(len(filled), n_groups).argmax(axis=1)
+        group_values = group_keys[group_col].iloc[np.r_[majority, np.zeros(len(guides), dtype=np.int64)]]
+        out_df[group_col] = group_values.reset_index(drop=True).where(out_df['count'].notnull())
+
+    return out_df
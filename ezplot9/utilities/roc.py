@@ -0,0 +1,513 @@
+import numpy as np
+import pandas as pd
+
+from .kernels import encode_groups
+
+import logging
+log = logging.getLogger(__name__)
+
+# default maximum number of points of each ROC curve
+MAX_ROC_POINTS = 1000
+
+# default number of score bins of the streaming ROC curves
+SCORE_BINS = 1000
+
+def group_roc(target,
+              scores,
+              ids,
+              n_groups,
+              pos_label=1,
+              max_points=MAX_ROC_POINTS):
+    '''
+    ROC curves and AUC of several score columns for each group at once. Rows of all the
+    score columns are sorted with a single lexsort by (column, group, -score), true and false
+    positives are cumulative sums within each curve and one point is kept for each distinct
+    threshold, so that tied scores give diagonal segments (as sklearn's roc_curve). AUC is
+    computed with the trapezoidal rule on all the thresholds, then each curve is decimated to
+    at most max_points points (keeping the first point and the last point of each bucket of
+    (fpr + tpr) / 2, so that the decimated curve is within about 2 / max_points of the full
+    one).
+
+    Parameters
+    ----------
+    target : np.array
+        target of each row
+    scores : np.array
+        scores (one column for each model)
+    ids : np.array
+        group code of each row (rows with negative codes are ignored)
+    n_groups : int
+        number of groups
+    pos_label : int or str
+        label of the positive class
+    max_points : int or None
+        maximum number of points of each curve (all the thresholds are kept if None)
+
+    Returns
+    -------
+    results : dict
+        curve (code of the curve of each point, ie column * n_groups + group), fpr and tpr of
+        each point, and auc, positives and negatives of each curve
+
+    '''
+
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    n_curves = scores.shape[1] * n_groups
+
+    # rows of all the curves (rows with missing scores or groups are ignored)
+    curves = (np.arange(scores.shape[1])[None, :] * n_groups + ids[:, None]).ravel(order='F')
+    values = scores.ravel(order='F')
+    positive = np.tile(np.asarray(target == pos_label), scores.shape[1])
+    keep = (np.tile(ids, scores.shape[1]) >= 0) & ~np.isnan(values)
+    curves, values, positive = curves[keep], values[keep], positive[keep]
+
+    order = np.lexsort((-values, curves))
+    curves, values, positive = curves[order], values[order], positive[order]
+
+    positives = np.bincount(curves, weights=positive, minlength=n_curves)
+    negatives = np.bincount(curves, weights=~positive, minlength=n_curves)
+    starts = np.cumsum(positives + negatives) - positives - negatives
+
+    # cumulative counts at the last row of each threshold
+    tp = np.cumsum(positive)
+    fp = np.cumsum(~positive)
+    last = np.r_[(curves[1:] != curves[:-1]) | (values[1:] != values[:-1]), True] if len(curves) > 0 \
+        else np.zeros(0, dtype=bool)
+    offsets = starts[curves[last]]
+    tp_offset = np.r_[0, tp][offsets.astype(np.int64)]
+    fp_offset = np.r_[0, fp][offsets.astype(np.int64)]
+    point_curves = curves[last]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tpr = (tp[last] - tp_offset) / positives[point_curves]
+        fpr = (fp[last] - fp_offset) / negatives[point_curves]
+
+    # add the origin of each curve
+    observed = np.flatnonzero(positives + negatives > 0)
+    point_curves = np.r_[observed, point_curves]
+    order = np.argsort(point_curves, kind='stable')
+    point_curves = point_curves[order]
+    origin_tpr = np.where(positives[observed] > 0, 0., np.nan)
+    origin_fpr = np.where(negatives[observed] > 0, 0., np.nan)
+    tpr = np.r_[origin_tpr, tpr][order]
+    fpr = np.r_[origin_fpr, fpr][order]
+
+    # trapezoidal auc
+    first = np.r_[True, point_curves[1:] != point_curves[:-1]] if len(point_curves) > 0 \
+        else np.zeros(0, dtype=bool)
+    areas = np.where(first, 0, np.diff(fpr, prepend=0) * (tpr + np.r_[0, tpr[:-1]]) / 2)
+    auc = np.bincount(point_curves, weights=areas, minlength=n_curves)
+    auc[(positives == 0) | (negatives == 0)] = np.nan
+
+    if max_points is not None:
+        point_curves, fpr, tpr = decimate_curves(point_curves, fpr, tpr, max_points)
+
+    return {'curve': point_curves,
+            'fpr': fpr,
+            'tpr': tpr,
+            'auc': auc,
+            'positives': positives.astype(np.int64),
+            'negatives': negatives.astype(np.int64)}
+
+def decimate_curves(curves, fpr, tpr, max_points=MAX_ROC_POINTS):
+    '''
+    Decimate ROC curves to at most max_points points each, keeping the first point of each
+    curve and the last point of each bucket of (fpr + tpr) / 2
+
+    Parameters
+    ----------
+    curves : np.array
+        sorted curve code of each point
+    fpr : np.array
+        false positive rate of each point
+    tpr : np.array
+        true positive rate of each point
+    max_points : int
+        maximum number of points of each curve
+
+    Returns
+    -------
+    curves : np.array
+        curve code of each kept point
+    fpr : np.array
+        false positive rate of each kept point
+    tpr : np.array
+        true positive rate of each kept point
+
+    '''
+    if len(curves) == 0:
+        return curves, fpr, tpr
+    buckets = np.floor(np.nan_to_num((fpr + tpr) / 2) * max(max_points - 2, 1)).astype(np.int64)
+    new_curve = np.r_[True, curves[1:] != curves[:-1]]
+    keep = new_curve | np.r_[new_curve[1:] | (buckets[1:] != buckets[:-1]), True]
+    return curves[keep], fpr[keep], tpr[keep]
+
+def roc_data(df,
+             target_col,
+             score_cols,
+             group_cols=[],
+             pos_label=1,
+             max_points=MAX_ROC_POINTS):
+    '''
+    ROC curves and AUC of several score columns for each group of a dataframe (see group_roc)
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    target_col : str
+        target column
+    score_cols : list
+        score columns (eg the probabilities of different models)
+    group_cols : list
+        group columns
+    pos_label : int or str
+        label of the positive class
+    max_points : int or None
+        maximum number of points of each curve
+
+    Returns
+    -------
+    roc_df : pd.DataFrame
+        variable (score column), group columns, x (false positive rate) and y (true positive
+        rate) of each point
+    auc_df : pd.DataFrame
+        variable, group columns, auc, positives and negatives of each curve
+
+    '''
+
+    if len(group_cols) > 0:
+        ids, keys = encode_groups(df, group_cols)
+    else:
+        ids, keys = np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=pd.RangeIndex(1))
+
+    results = group_roc(df[target_col].to_numpy(),
+                        df[score_cols].to_numpy(dtype=float),
+                        ids,
+                        len(keys),
+                        pos_label,
+                        max_points)
+
+    # curves of the observed groups
+    auc_df = pd.concat([keys] * len(score_cols), ignore_index=True)
+    auc_df.insert(0, 'variable', np.repeat(score_cols, len(keys)))
+    auc_df['auc'] = results['auc']
+    auc_df['positives'] = results['positives']
+    auc_df['negatives'] = results['negatives']
+    auc_df = auc_df[auc_df['positives'] + auc_df['negatives'] > 0]
+
+    roc_df = auc_df.loc[results['curve'], ['variable'] + group_cols].reset_index(drop=True)
+    roc_df['x'] = results['fpr']
+    roc_df['y'] = results['tpr']
+
+    return roc_df, auc_df.reset_index(drop=True)
+
+class ScoreHistogram:
+    '''
+    Mergeable histograms of the scores of positive and negative rows, for each score column
+    and group, at a fixed resolution. Histograms are built chunk by chunk (or on different
+    partitions, then merged) in memory proportional to n_bins times the number of curves,
+    and ROC curves, AUC and calibration bins are derived from them.
+
+    Each ROC point is the exact point at a bin edge threshold, so the true curve between two
+    consecutive points lies in the rectangle they span. Rows within the same bin are treated
+    as ties, so the AUC differs from the exact AUC by at most
+    auc_error = sum_b(positives_b * negatives_b) / (2 * positives * negatives), which is
+    reported with each AUC (and is 0 when there are no mixed bins).
+
+    Scores outside the range are counted in the first or last bin (with a warning), so that
+    the error bound still holds but grows with the number of clipped scores: the range should
+    cover the scores (eg logits are not bounded by 0 and 1). If low and high are None, they
+    are set to the range of the scores of the first update, which is only meant for a single
+    update (chunks and histograms to be merged should use the same explicit range).
+
+    Parameters
+    ----------
+    n_bins : int
+        number of equally spaced score bins
+    low : float or None
+        lower bound of the scores (inferred from the first update if None)
+    high : float or None
+        upper bound of the scores (inferred from the first update if None)
+
+    '''
+
+    def __init__(self, n_bins=SCORE_BINS, low=0., high=1.):
+        if (low is None) != (high is None):
+            log.error('low and high should be both defined or both None')
+            raise ValueError('low and high should be both defined or both None')
+        if (low is not None) and (high <= low):
+            log.error('high should be larger than low')
+            raise ValueError('high should be larger than low')
+        self.n_bins = int(n_bins)
+        self.low = float(low) if low is not None else None
+        self.high = float(high) if high is not None else None
+        self.clipped = 0
+        self.group_cols = None
+        self.keys = []
+        self._index = {}
+        self.positives = np.zeros((0, self.n_bins))
+        self.negatives = np.zeros((0, self.n_bins))
+        self.score_sums = np.zeros((0, self.n_bins))
+
+    def __repr__(self):
+        return 'ScoreHistogram(n_bins={}, low={}, high={}, curves={})'.format(self.n_bins, self.low,
+                                                                            self.high, len(self.keys))
+
+    @property
+    def edges(self):
+        return np.linspace(self.low, self.high, self.n_bins + 1)
+
+    def _rows(self, keys):
+        # rows of the curves with the given keys (new curves are added)
+        new_keys = [k for k in dict.fromkeys(keys) if k not in self._index]
+        if len(new_keys) > 0:
+            for k in new_keys:
+                self._index[k] = len(self.keys)
+                self.keys.append(k)
+            padding = np.zeros((len(new_keys), self.n_bins))
+            self.positives = np.vstack([self.positives, padding])
+            self.negatives = np.vstack([self.negatives, padding])
+            self.score_sums = np.vstack([self.score_sums, padding])
+        return np.array([self._index[k] for k in keys], dtype=np.int64)
+
+    def _check_groups(self, group_cols):
+        if self.group_cols is None:
+            self.group_cols = list(group_cols)
+        elif list(group_cols) != self.group_cols:
+            log.error('group columns should be {}'.format(self.group_cols))
+            raise ValueError('group columns should be {}'.format(self.group_cols))
+
+    def _set_range(self, scores):
+        # range of the first scores (a unit range around a single value)
+        scores = scores[~np.isnan(scores)]
+        if len(scores) == 0:
+            return
+        low, high = float(scores.min()), float(scores.max())
+        if high <= low:
+            low, high = low - 0.5, low + 0.5
+        self.low, self.high = low, high
+
+    def update(self, df, target_col, score_cols, group_cols=[], pos_label=1):
+        '''
+        Add the rows of a dataframe (or chunk) to the histograms
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            input dataframe
+        target_col : str
+            target column
+        score_cols : list
+            score columns
+        group_cols : list
+            group columns (rows with missing group values or scores are ignored)
+        pos_label : int or str
+            label of the positive class
+
+        Returns
+        -------
+        histogram : ScoreHistogram
+            the updated histogram
+
+        '''
+        self._check_groups(group_cols)
+        if len(group_cols) > 0:
+            ids, keys = encode_groups(df, group_cols)
+            keys = list(keys.astype(object).itertuples(index=False, name=None))
+        else:
+            ids, keys = np.zeros(len(df), dtype=np.int64), [()]
+
+        positive = np.asarray(df[target_col] == pos_label)
+        if self.low is None:
+            self._set_range(df[score_cols].to_numpy(dtype=float)[ids >= 0].ravel())
+            if self.low is None:
+                return self
+        width = (self.high - self.low) / self.n_bins
+        clipped = 0
+        for c in score_cols:
+            rows = self._rows([(c,) + k for k in keys])
+            scores = df[c].to_numpy(dtype=float)
+            valid = (ids >= 0) & ~np.isnan(scores)
+            clipped += ((scores[valid] < self.low) | (scores[valid] > self.high)).sum()
+            codes = np.clip(np.floor((scores[valid] - self.low) / width), 0, self.n_bins - 1).astype(np.int64)
+            cells = rows[ids[valid]] * self.n_bins + codes
+            size = len(self.keys) * self.n_bins
+            self.positives += np.bincount(cells, weights=positive[valid], minlength=size).reshape(-1, self.n_bins)
+            self.negatives += np.bincount(cells, weights=~positive[valid], minlength=size).reshape(-1, self.n_bins)
+            self.score_sums += np.bincount(cells, weights=scores[valid], minlength=size).reshape(-1, self.n_bins)
+
+        if clipped > 0:
+            log.warning('{} scores are outside [{}, {}] and are counted in the first or last bin: '
+                        'the AUC error grows with them, use a range covering the scores'
+                        .format(clipped, self.low, self.high))
+            self.clipped += int(clipped)
+
+        return self
+
+    def merge(self, other):
+        '''
+        Merge another histogram (with the same bins and group columns) into this one
+
+        Parameters
+        ----------
+        other : ScoreHistogram
+            histogram to be merged (not modified)
+
+        Returns
+        -------
+        histogram : ScoreHistogram
+            the updated histogram
+
+        '''
+        if (self.low is None) and (len(self.keys) == 0):
+            self.low, self.high = other.low, other.high
+        if (other.n_bins, other.low, other.high) != (self.n_bins, self.low, self.high) \
+                and (len(other.keys) > 0):
+            log.error('only histograms with the same bins can be merged')
+            raise ValueError('only histograms with the same bins can be merged')
+        if other.group_cols is not None:
+            self._check_groups(other.group_cols)
+
+        rows = self._rows(other.keys)
+        np.add.at(self.positives, rows, other.positives)
+        np.add.at(self.negatives, rows, other.negatives)
+        np.add.at(self.score_sums, rows, other.score_sums)
+        self.clipped += other.clipped
+
+        return self
+
+    def _key_df(self):
+        # variable and group columns of each curve
+        return pd.DataFrame(self.keys, columns=['variable'] + (self.group_cols or []))
+
+    def roc_data(self, max_points=MAX_ROC_POINTS):
+        '''
+        ROC curves and AUC of each curve (see roc_data), with the bound of the AUC error
+
+        Parameters
+        ----------
+        max_points : int or None
+            maximum number of points of each curve
+
+        Returns
+        -------
+        roc_df : pd.DataFrame
+            variable, group columns, x (false positive rate) and y (true positive rate) of
+            each point
+        auc_df : pd.DataFrame
+            variable, group columns, auc, auc_error, positives and negatives of each curve
+
+        '''
+        n_curves = len(self.keys)
+        positives = self.positives.sum(axis=1)
+        negatives = self.negatives.sum(axis=1)
+
+        # points at the thresholds of the non empty bins (from the highest scores)
+        tp = np.cumsum(self.positives[:, ::-1], axis=1)
+        fp = np.cumsum(self.negatives[:, ::-1], axis=1)
+        filled = (self.positives + self.negatives)[:, ::-1] > 0
+        keep = np.c_[np.ones(n_curves, dtype=bool), filled]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tpr = np.c_[np.zeros(n_curves), tp] / positives[:, None]
+            fpr = np.c_[np.zeros(n_curves), fp] / negatives[:, None]
+            auc = (np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2).sum(axis=1)
+            auc_error = (self.positives * self.negatives).sum(axis=1) / (2 * positives * negatives)
+        curves = np.repeat(np.arange(n_curves), keep.sum(axis=1))
+        fpr, tpr = fpr[keep], tpr[keep]
+        if max_points is not None:
+            curves, fpr, tpr = decimate_curves(curves, fpr, tpr, max_points)
+
+        auc_df = self._key_df()
+        auc_df['auc'] = np.where((positives > 0) & (negatives > 0), auc, np.nan)
+        auc_df['auc_error'] = auc_error
+        auc_df['positives'] = positives.astype(np.int64)
+        auc_df['negatives'] = negatives.astype(np.int64)
+
+        roc_df = auc_df.loc[curves, ['variable'] + (self.group_cols or [])].reset_index(drop=True)
+        roc_df['x'] = fpr
+        roc_df['y'] = tpr
+
+        return roc_df, auc_df
+
+    def calibration_data(self, bins=None):
+        '''
+        Calibration bins of each curve: mean score, rate of positives and number of rows of
+        each non empty score bin
+
+        Parameters
+        ----------
+        bins : int or None
+            number of equally spaced calibration bins (the histogram bins are used if None,
+            otherwise n_bins should be a multiple of bins)
+
+        Returns
+        -------
+        calibration_df : pd.DataFrame
+            variable, group columns, score (mean score), target (rate of positives) and
+            count of each bin
+
+        '''
+        positives, negatives, score_sums = self.positives, self.negatives, self.score_sums
+        if bins is not None:
+            if self.n_bins % bins != 0:
+                log.error('n_bins should be a multiple of bins')
+                raise ValueError('n_bins should be a multiple of bins')
+            shape = (len(self.keys), bins, self.n_bins // bins)
+            positives = positives.reshape(shape).sum(axis=2)
+            negatives = negatives.reshape(shape).sum(axis=2)
+            score_sums = score_sums.reshape(shape).sum(axis=2)
+
+        counts = positives + negatives
+        curves, codes = np.nonzero(counts)
+        calibration_df = self._key_df().iloc[curves].reset_index(drop=True)
+        calibration_df['score'] = score_sums[curves, codes] / counts[curves, codes]
+        calibration_df['target'] = positives[curves, codes] / counts[curves, codes]
+        calibration_df['count'] = counts[curves, codes].astype(np.int64)
+
+        return calibration_df
+
+    def to_dict(self):
+        '''
+        Serialize the histogram into a dictionary of builtin types (eg to be stored as json)
+
+        Returns
+        -------
+        state : dict
+
+        '''
+        return {'n_bins': self.n_bins,
+                'low': self.low,
+                'high': self.high,
+                'clipped': self.clipped,
+                'group_cols': self.group_cols,
+                'keys': [list(k) for k in self.keys],
+                'positives': self.positives.tolist(),
+                'negatives': self.negatives.tolist(),
+                'score_sums': self.score_sums.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        '''
+        Rebuild a histogram serialized with to_dict
+
+        Parameters
+        ----------
+        state : dict
+            serialized histogram
+
+        Returns
+        -------
+        histogram : ScoreHistogram
+
+        '''
+        histogram = cls(state['n_bins'], state['low'], state['high'])
+        histogram.clipped = state.get('clipped', 0)
+        histogram.group_cols = state['group_cols']
+        histogram._rows([tuple(k) for k in state['keys']])
+        shape = (len(histogram.keys), histogram.n_bins)
+        histogram.positives = np.array(state['positives'], dtype=float).reshape(shape)
+        histogram.negatives = np.array(state['negatives'], dtype=float).reshape(shape)
+        histogram.score_sums = np.array(state['score_sums'], dtype=float).reshape(shape)
+        return histogram
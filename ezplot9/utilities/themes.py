@@ -4,6 +4,10 @@ from plotnine.themes.theme_gray import theme_gray
 from .colors import ez_colors
 
 STRIP_COLOR = ez_colors(1)[0]
+
+# resolution of the figures (dots per inch)
+EZ_DPI = 150
+
 class theme_ez(theme_gray):
     """
     White background with gray gridlines and colored strips
@@ -29,7 +33,7 @@ class theme_ez(theme_gray):
 
         self.add_theme(
             theme(figure_size = figure_size,
-                  dpi=150,
+                  dpi=EZ_DPI,
                   text = element_text(color='k', size=base_size*0.8),
                   strip_background = element_rect(color='k', fill=STRIP_COLOR, size=0.5, alpha=.95),
                   strip_text = element_text(weight='bold', color='w', size=base_size),
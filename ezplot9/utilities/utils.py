@@ -1,5 +1,9 @@
+import ast
+import re
+
 SYMBOLS_TO_IGNORE = ['==', '>=', '<=', '!=', '+=', '-=', '*=', '/=', '**=', '%=', '//=']
 OPERATORS_TO_REPLACEMENT_KEYS={s:s.replace('=', '~~') for s in SYMBOLS_TO_IGNORE}
+BACKTICK_PATTERN = re.compile('`([^`]*)`')
 
 def unname(x):
     '''
@@ -57,6 +61,41 @@ def unname(x):
 
     return name, var
 
+def expression_columns(x):
+    '''
+    Find the names (ie columns) referenced by an expression. Names quoted with backticks are
+    supported and the delayed evaluation key (`@`) is ignored.
+
+    Parameters
+    ----------
+    x : str
+        expression to be analysed
+
+    Returns
+    -------
+    columns : set or None
+        names referenced by the expression (None if the expression cannot be parsed)
+
+    '''
+
+    if (x is None) or (x == '.index'):
+        return set()
+
+    # replace backtick quoted names with valid identifiers
+    quoted = {}
+    def replace_quoted(match):
+        key = '__ez_quoted_{}__'.format(len(quoted))
+        quoted[key] = match.group(1)
+        return key
+    expr = BACKTICK_PATTERN.sub(replace_quoted, x.replace('@', ''))
+
+    try:
+        tree = ast.parse(expr.strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    return {quoted.get(node.id, node.id) for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
 def sort_data_groups(g):
     # determine order and create a categorical type
     if g.column_is_categorical('x'):
@@ -19,6 +19,9 @@ setup(name='ezplot9',
             'bootstrapped',
             'scikit-learn'
       ],
+      extras_require={
+            'parquet': ['pyarrow']
+      },
       license='MIT')
 
 